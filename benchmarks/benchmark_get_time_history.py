@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import time
+import h5py as h5
+import numpy as np
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.dirname(route_dir))
+
+import postprocess_gust_response as postprocess
+from synthetic_savedata import write_synthetic_savedata
+
+"""
+    Benchmark of postprocess_gust_response.get_time_history against the previous implementation, which
+    resolved the timestep groups from the file root and copied the full arrays for every field of every
+    timestep. Both readers are run on a synthetic savedata file with SHARPy's layout and their results
+    are compared.
+
+    Usage: python benchmarks/benchmark_get_time_history.py [n_steps]
+"""
+
+
+def get_time_history_reference(output_folder, case):
+    # Previous implementation of get_time_history
+    file = os.path.join(output_folder, case, 'savedata', case + '.data.h5')
+    with h5.File(file, "r") as f:
+            ts_max = len(f['data']['structure']['timestep_info'].keys())-2
+            dt = float(str(np.array(f['data']['settings']['DynamicCoupled']['dt'])))
+            matrix_data = np.zeros((ts_max, 17))
+            matrix_data[:,0] = np.array(list(range(ts_max))) * dt
+            node_tip = np.argmax(np.array(f['data']['structure']['timestep_info']['00000']['pos'])[:,1])
+
+            node_root = 0
+            element_tip = int(np.round((node_tip - 1)/2. -0.1))
+
+            for its in range(0,ts_max):
+                ts_str = f'{its:05d}'
+                matrix_data[its, 1] = np.array(f['data']['aero']['timestep_info'][ts_str]['u_ext']['00000'])[2,0,0]
+                matrix_data[its, 2:5] = np.array(f['data']['structure']['timestep_info'][ts_str]['pos'])[node_tip, :]
+                matrix_data[its, 5:8] = np.array(f['data']['structure']['timestep_info'][ts_str]['pos_dot'])[node_tip, :]
+                matrix_data[its, 8:11] = np.array(f['data']['structure']['timestep_info'][ts_str]['psi'])[element_tip, -1, :]
+                matrix_data[its, 11:14] = np.array(f['data']['structure']['timestep_info'][ts_str]['psi_dot'])[element_tip, -1, :]
+                matrix_data[its, 14] = np.array(f['data']['structure']['timestep_info'][ts_str]['postproc_cell']['loads'])[node_root,4]
+                matrix_data[its, 15] = np.array(f['data']['structure']['timestep_info'][ts_str]['postproc_cell']['loads'])[node_root,3]
+                matrix_data[its, 16] = postprocess.quat2euler(np.array(f['data']['structure']['timestep_info'][ts_str]['quat']))[1]
+
+    return matrix_data
+
+
+def time_function(function, *args, repeats=3):
+    list_wall_times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function(*args)
+        list_wall_times.append(time.perf_counter() - start_time)
+    return min(list_wall_times), result
+
+
+def main():
+    n_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    case = 'synthetic_gust_response'
+    with tempfile.TemporaryDirectory() as output_folder:
+        print('Writing synthetic savedata file with {} timesteps...'.format(n_steps))
+        write_synthetic_savedata(output_folder, case, n_steps=n_steps)
+
+        wall_time_reference, data_reference = time_function(get_time_history_reference, output_folder, case)
+        wall_time, data = time_function(postprocess.get_time_history, output_folder, case)
+        preallocated = np.zeros((n_steps,), dtype=postprocess.time_history_dtype)
+        wall_time_preallocated, _ = time_function(postprocess.read_time_history,
+                                                  postprocess.get_savedata_file(output_folder, case),
+                                                  preallocated)
+
+    np.testing.assert_allclose(data, data_reference, rtol=0, atol=0)
+    print('Previous get_time_history:    {:8.3f} s'.format(wall_time_reference))
+    print('get_time_history:             {:8.3f} s (speed-up {:.1f})'.format(wall_time,
+                                                                             wall_time_reference / wall_time))
+    print('read_time_history (prealloc): {:8.3f} s (speed-up {:.1f})'.format(wall_time_preallocated,
+                                                                             wall_time_reference / wall_time_preallocated))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.dirname(route_dir))
+
+"""
+    Benchmark of the FLEXOP simulation pipeline. Reduced-size reference cases (short simulation time, coarse
+    discretisation) based on the case of run_nonlinear_simulation.py are run, each in a fresh process, and the
+    following is recorded per case:
+        - wall time of the model generation, the SHARPy simulation and the postprocessing,
+        - wall time and number of calls of each SHARPy solver and postprocessor (e.g. StaticCoupled, StaticTrim,
+          DynamicCoupled and, within DynamicCoupled, StepUvlm and the structural solver per FSI substep, BeamLoads
+          and SaveData),
+        - peak resident memory and size of the written case and output files.
+
+    The results are stored as JSON in benchmarks/results/<label>.json together with the git commit and SHARPy
+    version, and can be compared against a stored baseline, flagging regressions above a tolerance.
+
+    Usage:
+        python benchmarks/benchmark_pipeline.py --label <label> [--baseline <baseline.json>] [--tolerance 0.1]
+"""
+
+# Reference cases: overrides of the case parameters of run_nonlinear_simulation.py
+reduced_case_parameters = {'simulation_time': 0.1,
+                           'n_elem_multiplier': 1,
+                           'num_chord_panels': 4,
+                           'wake_length': 5,
+                           'num_cores': 1,
+                           'trim_cache_file': None,
+                           'model_cache_route': None,
+                           'snapshot_route': None,
+                           }
+reference_cases = {
+    'reference': {},
+    'variable_wake': {'wake_discretisation': True},
+    'monitor_channels': {'monitor_channels': ['u_ext_le', 'tip_pos', 'root_loads', 'pitch']},
+    'clamped': {'free_flight': False},
+    }
+
+# Metrics compared against the baseline
+regression_metrics = ['stages', 'solvers', 'peak_rss', 'output_bytes']
+
+
+def get_folder_size(folder):
+    folder_size = 0
+    for root, _, files in os.walk(folder):
+        for file in files:
+            if not os.path.islink(os.path.join(root, file)):
+                folder_size += os.path.getsize(os.path.join(root, file))
+    return folder_size
+
+
+def run_benchmark_case(case):
+    """
+        Runs a reference case and returns its timings, peak memory and output size. Executed in a fresh worker
+        process, so that the peak memory of each case is measured separately.
+    """
+    from helper_functions.simulation_case import generate_flexop_case
+    from helper_functions.solver_timing import SolverTimer
+    from postprocess_gust_response import get_time_history
+
+    case_name, case_parameters, benchmark_route = case
+    cases_route = os.path.join(benchmark_route, 'cases', case_name) + '/'
+    output_route = os.path.join(benchmark_route, 'output', case_name) + '/'
+    with SolverTimer() as timer:
+        with timer.stage('model_generation'):
+            flexop_model = generate_flexop_case(case_name, cases_route, output_route, case_parameters)
+        with timer.stage('simulation'):
+            flexop_model.run()
+        with timer.stage('postprocessing'):
+            get_time_history(output_route, case_name)
+
+    return case_name, {'stages': timer.stages,
+                       'solvers': timer.timings,
+                       'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                       'output_bytes': {'cases': get_folder_size(cases_route),
+                                        'output': get_folder_size(output_route)}}
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=route_dir).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def get_sharpy_version():
+    try:
+        import sharpy
+        return getattr(sharpy, '__version__', 'unknown')
+    except ImportError:
+        return 'unknown'
+
+
+def get_flat_metrics(case_results, prefix=''):
+    # Flattens the nested results of a case, e.g. {'solvers': {'StepUvlm': {'wall_time': 1.}}} to
+    # {'solvers/StepUvlm/wall_time': 1.}
+    flat_metrics = {}
+    for key, value in case_results.items():
+        if isinstance(value, dict):
+            flat_metrics.update(get_flat_metrics(value, prefix + key + '/'))
+        elif key != 'calls':
+            flat_metrics[prefix + key] = value
+    return flat_metrics
+
+
+def compare_results(results, baseline, tolerance=0.1):
+    """
+        Compares the results with a baseline and returns all metrics (wall times, memory, output size) that
+        increased by more than the relative tolerance as list of (case, metric, baseline value, value).
+    """
+    list_regressions = []
+    for case_name, case_results in results['cases'].items():
+        if case_name not in baseline['cases']:
+            continue
+        baseline_metrics = get_flat_metrics({key: baseline['cases'][case_name][key] for key in regression_metrics})
+        metrics = get_flat_metrics({key: case_results[key] for key in regression_metrics})
+        for metric, value in metrics.items():
+            baseline_value = baseline_metrics.get(metric)
+            if baseline_value is not None and baseline_value > 0 and value > (1 + tolerance) * baseline_value:
+                list_regressions.append((case_name, metric, baseline_value, value))
+    return list_regressions
+
+
+def print_summary(results):
+    list_case_names = list(results['cases'].keys())
+    reference_case = results['cases'][list_case_names[0]]
+    print('{:20s} {:>12s} {:>12s} {:>14s} {:>12s}'.format('case', 'simulation', 'relative', 'peak RSS [MB]',
+                                                          'output [MB]'))
+    for case_name in list_case_names:
+        case_results = results['cases'][case_name]
+        print('{:20s} {:10.2f} s {:12.2f} {:14.1f} {:12.1f}'.format(
+            case_name,
+            case_results['stages']['simulation'],
+            case_results['stages']['simulation'] / reference_case['stages']['simulation'],
+            case_results['peak_rss'] / 1024 ** 2,
+            case_results['output_bytes']['output'] / 1024 ** 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the FLEXOP simulation pipeline')
+    parser.add_argument('--label', default=datetime.datetime.now().strftime('%Y%m%d_%H%M%S'))
+    parser.add_argument('--baseline', default=None, help='JSON results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative tolerance for regressions')
+    parser.add_argument('--cases', nargs='+', default=list(reference_cases.keys()))
+    args = parser.parse_args()
+
+    from helper_functions.simulation_case import get_case_parameters
+    from run_nonlinear_simulation import case_parameters as base_parameters
+
+    results = {'label': args.label,
+               'date': datetime.datetime.now().isoformat(),
+               'git_commit': get_git_commit(),
+               'sharpy_version': get_sharpy_version(),
+               'cases': {}}
+    with tempfile.TemporaryDirectory() as benchmark_route:
+        list_cases = [(case_name,
+                       get_case_parameters(base_parameters, **reduced_case_parameters, **reference_cases[case_name]),
+                       benchmark_route) for case_name in args.cases]
+        # Cases are run one after another in fresh processes, so that timings are not affected by each other
+        with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+            for case_name, case_results in pool.imap(run_benchmark_case, list_cases):
+                results['cases'][case_name] = case_results
+
+    results_folder = os.path.join(route_dir, 'results')
+    if not os.path.exists(results_folder):
+        os.makedirs(results_folder)
+    with open(os.path.join(results_folder, args.label + '.json'), 'w') as f:
+        json.dump(results, f, indent=4)
+    print_summary(results)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        list_regressions = compare_results(results, baseline, tolerance=args.tolerance)
+        for case_name, metric, baseline_value, value in list_regressions:
+            print('Regression in {}: {} increased from {:.4g} to {:.4g} ({:+.1f} %)'.format(
+                case_name, metric, baseline_value, value, 100 * (value / baseline_value - 1)))
+        if len(list_regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import numpy as np
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.dirname(route_dir))
+
+import sharpy.utils.algebra as algebra
+from helper_functions.kinematics import body_to_inertial, crv2rotation, quat2euler, quat2rotation
+
+"""
+    Cross-check of the vectorised kinematics of helper_functions/kinematics.py against the per-timestep functions
+    of sharpy.utils.algebra for random orientations, including large and small rotations, and timing of both for
+    the given number of timesteps.
+
+    Usage: python benchmarks/check_kinematics.py [n_steps]
+"""
+
+
+def get_random_quaternions(rng, n_steps):
+    quat = rng.standard_normal((n_steps, 4))
+    quat /= np.linalg.norm(quat, axis=1, keepdims=True)
+    return quat * np.sign(quat[:, :1])
+
+
+def main():
+    n_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_node = 20
+    rng = np.random.default_rng(0)
+    quat = get_random_quaternions(rng, n_steps)
+    psi = rng.standard_normal((n_steps, 3)) * np.logspace(-8, 0.5, n_steps)[:, np.newaxis]
+    pos = rng.standard_normal((n_steps, n_node, 3))
+    for_pos = rng.standard_normal((n_steps, 6))
+
+    reference = {
+        'quat2euler': np.array([algebra.quat2euler(quat[its]) for its in range(n_steps)]),
+        'quat2rotation': np.array([algebra.quat2rotation(quat[its]) for its in range(n_steps)]),
+        'crv2rotation': np.array([algebra.crv2rotation(psi[its]) for its in range(n_steps)]),
+        'body_to_inertial': np.array([pos[its] @ algebra.quat2rotation(quat[its]).T + for_pos[its, 0:3]
+                                      for its in range(n_steps)]),
+        }
+    vectorised = {
+        'quat2euler': quat2euler(quat),
+        'quat2rotation': quat2rotation(quat),
+        'crv2rotation': crv2rotation(psi),
+        'body_to_inertial': body_to_inertial(pos, quat, for_pos),
+        }
+    start_time = time.perf_counter()
+    [algebra.quat2euler(quat[its]) for its in range(n_steps)]
+    wall_time_reference = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    quat2euler(quat)
+    wall_time = time.perf_counter() - start_time
+    print('quat2euler of {} timesteps: per timestep {:.2e} s, vectorised {:.2e} s (speed-up {:.0f})'.format(
+        n_steps, wall_time_reference, wall_time, wall_time_reference / wall_time))
+
+    max_error = 0.
+    for name, data_reference in reference.items():
+        error = np.max(np.abs(vectorised[name] - data_reference))
+        max_error = max(max_error, error)
+        print('{:17s} maximum error {:.2e}'.format(name, error))
+    if max_error > 1e-10:
+        print('Vectorised kinematics deviate from sharpy.utils.algebra.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.dirname(route_dir))
+
+from helper_functions.campaign import get_campaign_cases, run_campaign, write_campaign_manifest
+from helper_functions.mesh_convergence import (evaluate_mesh_study, format_mesh_results, recommend_discretisation,
+                                               store_discretisation)
+from helper_functions.simulation_case import get_case_parameters
+from postprocess_gust_response import get_time_history, parameter_labels
+from run_nonlinear_simulation import case_parameters as base_parameters
+
+"""
+    Mesh convergence study: runs a short gust case of run_nonlinear_simulation.py for each combination of the given
+    numbers of chordwise panels and element multipliers as a campaign, extrapolates the peak root out-of-plane
+    moment and tip deflection with Richardson extrapolation and stores the cheapest discretisation within the
+    tolerance of the extrapolated peaks in the discretisation settings file (see helper_functions/mesh_convergence.py).
+    Cases run with use_recommended_discretisation = True in run_nonlinear_simulation.py (and the gust campaigns
+    based on it) then use this discretisation.
+
+    Discretisation parameters that are not specified keep the value of run_nonlinear_simulation.py. The observed
+    order of convergence requires at least three levels of a parameter, otherwise the assumed order is used.
+
+    Usage:
+        python benchmarks/check_mesh_convergence.py [--num_chord_panels 4 8 16] [--n_elem_multiplier 1 2 4]
+                                                    [--n_elem_multiplier_tail 1 2] [--n_elem_multiplier_fuselage 1 2]
+                                                    [--tolerance 0.02] [--simulation_time 1]
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mesh convergence study')
+    parser.add_argument('--num_chord_panels', type=int, nargs='+', default=[4, 8, 16])
+    parser.add_argument('--n_elem_multiplier', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--n_elem_multiplier_tail', type=int, nargs='+', default=None)
+    parser.add_argument('--n_elem_multiplier_fuselage', type=int, nargs='+', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.02, help='maximum relative error of the peak values')
+    parser.add_argument('--assumed_order', type=float, default=2., help='order of convergence if not observable')
+    parser.add_argument('--simulation_time', type=float, default=None,
+                        help='simulation time of the cases (default: simulation time of the base case)')
+    parser.add_argument('--num_cores', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--output_route', default=os.path.join(route_dir, 'output', 'mesh_convergence') + '/')
+    parser.add_argument('--discretisation_settings_file',
+                        default=os.path.join(os.path.dirname(route_dir), 'discretisation_settings.json'))
+    args = parser.parse_args()
+
+    study_parameters = get_case_parameters(base_parameters,
+                                           discretisation_settings_file=None,
+                                           wake_settings_file=None,
+                                           checkpoint_interval=0)
+    if args.simulation_time is not None:
+        study_parameters['simulation_time'] = args.simulation_time
+    parameter_grid = {parameter: sorted(getattr(args, parameter))
+                      for parameter in ['num_chord_panels', 'n_elem_multiplier', 'n_elem_multiplier_tail',
+                                        'n_elem_multiplier_fuselage']
+                      if getattr(args, parameter) is not None}
+    list_cases = get_campaign_cases(args.output_route, 'mesh', study_parameters, parameter_grid)
+    write_campaign_manifest(args.output_route, list_cases)
+    results = run_campaign(list_cases, args.num_cores)
+    failed_cases = [case_name for case_name, (success, _, _) in results.items() if not success]
+    if len(failed_cases) > 0:
+        print('Failed cases: {}'.format(', '.join(failed_cases)))
+        sys.exit(1)
+
+    list_results, extrapolated_peaks, orders = evaluate_mesh_study(list_cases,
+                                                                   get_time_history,
+                                                                   parameter_labels,
+                                                                   assumed_order=args.assumed_order)
+    print(format_mesh_results(list_results, extrapolated_peaks, args.tolerance))
+    for parameter, parameter_orders in orders.items():
+        print('Order of convergence in {}: {}'.format(parameter, ', '.join(
+            '{} {:.2f}'.format(label, order) for label, order in parameter_orders.items())))
+    recommendation = recommend_discretisation(list_results, args.tolerance)
+    if recommendation is None:
+        print('No discretisation of the study is converged (tolerance {:.2e}).'.format(args.tolerance))
+        sys.exit(1)
+    print('Recommended discretisation: {}'.format(', '.join(
+        '{} {}'.format(parameter, value) for parameter, value in recommendation['discretisation'].items())))
+    store_discretisation(args.discretisation_settings_file, study_parameters, recommendation, args.tolerance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.dirname(route_dir))
+
+from helper_functions.simulation_case import get_case_parameters, run_flexop_case
+from helper_functions.time_step_schedule import compare_time_histories
+from postprocess_gust_response import get_time_history, parameter_labels
+from run_nonlinear_simulation import case_parameters as base_parameters
+
+"""
+    Convergence check of the time step schedule: runs the case of run_nonlinear_simulation.py once with the
+    constant (fine) time step and once with a time step schedule, both with the variable wake discretisation,
+    and compares the time histories of the tip displacements, root loads and pitch angle. The maximum error
+    of each channel relative to its maximum reference value is printed together with the wall times.
+
+    Usage:
+        python benchmarks/check_time_step_schedule.py [--coarse_factor 4] [--margin 0.1] [--tolerance 0.02]
+"""
+
+checked_labels = ['z', 'OOP', 'MT', 'Pitch']
+
+
+def run_case(case_name, output_route, case_parameters):
+    cases_route = os.path.join(output_route, 'cases') + '/'
+    start_time = time.perf_counter()
+    run_flexop_case(case_name, cases_route, output_route, case_parameters)
+    return time.perf_counter() - start_time, get_time_history(output_route, case_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convergence check of a time step schedule')
+    parser.add_argument('--coarse_factor', type=int, default=4)
+    parser.add_argument('--margin', type=float, default=0.1)
+    parser.add_argument('--tolerance', type=float, default=0.02, help='maximum relative error')
+    parser.add_argument('--output_route', default=os.path.join(route_dir, 'output', 'time_step_schedule') + '/')
+    args = parser.parse_args()
+
+    reference_parameters = get_case_parameters(base_parameters, wake_discretisation=True)
+    scheduled_parameters = get_case_parameters(reference_parameters,
+                                               time_step_schedule={'coarse_factor': args.coarse_factor,
+                                                                   'margin': args.margin})
+    reference_wall_time, reference_data = run_case('reference', args.output_route, reference_parameters)
+    wall_time, data = run_case('scheduled', args.output_route, scheduled_parameters)
+
+    print('Timesteps: {} (reference {}), wall time: {:.1f} s (reference {:.1f} s)'.format(
+        data.shape[0], reference_data.shape[0], wall_time, reference_wall_time))
+    columns = [parameter_labels.index(label) + 1 for label in checked_labels]
+    relative_errors = compare_time_histories(reference_data, data, columns=columns)
+    converged = True
+    for label, column in zip(checked_labels, columns):
+        print('{:10s} relative error {:.2e}'.format(label, relative_errors[column]))
+        converged &= relative_errors[column] <= args.tolerance
+    if not converged:
+        print('Time step schedule not converged (tolerance {:.2e}).'.format(args.tolerance))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.dirname(route_dir))
+
+from helper_functions.campaign import get_campaign_cases, run_campaign, write_campaign_manifest
+from helper_functions.simulation_case import get_case_parameters, get_recommended_settings
+from helper_functions.wake_convergence import (evaluate_wake_study, format_wake_results, get_wake_parameter_grid,
+                                               recommend_wake_setting, store_wake_setting)
+from postprocess_gust_response import get_time_history, parameter_labels
+from run_nonlinear_simulation import case_parameters as base_parameters
+
+"""
+    Wake-length convergence study: runs the case of run_nonlinear_simulation.py (reduced to the given simulation
+    time) for each wake length with constant and variable wake discretisation as a campaign, compares the time
+    histories of the tip displacement and root loads against the case with the longest constant wake, and stores
+    the cheapest converged wake setting of the configuration in the wake settings file. Cases run with
+    use_recommended_wake = True in run_nonlinear_simulation.py then use this wake setting.
+
+    Usage:
+        python benchmarks/check_wake_convergence.py [--wake_lengths 2 4 6 10 15] [--tolerance 0.01]
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wake-length convergence study')
+    parser.add_argument('--wake_lengths', type=int, nargs='+', default=[2, 4, 6, 10, 15],
+                        help='wake lengths in chords')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='maximum relative error')
+    parser.add_argument('--simulation_time', type=float, default=None,
+                        help='simulation time of the cases (default: simulation time of the base case)')
+    parser.add_argument('--num_cores', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--output_route', default=os.path.join(route_dir, 'output', 'wake_convergence') + '/')
+    parser.add_argument('--wake_settings_file', default=os.path.join(os.path.dirname(route_dir),
+                                                                     'wake_settings.json'))
+    args = parser.parse_args()
+
+    # Wake study with the recommended discretisation of the configuration (if available)
+    study_parameters = get_case_parameters(get_recommended_settings(base_parameters),
+                                           discretisation_settings_file=None,
+                                           wake_settings_file=None,
+                                           checkpoint_interval=0)
+    if args.simulation_time is not None:
+        study_parameters['simulation_time'] = args.simulation_time
+    list_cases = get_campaign_cases(args.output_route,
+                                    'wake',
+                                    study_parameters,
+                                    get_wake_parameter_grid(args.wake_lengths))
+    write_campaign_manifest(args.output_route, list_cases)
+    results = run_campaign(list_cases, args.num_cores)
+    failed_cases = [case_name for case_name, (success, _, _) in results.items() if not success]
+    if len(failed_cases) > 0:
+        print('Failed cases: {}'.format(', '.join(failed_cases)))
+        sys.exit(1)
+
+    list_results = evaluate_wake_study(list_cases, get_time_history, parameter_labels)
+    print(format_wake_results(list_results, args.tolerance))
+    recommendation = recommend_wake_setting(list_results, args.tolerance)
+    print('Recommended wake setting: wake length {:g}, variable wake discretisation {}'.format(
+        recommendation['wake_length'], recommendation['wake_discretisation']))
+    store_wake_setting(args.wake_settings_file, study_parameters, recommendation, args.tolerance)
+
+
+if __name__ == '__main__':
+    main()
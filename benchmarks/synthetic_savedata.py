@@ -0,0 +1,51 @@
+"""
+    Writes synthetic SHARPy savedata files (<case>.data.h5) with the group layout of SaveData, i.e.
+    data/structure/timestep_info/<ts>/..., data/aero/timestep_info/<ts>/... and data/settings/..., to
+    benchmark the postprocessing without running a simulation. The array sizes default to the SuperFLEXOP
+    with n_elem_multiplier = 2 and num_chord_panels = 8.
+"""
+
+import os
+import h5py as h5
+import numpy as np
+
+
+def write_synthetic_savedata(output_folder, case, n_steps=2000, num_node=161, num_elem=80,
+                             num_surfaces=8, m=8, n=20, m_star=80, dt=0.0006, seed=0):
+    """
+        Writes the synthetic savedata file of a case to <output_folder>/<case>/savedata/<case>.data.h5
+        (n_steps + 2 timestep groups as written by SHARPy for a dynamic simulation) and returns its path.
+    """
+    rng = np.random.default_rng(seed)
+    folder = os.path.join(output_folder, case, 'savedata')
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    file = os.path.join(folder, case + '.data.h5')
+
+    pos_ref = np.zeros((num_node, 3))
+    pos_ref[:, 1] = np.linspace(-3.5, 3.5, num_node)
+    with h5.File(file, 'w') as f:
+        f['data/settings/DynamicCoupled/dt'] = dt
+        structure_timestep_info = f.create_group('data/structure/timestep_info')
+        aero_timestep_info = f.create_group('data/aero/timestep_info')
+        for its in range(n_steps + 2):
+            ts_str = f'{its:05d}'
+            structure_timestep = structure_timestep_info.create_group(ts_str)
+            structure_timestep['pos'] = pos_ref + 1e-3 * rng.standard_normal((num_node, 3))
+            structure_timestep['pos_dot'] = rng.standard_normal((num_node, 3))
+            structure_timestep['psi'] = rng.standard_normal((num_elem, 3, 3))
+            structure_timestep['psi_dot'] = rng.standard_normal((num_elem, 3, 3))
+            quat = np.array([1., 0., 1e-2 * rng.standard_normal(), 0.])
+            structure_timestep['quat'] = quat / np.linalg.norm(quat)
+            structure_timestep['for_pos'] = rng.standard_normal(6)
+            structure_timestep['postproc_cell/loads'] = rng.standard_normal((num_elem, 6))
+
+            aero_timestep = aero_timestep_info.create_group(ts_str)
+            for i_surf in range(num_surfaces):
+                surf_str = f'{i_surf:05d}'
+                aero_timestep['zeta/' + surf_str] = rng.standard_normal((3, m + 1, n + 1))
+                aero_timestep['zeta_star/' + surf_str] = rng.standard_normal((3, m_star + 1, n + 1))
+                aero_timestep['gamma/' + surf_str] = rng.standard_normal((m, n))
+                aero_timestep['gamma_star/' + surf_str] = rng.standard_normal((m_star, n))
+                aero_timestep['u_ext/' + surf_str] = rng.standard_normal((3, m + 1, n + 1))
+    return file
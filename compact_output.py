@@ -0,0 +1,63 @@
+import argparse
+import multiprocessing
+import os
+import traceback
+from helper_functions.output_compaction import compact_case_output, get_folder_size
+
+"""
+    This script compacts the output folders of finished cases (e.g. all cases of a campaign's output route) that
+    have been run without output_compaction (see run_nonlinear_simulation.py and
+    helper_functions/output_compaction.py): the savedata file is compressed, the aerodynamic grid is kept every
+    stride timesteps only (the wake is dropped unless --keep_wake is given), the VTK output is packed into a single
+    archive and the checkpoints are removed. The postprocessing reads the compacted output as before.
+
+    Usage:
+        python compact_output.py <output_route> [--cases <case> ...] [--stride 10] [--keep_wake] [--no_pack_vtk]
+                                 [--keep_checkpoints] [--num_processes 4]
+"""
+
+
+def compact_case(arguments):
+    output_route, case_name, compaction_settings = arguments
+    try:
+        size_before = get_folder_size(os.path.join(output_route, case_name))
+        compact_case_output(output_route, case_name, **compaction_settings)
+        return case_name, size_before, get_folder_size(os.path.join(output_route, case_name)), ''
+    except Exception:
+        return case_name, None, None, traceback.format_exc()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compaction of the output folders of finished cases')
+    parser.add_argument('output_route')
+    parser.add_argument('--cases', nargs='+', default=None, help='cases to compact (default: all cases)')
+    parser.add_argument('--stride', type=int, default=10, help='keep the aerodynamic grid every n-th timestep')
+    parser.add_argument('--keep_wake', action='store_true')
+    parser.add_argument('--no_pack_vtk', action='store_true')
+    parser.add_argument('--keep_checkpoints', action='store_true')
+    parser.add_argument('--num_processes', type=int, default=None)
+    args = parser.parse_args()
+
+    list_cases = args.cases
+    if list_cases is None:
+        list_cases = sorted(case_name for case_name in os.listdir(args.output_route)
+                            if os.path.isdir(os.path.join(args.output_route, case_name)))
+    compaction_settings = {'stride': args.stride,
+                           'keep_wake': args.keep_wake,
+                           'pack_vtk': not args.no_pack_vtk,
+                           'remove_checkpoints': not args.keep_checkpoints}
+    total_before, total_after = 0, 0
+    with multiprocessing.get_context('spawn').Pool(args.num_processes) as pool:
+        for case_name, size_before, size_after, error in pool.imap_unordered(
+                compact_case, [(args.output_route, case_name, compaction_settings) for case_name in list_cases]):
+            if size_before is None:
+                print('Compaction of case {} failed:\n{}'.format(case_name, error))
+                continue
+            total_before += size_before
+            total_after += size_after
+            print('{}: {:.1f} MB -> {:.1f} MB'.format(case_name, size_before / 1024 ** 2, size_after / 1024 ** 2))
+    print('Total: {:.1f} MB -> {:.1f} MB'.format(total_before / 1024 ** 2, total_after / 1024 ** 2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import signal
+import time
+import h5py as h5
+import numpy as np
+from helper_functions.results_store import (append_case_results, get_case_statistics, merge_case_statistics,
+                                            truncate_case_time_history)
+from helper_functions.time_step_schedule import get_step_times, read_schedule
+from postprocess_gust_response import (get_monitor_file, get_number_of_timesteps, get_savedata_file, parameter_labels,
+                                       read_timesteps, time_history_dtype)
+
+"""
+    Follows a running gust response simulation: the output of the simulation is polled and only timesteps not read
+    before are processed. New timesteps are
+        - appended to the results store (see helper_functions/results_store.py), together with the peak values
+          of the case so far,
+        - kept in a ring buffer of the latest timesteps, e.g. for live plotting.
+
+    The output is read from the ChannelMonitor file if available, which is opened once in SWMR mode, and otherwise
+    from the savedata file, which is reopened at each poll as SaveData closes it after each timestep.
+
+    Timesteps already in the results store (e.g. written by an earlier follower or by postprocess_gust_response.py)
+    are not appended again and are included in the peak values. If the simulation is restarted from a checkpoint,
+    the output is truncated to the checkpoint, and so are the time history in the store and the peak values.
+
+    Optionally, the simulation is aborted if a load limit is exceeded (e.g. the root bending moment) or the
+    solution diverges (non-finite values), so that no computation time is wasted on a failed case. The reason is
+    written to <output_folder>/<case>/<case>.abort.json.
+
+    Usage:
+        python follow_gust_response.py <output_folder> <case> [--pid <pid of the simulation>] [--limit OOP 5000]
+"""
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class GustResponseFollower:
+    """
+        Reads the new timesteps of a running simulation at each call of poll().
+
+        Args:
+            output_folder (str): SHARPy output folder
+            case (str): case name
+            store_file (str): results store the timesteps are appended to (None: not stored)
+            buffer_size (int): number of latest timesteps kept in the ring buffer
+            load_limits (dict): maximum absolute value of any column, e.g. {'OOP': 5e3, 'z': 1.}
+    """
+    def __init__(self, output_folder, case, store_file=None, buffer_size=2000, load_limits=None):
+        self.output_folder = output_folder
+        self.case = case
+        self.store_file = store_file
+        self.load_limits = {} if load_limits is None else load_limits
+        for label in self.load_limits:
+            if label not in parameter_labels:
+                raise KeyError('Unknown column {}.'.format(label))
+        self.n_steps = 0
+        self.buffer = np.full((buffer_size, len(time_history_dtype)), np.nan)
+        self.statistics = None
+        self.z_reference = None
+        self.monitor_file = None
+        # Columns written by the simulation (all columns for the savedata file, see read_new_timesteps)
+        self.monitored_labels = list(parameter_labels)
+        self.restore()
+
+    def restore(self):
+        """
+            Continues from the time history of the case in the results store, if any.
+        """
+        if self.store_file is None or not os.path.isfile(self.store_file):
+            return
+        with h5.File(self.store_file, 'r') as f:
+            if self.case not in f.get('time_history', {}):
+                return
+            time_history = f['time_history'][self.case]
+            if list(time_history.attrs['labels']) != list(time_history_dtype.names):
+                raise ValueError('Columns of the time history of case {} in {} do not match.'.format(self.case,
+                                                                                                    self.store_file))
+            matrix_data = time_history[()]
+        if len(matrix_data) > 0:
+            self.add_timesteps(matrix_data)
+
+    def rewind(self, n_steps):
+        """
+            Discards all timesteps from n_steps on, e.g. after the simulation has been restarted from a checkpoint.
+            The peak values are recomputed from the remaining timesteps in the results store (reset without store).
+        """
+        print('{}: output truncated to {} timesteps, discarding the following timesteps.'.format(self.case, n_steps))
+        self.n_steps = 0
+        self.buffer[:, :] = np.nan
+        self.statistics = None
+        self.z_reference = None
+        if self.store_file is not None:
+            truncate_case_time_history(self.store_file, self.case, n_steps)
+            self.restore()
+
+    def close(self):
+        if self.monitor_file is not None:
+            self.monitor_file.close()
+            self.monitor_file = None
+
+    def read_new_monitor_timesteps(self):
+        channels = self.monitor_file['channels']
+        channels.refresh()
+        if channels.shape[0] < self.n_steps:
+            self.rewind(channels.shape[0])
+        monitor_data = channels[self.n_steps:, :]
+        data = np.full((monitor_data.shape[0],), np.nan, dtype=time_history_dtype)
+        for i_label, label in enumerate(channels.attrs['labels']):
+            if label in time_history_dtype.names:
+                data[label] = monitor_data[:, i_label]
+        return data
+
+    def read_new_savedata_timesteps(self):
+        try:
+            with h5.File(get_savedata_file(self.output_folder, self.case), 'r') as f:
+                n_steps = get_number_of_timesteps(f)
+                if n_steps < self.n_steps:
+                    self.rewind(n_steps)
+                data = read_timesteps(f, self.n_steps, n_steps)
+        except (OSError, KeyError):
+            # File not created yet or currently written by SaveData
+            return np.zeros((0,), dtype=time_history_dtype)
+        schedule = read_schedule(self.output_folder, self.case)
+        if schedule is not None:
+            data['time'] = get_step_times(schedule, np.arange(self.n_steps, self.n_steps + len(data)))
+        return data
+
+    def read_new_timesteps(self):
+        if self.monitor_file is None and os.path.isfile(get_monitor_file(self.output_folder, self.case)):
+            try:
+                self.monitor_file = h5.File(get_monitor_file(self.output_folder, self.case), 'r', libver='latest',
+                                            swmr=True)
+            except OSError:
+                # Monitor file not switched to SWMR mode yet
+                return np.zeros((0,), dtype=time_history_dtype)
+        if self.monitor_file is not None:
+            self.monitored_labels = [label for label in self.monitor_file['channels'].attrs['labels']
+                                     if label in parameter_labels]
+            return self.read_new_monitor_timesteps()
+        return self.read_new_savedata_timesteps()
+
+    def poll(self):
+        """
+            Processes the timesteps written since the last poll.
+
+            Returns:
+                tuple: number of new timesteps, reason to abort the simulation (None if no limit is exceeded)
+        """
+        data = self.read_new_timesteps()
+        if len(data) == 0:
+            return 0, None
+        matrix_data = data.view(np.float64).reshape(len(data), len(time_history_dtype))
+        # The root loads of the initial timestep are not available if BeamLoads has not been run before the
+        # dynamic simulation (see channel_monitor.py), so the initial timestep is not checked for divergence
+        checked_data = data[1:] if self.n_steps == 0 else data
+        self.add_timesteps(matrix_data)
+        if self.store_file is not None:
+            append_case_results(self.store_file, self.case, self.statistics, matrix_data, parameter_labels)
+        return len(data), self.check_limits(checked_data)
+
+    def add_timesteps(self, matrix_data):
+        # Ring buffer (row n_steps % buffer_size holds timestep n_steps)
+        i_buffer = np.arange(self.n_steps, self.n_steps + len(matrix_data)) % self.buffer.shape[0]
+        self.buffer[i_buffer[-self.buffer.shape[0]:], :] = matrix_data[-self.buffer.shape[0]:, :]
+        self.n_steps += len(matrix_data)
+
+        if self.z_reference is None:
+            self.z_reference = matrix_data[0, 1 + parameter_labels.index('z')]
+        new_statistics = get_case_statistics(matrix_data, parameter_labels, z_reference=self.z_reference)
+        if self.statistics is None:
+            self.statistics = new_statistics
+        else:
+            self.statistics = merge_case_statistics(self.statistics, new_statistics)
+
+    def check_limits(self, data):
+        for label in self.monitored_labels:
+            if not np.all(np.isfinite(data[label])):
+                return 'Solution diverged ({} not finite at t = {:.4f} s).'.format(
+                    label, data['time'][np.argmax(~np.isfinite(data[label]))])
+        for label, limit in self.load_limits.items():
+            exceeding = np.abs(data[label]) > limit
+            if np.any(exceeding):
+                return '{} limit of {:g} exceeded at t = {:.4f} s.'.format(label, limit,
+                                                                          data['time'][np.argmax(exceeding)])
+        return None
+
+    def get_buffer(self):
+        """
+            Returns the timesteps in the ring buffer in chronological order.
+        """
+        n_buffered = min(self.n_steps, self.buffer.shape[0])
+        i_buffer = np.arange(self.n_steps - n_buffered, self.n_steps) % self.buffer.shape[0]
+        return self.buffer[i_buffer, :]
+
+    def abort(self, reason, pid=None):
+        with open(os.path.join(self.output_folder, self.case, self.case + '.abort.json'), 'w') as f:
+            json.dump({'reason': reason, 'n_steps': self.n_steps, 'statistics': self.statistics}, f, indent=4)
+        if pid is not None:
+            os.kill(pid, signal.SIGTERM)
+
+    def follow(self, poll_interval=10., timeout=600., pid=None):
+        """
+            Polls the output until no new timestep has been written for timeout seconds or the simulation process
+            (if pid is given) has finished. If a limit is exceeded, the simulation is aborted.
+
+            Returns:
+                str: reason of the abort (None if the simulation has not been aborted)
+        """
+        last_update = time.time()
+        try:
+            while True:
+                n_new_steps, reason = self.poll()
+                if reason is not None:
+                    print('Aborting case {}: {}'.format(self.case, reason))
+                    self.abort(reason, pid=pid)
+                    return reason
+                if n_new_steps > 0:
+                    last_update = time.time()
+                    print('{}: {} timesteps, max |OOP| = {:.4g}'.format(self.case, self.n_steps,
+                                                                        self.statistics['max_abs_OOP']))
+                elif time.time() - last_update > timeout or (pid is not None and not is_process_running(pid)):
+                    # Read timesteps written before the simulation finished
+                    self.poll()
+                    return None
+                time.sleep(poll_interval)
+        finally:
+            self.close()
+
+
+def is_process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow a running gust response simulation')
+    parser.add_argument('output_folder', help='SHARPy output folder')
+    parser.add_argument('case', help='case name')
+    parser.add_argument('--store_file', default=route_dir + '/results_gust_response/gust_response.h5')
+    parser.add_argument('--pid', type=int, default=None, help='process id of the simulation (aborted if a limit is exceeded)')
+    parser.add_argument('--limit', nargs=2, action='append', default=[], metavar=('LABEL', 'VALUE'),
+                        help='maximum absolute value of a column, e.g. --limit OOP 5000')
+    parser.add_argument('--poll_interval', type=float, default=10.)
+    parser.add_argument('--timeout', type=float, default=600.)
+    args = parser.parse_args()
+
+    follower = GustResponseFollower(args.output_folder,
+                                    args.case,
+                                    store_file=args.store_file,
+                                    load_limits={label: float(value) for label, value in args.limit})
+    follower.follow(poll_interval=args.poll_interval, timeout=args.timeout, pid=args.pid)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,4 @@
-import flexop as aircraft
-import numpy as np
-from helper_functions.get_settings import get_settings
+from helper_functions.linear_system_case import get_default_rom_settings, run_linear_case
 
 
 cases_route = '../01_case_files/01_case_files/'
@@ -10,62 +8,42 @@ case_name = 'flexop_sigma_03_free_flight_linear'
 
 
 # Trim values for SuperFLEXOP
-trim_values = {'alpha':6.796482976011756182e-03, 
+trim_values = {'alpha':6.796482976011756182e-03,
                 'delta':-1.784287512500099069e-03,
                 'thrust': 2.290077074834680371e+00
                 }
 
 lifting_only = True # ignore nonlifting bodies
 wing_only = False # Wing only or full configuration (wing+tail)
-dynamic = True 
+dynamic = True
 use_rom = False
 remove_gust_input_in_statespace = False
-
-flow = [
-        'BeamLoader', 
-        'Modal',
-        'AerogridLoader',
-        'StaticCoupled',
-        # 'StaticTrim',     
-        'DynamicCoupled',
-        'Modal',
-        'LinearAssembler',
-        # 'AsymptoticStability',
-        'SaveData',
-]
+use_trim = False # Trim with StaticTrim instead of StaticCoupled at the given trim values
+stability_analysis = False # Run AsymptoticStability on the linear system
+low_memory = False # Sparse UVLM assembly and saving of the linear system without dense copies (refined discretisations)
+save_linear_uvlm = False # Save the full-order UVLM state space in low-memory mode
+use_trim_cache = False # Take trim values from (or, if not cached yet, compute them with StaticTrim and add them to) the trim cache
+trim_cache_file = './trim_cache.json'
 
 # Set cruise parameter
 alpha = trim_values['alpha'] # rad
-u_inf = 45 
+u_inf = 45
 rho = 1.1336 # corresponds to an altitude of 800  m
 gravity =  True
-horseshoe =  False 
+horseshoe =  False
 wake_length = 10
-cfl1 = True 
+cfl1 = True
 free_flight = True
 cs_deflection = trim_values['delta'] # rad
-cs_deflection_initial = cs_deflection 
-thrust = trim_values['thrust'] 
+thrust = trim_values['thrust']
 num_modes = 21
 num_chord_panels = 8
 n_elem_multiplier = 2
 n_elem_multiplier_tail = n_elem_multiplier
+sigma = 0.3 # SuperFLEXOP 0.3, ModifiedFLEXOP 1.
 
-# Init FLEXOP Model
-flexop_model = aircraft.FLEXOP(case_name, cases_route, output_route)
-flexop_model.clean()
-flexop_model.init_structure(sigma=0.3, # SuperFLEXOP 0.3, ModifiedFLEXOP 1.
-                            n_elem_multiplier=n_elem_multiplier, # Discretisation of wing beam
-                            n_elem_multiplier_tail=n_elem_multiplier_tail, # Discretisation of tail beam
-                            n_elem_multiplier_fuselage = 1, # Discretisation of fuselage beam
-                            lifting_only=lifting_only, 
-                            wing_only = wing_only) 
-
-flexop_model.init_aero(m=num_chord_panels, cs_deflection = cs_deflection) 
-flexop_model.structure.set_thrust(thrust)
 #  Simulation settings
 CFL = 1
-dt = CFL * flexop_model.aero.chord_main_root / flexop_model.aero.m / u_inf
 # numerics
 n_step = 5
 structural_relaxation_factor = 0.6
@@ -74,42 +52,48 @@ tolerance = 1e-6
 fsi_tolerance = 1e-4
 num_cores = 4
 newmark_damp = 0.5e-4
-n_tstep = 1 
+n_tstep = 1
+velocity_analysis = [20, 80, 13] # Velocity range (start, end, number of points) of AsymptoticStability
 
 # ROM settings
-rom_settings = {
-    'use': use_rom,
-    'rom_method': 'Krylov',
-    'rom_method_settings': {'Krylov': {
-                                        'algorithm': 'mimo_rational_arnoldi',
-                                        'r': 4, 
-                                        'frequency': np.array([0]),
-                                        'single_side': 'observability',
-                                        },
-                           }
-                }
-# Get settings dict
-settings = get_settings(flexop_model,
-                        flow,
-                        dt,
-                        alpha = alpha,
-                        cs_deflection = cs_deflection,
-                        u_inf = u_inf,
-                        rho = rho,
-                        thrust = thrust,
-                        wake_length = wake_length,
-                        free_flight = free_flight,
-                        num_cores = num_cores,
-                        tolerance = tolerance,
-                        fsi_tolerance = fsi_tolerance,
-                        structural_relaxation_factor = structural_relaxation_factor,
-                        newmark_damp = newmark_damp,
-                        n_tsteps = n_tstep,
-                        num_modes = num_modes,
-                        rom_settings = rom_settings,
-                        remove_gust_input_in_statespace=remove_gust_input_in_statespace)
+rom_settings = get_default_rom_settings(use_rom)
+
+# Case parameters (see helper_functions/linear_system_case.py)
+case_parameters = {'factor_material_stiffness': sigma,
+                   'n_elem_multiplier': n_elem_multiplier,
+                   'n_elem_multiplier_tail': n_elem_multiplier_tail,
+                   'num_chord_panels': num_chord_panels,
+                   'wing_only': wing_only,
+                   'lifting_only': lifting_only,
+                   'use_trim': use_trim,
+                   'stability_analysis': stability_analysis,
+                   'alpha': alpha,
+                   'cs_deflection': cs_deflection,
+                   'thrust': thrust,
+                   'u_inf': u_inf,
+                   'rho': rho,
+                   'gravity': gravity,
+                   'horseshoe': horseshoe,
+                   'wake_length': wake_length,
+                   'free_flight': free_flight,
+                   'CFL': CFL,
+                   'num_cores': num_cores,
+                   'tolerance': tolerance,
+                   'fsi_tolerance': fsi_tolerance,
+                   'structural_relaxation_factor': structural_relaxation_factor,
+                   'relaxation_factor': relaxation_factor,
+                   'newmark_damp': newmark_damp,
+                   'n_tstep': n_tstep,
+                   'num_modes': num_modes,
+                   'use_rom': use_rom,
+                   'rom_settings': rom_settings,
+                   'velocity_analysis': velocity_analysis,
+                   'remove_gust_input_in_statespace': remove_gust_input_in_statespace,
+                   'low_memory': low_memory,
+                   'save_linear_uvlm': save_linear_uvlm,
+                   'trim_cache_file': trim_cache_file if use_trim_cache else None,
+                   }
+
 
-# Generate finale FLEXOP model
-flexop_model.generate()
-flexop_model.create_settings(settings)
-flexop_model.run()
+if __name__ == '__main__':
+    run_linear_case(case_name, cases_route, output_route, case_parameters)
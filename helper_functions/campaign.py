@@ -0,0 +1,295 @@
+"""
+    Utilities to run campaigns of nonlinear (Super)Flexop cases, e.g. certification gust sweeps, in a process
+    pool. Each case is built from a base case parameter dictionary (see run_nonlinear_simulation.py) with the
+    parameters of one point of the campaign's parameter grid applied. Every case gets its own case and output
+    route, so that the model files written or removed by one case (flexop_model.clean()) never affect another.
+    Finished cases are marked with a small JSON file in their output route and are skipped when the campaign
+    is restarted, e.g. after a crash or a pre-empted cluster job.
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from helper_functions.settings_tools import diff_settings, get_fingerprint, settings_fingerprint
+
+# Short labels used in the case names, e.g. superflexop_free_L_10_I_10
+case_name_labels = {'gust_length': 'L',
+                    'gust_intensity': 'I',
+                    'factor_material_stiffness': 'sigma',
+                    'u_inf': 'u',
+                    'num_chord_panels': 'm',
+                    'n_elem_multiplier': 'n',
+                    'n_elem_multiplier_tail': 'nt',
+                    'n_elem_multiplier_fuselage': 'nf',
+                    'wake_length': 'wake',
+                    'wake_discretisation': 'variable',
+                    }
+
+
+def get_parameter_grid(parameter_grid):
+    """
+        Returns the list of all parameter combinations (dict per case) of the given grid, e.g.
+        {'gust_length': [10., 20.], 'gust_intensity': [0.05, 0.1]} results in four cases.
+    """
+    keys = list(parameter_grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[parameter_grid[key] for key in keys])]
+
+
+def format_case_name_value(value):
+    if isinstance(value, bool):
+        return 'on' if value else 'off'
+    if isinstance(value, float):
+        return '{:g}'.format(value).replace('.', 'p').replace('-', 'm')
+    return str(value)
+
+
+def get_case_name(base_name, case_overrides):
+    case_name = base_name
+    for key, value in case_overrides.items():
+        if key == 'free_flight':
+            case_name += '_free' if value else '_clamped'
+        elif key == 'gust_intensity':
+            # Intensity in percent of the free stream velocity
+            case_name += '_I_{}'.format(format_case_name_value(float(value * 100)))
+        else:
+            case_name += '_{}_{}'.format(case_name_labels.get(key, key), format_case_name_value(value))
+    return case_name
+
+
+def get_case_routes(campaign_route, case_name):
+    """
+        Returns unique case and output routes of a campaign case. SHARPy writes its output to
+        <output_route>/<case_name>/.
+    """
+    cases_route = os.path.join(campaign_route, 'cases', case_name) + '/'
+    output_route = os.path.join(campaign_route, 'output', case_name) + '/'
+    return cases_route, output_route
+
+
+def get_done_marker(output_route, case_name):
+    return os.path.join(output_route, case_name + '.done.json')
+
+
+def is_case_done(output_route, case_name):
+    return os.path.isfile(get_done_marker(output_route, case_name))
+
+
+def write_done_marker(output_route, case_name, case_parameters, wall_time):
+    marker = get_done_marker(output_route, case_name)
+    with open(marker + '.tmp', 'w') as f:
+        json.dump({'case_name': case_name,
+                   'wall_time': wall_time,
+                   'case_parameters': case_parameters}, f, indent=4, default=str)
+    os.replace(marker + '.tmp', marker)
+
+
+def read_wall_time(output_route, case_name):
+    with open(get_done_marker(output_route, case_name), 'r') as f:
+        return json.load(f)['wall_time']
+
+
+def get_campaign_case_settings(case):
+    # Settings of a case of run_campaign_case (see simulation_case.get_frozen_case_settings)
+    from helper_functions.simulation_case import get_frozen_case_settings
+    return get_frozen_case_settings(case)
+
+
+# Normalised settings of the campaign cases evaluated so far (see get_normalised_case_settings)
+normalised_settings_cache = {}
+
+
+def get_normalised_case_settings(case, case_settings):
+    """
+        Returns the settings of a campaign case with common placeholder case name and routes and a single core, so
+        that the settings of identical cases are identical although their names and routes differ. The settings
+        only depend on the case parameters and are evaluated once per case parameters, e.g. for both the campaign
+        manifest and run_campaign.
+    """
+    key = (case_settings.__module__, case_settings.__qualname__,
+           get_fingerprint({key: value for key, value in case[3].items() if key != 'num_cores'}))
+    if key not in normalised_settings_cache:
+        normalised_settings_cache[key] = case_settings(('case', './cases/', './output/', dict(case[3], num_cores=1)))
+    return normalised_settings_cache[key]
+
+
+def get_case_fingerprint(case, case_settings=None):
+    """
+        Returns the fingerprint of a campaign case. With a function returning the settings of a case (e.g.
+        get_campaign_case_settings), the fingerprint combines the model files (see model_cache.get_model_key) and
+        the settings, so that cases whose parameters differ without changing the simulation (e.g. output or cache
+        options) are identical. Otherwise, all case parameters are compared. The number of cores does not change
+        the results of a case and is ignored.
+    """
+    if case_settings is None:
+        return get_fingerprint({key: value for key, value in case[3].items() if key != 'num_cores'})
+    from helper_functions.model_cache import get_model_key
+    return get_fingerprint({'model': get_model_key(case[3]),
+                            'settings': settings_fingerprint(get_normalised_case_settings(case, case_settings))})
+
+
+def deduplicate_cases(list_cases, case_settings=None):
+    """
+        Removes identical cases (see get_case_fingerprint) from a campaign.
+
+        Returns:
+            tuple: list of unique cases, dict: duplicate case name -> case name of the identical case
+    """
+    list_unique_cases = []
+    case_fingerprints = {}
+    duplicates = {}
+    for case in list_cases:
+        fingerprint = get_case_fingerprint(case, case_settings)
+        if fingerprint in case_fingerprints:
+            duplicates[case[0]] = case_fingerprints[fingerprint]
+        else:
+            case_fingerprints[fingerprint] = case[0]
+            list_unique_cases.append(case)
+    return list_unique_cases, duplicates
+
+
+def split_cores(num_cores_total, num_cases, max_cores_per_case=4, max_processes=None):
+    """
+        Splits the available cores between concurrent cases and the number of cores used by the UVLM solver
+        of each case. Running cases concurrently scales better than the shared memory parallelisation of the
+        UVLM, so cores are first distributed across cases and only cases left with spare cores use more
+        than one UVLM thread (up to max_cores_per_case).
+
+        Returns:
+            tuple: number of concurrent processes, number of cores per case
+    """
+    max_processes = num_cores_total if max_processes is None else max_processes
+    num_processes = max(1, min(num_cases, num_cores_total, max_processes))
+    cores_per_case = max(1, min(max_cores_per_case, num_cores_total // num_processes))
+    return num_processes, cores_per_case
+
+
+def run_campaign_case(case):
+    """
+        Runs a single campaign case, or resumes it from its latest checkpoint if it has been interrupted, and
+        compacts its output if output_compaction is set (see helper_functions/output_compaction.py).
+        Executed in a worker process of the campaign's process pool.
+
+        Returns:
+            tuple: case name, success flag, wall time, error message
+    """
+    from helper_functions.output_compaction import compact_finished_case
+    from helper_functions.simulation_case import resume_flexop_case
+
+    case_name, cases_route, output_route, case_parameters = case
+    start_time = time.time()
+    try:
+        resume_flexop_case(case_name, cases_route, output_route, case_parameters)
+        compact_finished_case(output_route, case_name, case_parameters)
+    except Exception:
+        return case_name, False, time.time() - start_time, traceback.format_exc()
+    wall_time = time.time() - start_time
+    write_done_marker(output_route, case_name, case_parameters, wall_time)
+    return case_name, True, wall_time, ''
+
+
+def get_campaign_cases(campaign_route, base_name, base_parameters, parameter_grid):
+    """
+        Returns the list of all cases of a campaign, each given as (case name, case route, output route,
+        case parameters).
+    """
+    from helper_functions.simulation_case import get_case_parameters
+
+    list_cases = []
+    for case_overrides in get_parameter_grid(parameter_grid):
+        case_name = get_case_name(base_name, case_overrides)
+        cases_route, output_route = get_case_routes(campaign_route, case_name)
+        list_cases.append((case_name,
+                           cases_route,
+                           output_route,
+                           get_case_parameters(base_parameters, **case_overrides)))
+    return list_cases
+
+
+def write_campaign_manifest(campaign_route, list_cases, case_settings=get_campaign_case_settings):
+    """
+        Writes the campaign manifest <campaign_route>/campaign.json with the routes, parameters and duplicate case
+        of each case. If case_settings is given (see get_case_fingerprint), the settings entries of each case that
+        differ from the first case are listed as well (settings_changes).
+    """
+    if not os.path.exists(campaign_route):
+        os.makedirs(campaign_route)
+    _, duplicates = deduplicate_cases(list_cases, case_settings)
+    manifest = {case_name: {'cases_route': cases_route,
+                            'output_route': output_route,
+                            'case_parameters': case_parameters,
+                            'duplicate_of': duplicates.get(case_name)}
+                for case_name, cases_route, output_route, case_parameters in list_cases}
+    if case_settings is not None and len(list_cases) > 0:
+        reference_settings = get_normalised_case_settings(list_cases[0], case_settings)
+        for case in list_cases:
+            differences = diff_settings(reference_settings, get_normalised_case_settings(case, case_settings))
+            manifest[case[0]]['settings_changes'] = sorted('/'.join(str(key) for key in path)
+                                                           for path in differences.keys())
+    with open(os.path.join(campaign_route, 'campaign.json'), 'w') as f:
+        json.dump(manifest, f, indent=4, default=str)
+
+
+def get_campaign_postprocessing_cases(campaign_route):
+    """
+        Returns the cases of a campaign to be postprocessed, each given as (SHARPy output folder, case name, case
+        parameters), based on the campaign manifest. Duplicate cases are skipped as they have not been run.
+    """
+    with open(os.path.join(campaign_route, 'campaign.json'), 'r') as f:
+        manifest = json.load(f)
+    return [(case['output_route'], case_name, case['case_parameters'])
+            for case_name, case in manifest.items() if case['duplicate_of'] is None]
+
+
+def run_campaign(list_cases, num_cores_total, max_cores_per_case=4, max_processes=None, run_case=run_campaign_case,
+                 case_settings=get_campaign_case_settings):
+    """
+        Runs all unfinished cases of a campaign in a process pool. Each case is run in a fresh worker process
+        to avoid any SHARPy state being shared between cases. Cases identical to another case of the campaign
+        (see get_case_fingerprint, with the settings given by case_settings, which need to match run_case) are only
+        run once.
+
+        Returns:
+            dict: case name -> (success flag, wall time, error message) of all cases run
+    """
+    list_cases, duplicates = deduplicate_cases(list_cases, case_settings)
+    for duplicate_case_name, case_name in duplicates.items():
+        print('Skipping case {} (identical to case {}).'.format(duplicate_case_name, case_name))
+    list_pending = [case for case in list_cases if not is_case_done(case[2], case[0])]
+    num_skipped = len(list_cases) - len(list_pending)
+    if num_skipped > 0:
+        print('Skipping {} finished cases.'.format(num_skipped))
+    if len(list_pending) == 0:
+        return {}
+
+    num_processes, cores_per_case = split_cores(num_cores_total,
+                                                len(list_pending),
+                                                max_cores_per_case=max_cores_per_case,
+                                                max_processes=max_processes)
+    for case in list_pending:
+        case[3]['num_cores'] = cores_per_case
+    print('Running {} cases on {} processes with {} cores each.'.format(len(list_pending),
+                                                                        num_processes,
+                                                                        cores_per_case))
+
+    # Limit threaded libraries in the worker processes to the cores assigned to each case (the environment is
+    # inherited by the spawned workers and restored once the pool is closed)
+    previous_omp_num_threads = os.environ.get('OMP_NUM_THREADS')
+    os.environ['OMP_NUM_THREADS'] = str(cores_per_case)
+    results = {}
+    try:
+        with multiprocessing.get_context('spawn').Pool(num_processes, maxtasksperchild=1) as pool:
+            for case_name, success, wall_time, error in pool.imap_unordered(run_case, list_pending):
+                results[case_name] = (success, wall_time, error)
+                if success:
+                    print('Finished case {} in {:.1f} s.'.format(case_name, wall_time))
+                else:
+                    print('Case {} failed after {:.1f} s:\n{}'.format(case_name, wall_time, error))
+    finally:
+        if previous_omp_num_threads is None:
+            del os.environ['OMP_NUM_THREADS']
+        else:
+            os.environ['OMP_NUM_THREADS'] = previous_omp_num_threads
+    return results
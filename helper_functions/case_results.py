@@ -0,0 +1,246 @@
+"""
+    Lazy, column-oriented access to the SHARPy savedata output of a case (<output_folder>/<case>/savedata/
+    <case>.data.h5, written by SaveData at each timestep).
+
+    CaseResults resolves the timestep groups of the file once and exposes named channels, i.e. the time history of
+    a part of a dataset of the structural or aerodynamic timestep info, e.g.
+        results = CaseResults.from_output(output_folder, case)
+        results.node_pos(node_tip)              # (n_steps, 3)
+        results.element_loads(0)[:, 4]          # root out-of-plane bending moment
+        results.u_ext(0, 0, 0)[:, 2]            # vertical gust velocity at the leading edge
+    Only the selected part (hyperslab) of each dataset is read, on first access of the channel. Channels are cached
+    with a memory cap and least recently used eviction, so that interactive investigations never read a channel
+    twice. Several channels are read in a single pass over the timesteps with read_channels, e.g. for exports.
+    Compacted savedata files (see helper_functions/output_compaction.py) are read the same way, with the
+    aerodynamic datasets of the dropped timesteps read as NaN.
+"""
+
+import collections
+import os
+import h5py as h5
+from h5py import h5d, h5g, h5s
+import numpy as np
+from helper_functions.kinematics import body_to_inertial, quat2euler
+from helper_functions.time_step_schedule import get_step_times, read_schedule
+
+
+def get_savedata_file(output_folder, case):
+    return os.path.join(output_folder, case, 'savedata', case + '.data.h5')
+
+
+def get_hyperslab_reader(timestep_group, dataset_name, start, count):
+    """
+        Returns a function reading the hyperslab (start, count) of the dataset with the given name from any
+        timestep group (low-level HDF5 group identifier). The dataspace selections are created once and
+        reused for all timesteps.
+    """
+    file_space = timestep_group[dataset_name].id.get_space()
+    file_space.select_hyperslab(start, count)
+    buffer = np.zeros(int(np.prod(count)))
+    memory_space = h5s.create_simple(buffer.shape)
+
+    def read_hyperslab(timestep_group_id):
+        h5d.open(timestep_group_id, dataset_name.encode()).read(memory_space, file_space, buffer)
+        return buffer
+
+    return read_hyperslab
+
+
+def get_number_of_timesteps(f):
+    # Number of completely written timesteps of an open savedata file
+    return max(0, len(f['data']['structure']['timestep_info'].keys())-2)
+
+
+def get_hyperslab(shape, index):
+    """
+        Returns the hyperslab (start, count) and the shape of the selection of a dataset of the given shape by an
+        index (tuple of integers and contiguous slices, missing trailing dimensions are selected entirely).
+    """
+    index = tuple(index) + (slice(None),) * (len(shape) - len(index))
+    start, count, selection_shape = [], [], []
+    for i_dim, (dim_index, dim_size) in enumerate(zip(index, shape)):
+        if isinstance(dim_index, slice):
+            dim_start, dim_stop, dim_step = dim_index.indices(dim_size)
+            if dim_step != 1:
+                raise ValueError('Only contiguous slices are supported.')
+            start.append(dim_start)
+            count.append(max(0, dim_stop - dim_start))
+            selection_shape.append(count[-1])
+        else:
+            dim_index = int(dim_index)
+            if dim_index < 0:
+                dim_index += dim_size
+            if not 0 <= dim_index < dim_size:
+                raise IndexError('Index {} out of range for dimension {} of size {}.'.format(dim_index, i_dim, dim_size))
+            start.append(dim_index)
+            count.append(1)
+    return tuple(start), tuple(count), tuple(selection_shape)
+
+
+class CaseResults:
+    """
+        Lazy, cached access to the channels of the savedata file of a case. The file is kept open until close() is
+        called (or the context manager is left).
+
+        Args:
+            file (str): savedata file
+            max_cache_size (int): memory cap of the channel cache [bytes]
+            schedule (list): time step schedule of the case (see helper_functions/time_step_schedule.py), None for
+                             a constant time step
+    """
+    def __init__(self, file, max_cache_size=512 * 1024 ** 2, schedule=None):
+        self.file = file
+        self.max_cache_size = max_cache_size
+        self.cache = collections.OrderedDict()
+        self.cache_size = 0
+        self.f = h5.File(file, 'r')
+        self.structure_timestep_info = self.f['data']['structure']['timestep_info']
+        self.aero_timestep_info = self.f['data']['aero']['timestep_info']
+        self.n_steps = get_number_of_timesteps(self.f)
+        self.dt = float(str(np.array(self.f['data']['settings']['DynamicCoupled']['dt'])))
+        self.schedule = schedule
+
+        # Timestep groups resolved once
+        self.timestep_ids = {'structure': [], 'aero': []}
+        for its in range(self.n_steps):
+            ts_str = f'{its:05d}'.encode()
+            self.timestep_ids['structure'].append(h5g.open(self.structure_timestep_info.id, ts_str))
+            self.timestep_ids['aero'].append(h5g.open(self.aero_timestep_info.id, ts_str))
+
+    @classmethod
+    def from_output(cls, output_folder, case, **kwargs):
+        return cls(get_savedata_file(output_folder, case), schedule=read_schedule(output_folder, case), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.timestep_ids = {'structure': [], 'aero': []}
+        if self.f.id.valid:
+            self.f.close()
+
+    @property
+    def time(self):
+        if self.schedule is not None:
+            return get_step_times(self.schedule, np.arange(self.n_steps))
+        return np.arange(self.n_steps) * self.dt
+
+    def get_timestep_group(self, model):
+        if model == 'structure':
+            return self.structure_timestep_info['00000']
+        elif model == 'aero':
+            return self.aero_timestep_info['00000']
+        raise KeyError('Unknown model {} (structure or aero).'.format(model))
+
+    def get_cached(self, key):
+        if key not in self.cache:
+            return None
+        self.cache.move_to_end(key)
+        return self.cache[key]
+
+    def store(self, key, data):
+        data.flags.writeable = False
+        if data.nbytes > self.max_cache_size:
+            return
+        self.cache[key] = data
+        self.cache_size += data.nbytes
+        while self.cache_size > self.max_cache_size:
+            _, evicted_data = self.cache.popitem(last=False)
+            self.cache_size -= evicted_data.nbytes
+
+    def read_channels(self, channels):
+        """
+            Returns the time histories of the given channels, each given as (model, dataset, index), e.g.
+            ('structure', 'pos', (node, slice(None))) or ('aero', 'u_ext/00000', (2, 0, 0)). Channels that are not
+            cached are read together in a single pass over the timesteps.
+
+            Returns:
+                list: time history of each channel (n_steps, *shape of the selection), read-only
+        """
+        keys = []
+        selections = []
+        for model, dataset, index in channels:
+            timestep_group = self.get_timestep_group(model)
+            start, count, selection_shape = get_hyperslab(timestep_group[dataset].shape, index)
+            keys.append((model, dataset, start, count))
+            selections.append((timestep_group, selection_shape))
+        list_data = [self.get_cached(key) for key in keys]
+        pending = {}
+        for key, (timestep_group, selection_shape), data in zip(keys, selections, list_data):
+            if data is None and key not in pending:
+                model, dataset, start, count = key
+                pending[key] = (model,
+                                get_hyperslab_reader(timestep_group, dataset, start, count),
+                                np.zeros((self.n_steps,) + selection_shape))
+
+        for its in range(self.n_steps):
+            for model, read_hyperslab, data in pending.values():
+                try:
+                    data[its] = read_hyperslab(self.timestep_ids[model][its]).reshape(data.shape[1:])
+                except KeyError:
+                    # Dataset dropped from this timestep by the output compaction (see output_compaction.py)
+                    data[its] = np.nan
+        for key, (_, _, data) in pending.items():
+            self.store(key, data)
+        return [pending[key][2] if data is None else data for key, data in zip(keys, list_data)]
+
+    def channel(self, model, dataset, *index):
+        return self.read_channels([(model, dataset, index)])[0]
+
+    # Structural channels
+    def node_pos(self, node):
+        return self.channel('structure', 'pos', node)
+
+    def node_pos_dot(self, node):
+        return self.channel('structure', 'pos_dot', node)
+
+    def element_psi(self, element, node=-1):
+        # Cartesian rotation vector of a node (local index within the element)
+        return self.channel('structure', 'psi', element, node)
+
+    def element_psi_dot(self, element, node=-1):
+        return self.channel('structure', 'psi_dot', element, node)
+
+    def element_loads(self, element):
+        # Internal loads (forces and moments in the material frame, see BeamLoads)
+        return self.channel('structure', 'postproc_cell/loads', element)
+
+    def quat(self):
+        return self.channel('structure', 'quat')
+
+    def for_pos(self):
+        return self.channel('structure', 'for_pos')
+
+    def for_vel(self):
+        return self.channel('structure', 'for_vel')
+
+    def euler_angles(self):
+        # Roll, pitch and yaw angle of the aircraft [rad]
+        return quat2euler(self.quat())
+
+    def inertial_node_pos(self, nodes=slice(None)):
+        # Position of the given nodes in the inertial frame, including the rigid body motion (n_steps, n_node, 3)
+        quat, for_pos, pos = self.read_channels([('structure', 'quat', ()),
+                                                 ('structure', 'for_pos', ()),
+                                                 ('structure', 'pos', (nodes,))])
+        if pos.ndim == 2:
+            return body_to_inertial(pos[:, np.newaxis, :], quat, for_pos)[:, 0, :]
+        return body_to_inertial(pos, quat, for_pos)
+
+    # Aerodynamic channels
+    def u_ext(self, surface, chordwise=slice(None), spanwise=slice(None)):
+        # External (gust) velocity at the given lattice vertices of a surface, components first
+        return self.channel('aero', 'u_ext/{:05d}'.format(surface), slice(None), chordwise, spanwise)
+
+    def aero_forces(self, surface, chordwise=slice(None), spanwise=slice(None)):
+        # Steady aerodynamic forces and moments at the given lattice vertices of a surface, components first
+        return self.channel('aero', 'forces/{:05d}'.format(surface), slice(None), chordwise, spanwise)
+
+    def dynamic_aero_forces(self, surface, chordwise=slice(None), spanwise=slice(None)):
+        return self.channel('aero', 'dynamic_forces/{:05d}'.format(surface), slice(None), chordwise, spanwise)
+
+    def gamma(self, surface, chordwise=slice(None), spanwise=slice(None)):
+        return self.channel('aero', 'gamma/{:05d}'.format(surface), chordwise, spanwise)
@@ -0,0 +1,201 @@
+"""
+    ChannelMonitor: lightweight SHARPy postprocessor that is run at each timestep of DynamicCoupled and appends
+    only a few requested channels (e.g. tip displacements, root loads, pitch angle and gust velocity at the
+    leading edge) to a chunked, append-only array in <output_folder>/monitor/<case>.monitor.h5. The initial timestep
+    is written when the postprocessor is initialised, so that the rows match the timesteps of the savedata file.
+
+    It replaces the SaveData dump of the whole aerodynamic grid, wake and structural state at each timestep.
+    A full SaveData dump can still be written every full_dump_stride timesteps. The default channels and
+    their order match the columns written by postprocess_gust_response.py, which reads the monitor file
+    directly if available.
+
+    The postprocessor is registered with SHARPy when this module is imported.
+"""
+
+import os
+import h5py as h5
+import numpy as np
+import sharpy.utils.algebra as algebra
+import sharpy.utils.settings as settings_utils
+from sharpy.utils.solver_interface import solver, BaseSolver, initialise_solver
+
+# Channel name: column labels
+channel_labels = {'u_ext_le': ['omega_z'],
+                  'tip_pos': ['x', 'y', 'z'],
+                  'tip_pos_dot': ['x_dot', 'y_dot', 'z_dot'],
+                  'tip_psi': ['r', 'p', 'q'],
+                  'tip_psi_dot': ['r_dot', 'p_dot', 'q_dot'],
+                  'root_loads': ['OOP', 'MT'],
+                  'pitch': ['Pitch'],
+                  'quat': ['quat_w', 'quat_x', 'quat_y', 'quat_z'],
+                  }
+default_channels = ['u_ext_le', 'tip_pos', 'tip_pos_dot', 'tip_psi', 'tip_psi_dot', 'root_loads', 'pitch']
+
+
+def get_monitor_file(output_folder, case):
+    return os.path.join(output_folder, case, 'monitor', case + '.monitor.h5')
+
+
+@solver
+class ChannelMonitor(BaseSolver):
+    """
+        Appends the requested channels of the current timestep to the monitor file. Root loads require
+        BeamLoads to be run before this postprocessor.
+    """
+    solver_id = 'ChannelMonitor'
+    solver_classification = 'postprocessor'
+
+    settings_types = dict()
+    settings_default = dict()
+    settings_description = dict()
+
+    settings_types['channels'] = 'list(str)'
+    settings_default['channels'] = default_channels
+    settings_description['channels'] = 'Channels to be monitored ({})'.format(', '.join(channel_labels.keys()))
+
+    settings_types['buffer_size'] = 'int'
+    settings_default['buffer_size'] = 100
+    settings_description['buffer_size'] = 'Number of timesteps buffered in memory before being written to disk'
+
+    settings_types['full_dump_stride'] = 'int'
+    settings_default['full_dump_stride'] = 0
+    settings_description['full_dump_stride'] = 'Write a full SaveData dump every n-th timestep (0: never)'
+
+    settings_types['time_offset'] = 'float'
+    settings_default['time_offset'] = 0.
+    settings_description['time_offset'] = 'Physical time minus timestep index * dt (non-zero for the segments of a time step schedule)'
+
+    settings_types['save_data_settings'] = 'dict'
+    settings_default['save_data_settings'] = dict()
+    settings_description['save_data_settings'] = 'Settings of the SaveData postprocessor used for full dumps'
+
+    def __init__(self):
+        self.settings = None
+        self.data = None
+        self.caller = None
+        self.file = None
+        self.channels = None
+        self.buffer = None
+        self.i_buffer = 0
+        self.node_tip = None
+        self.element_tip = None
+        self.node_root = 0
+        self.save_data = None
+
+    def initialise(self, data, custom_settings=None, caller=None, restart=False):
+        self.data = data
+        if custom_settings is None:
+            self.settings = data.settings[self.solver_id]
+        else:
+            self.settings = custom_settings
+        settings_utils.to_custom_types(self.settings, self.settings_types, self.settings_default)
+        self.caller = caller
+
+        self.channels = list(self.settings['channels'])
+        for channel in self.channels:
+            if channel not in channel_labels:
+                raise KeyError('Unknown monitor channel {}.'.format(channel))
+        labels = ['time'] + [label for channel in self.channels for label in channel_labels[channel]]
+        self.buffer = np.zeros((self.settings['buffer_size'], len(labels)))
+        self.i_buffer = 0
+
+        # Same tip node and element as in postprocess_gust_response.py
+        self.node_tip = np.argmax(self.data.structure.timestep_info[0].pos[:, 1])
+        self.element_tip = int(np.round((self.node_tip - 1) / 2. - 0.1))
+
+        folder = os.path.join(self.data.output_folder, 'monitor')
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.file = h5.File(os.path.join(folder, self.data.settings['SHARPy']['case'] + '.monitor.h5'),
+                            'a' if restart else 'w',
+                            libver='latest')
+        if 'channels' not in self.file:
+            self.file.create_dataset('channels',
+                                     shape=(0, len(labels)),
+                                     maxshape=(None, len(labels)),
+                                     chunks=(self.settings['buffer_size'], len(labels)),
+                                     dtype=np.float64)
+            self.file['channels'].attrs['labels'] = labels
+        elif restart:
+            # Drop the channels written after the timestep the simulation is restarted from, e.g. by a simulation
+            # pre-empted after its latest checkpoint (see checkpoint.py)
+            dt = self.caller.settings['dt']
+            restart_time = self.settings['time_offset'] + (len(self.data.structure.timestep_info) - 1) * dt
+            time = self.file['channels'][:, 0]
+            self.file['channels'].resize(int(np.sum(time <= restart_time + 1e-6 * dt)), axis=0)
+        if not restart:
+            # Initial timestep (before the first timestep of DynamicCoupled), so that the monitor file has the same
+            # rows as the time history read from the savedata file
+            self.add_row(len(self.data.structure.timestep_info) - 1)
+            self.write_buffer()
+        self.file.swmr_mode = True # allows reading the monitor file while the simulation is running
+
+        if self.settings['full_dump_stride'] > 0:
+            self.save_data = initialise_solver('SaveData',
+                                               self.data,
+                                               self.settings['save_data_settings'],
+                                               caller=caller,
+                                               restart=restart)
+
+    def get_channel(self, channel, ts):
+        structure_tstep = self.data.structure.timestep_info[ts]
+        if channel == 'u_ext_le':
+            return self.data.aero.timestep_info[ts].u_ext[0][2, 0, 0]
+        elif channel == 'tip_pos':
+            return structure_tstep.pos[self.node_tip, :]
+        elif channel == 'tip_pos_dot':
+            return structure_tstep.pos_dot[self.node_tip, :]
+        elif channel == 'tip_psi':
+            return structure_tstep.psi[self.element_tip, -1, :]
+        elif channel == 'tip_psi_dot':
+            return structure_tstep.psi_dot[self.element_tip, -1, :]
+        elif channel == 'root_loads':
+            if 'loads' not in structure_tstep.postproc_cell:
+                # BeamLoads not run for this timestep, e.g. the initial timestep
+                return np.full((2,), np.nan)
+            return structure_tstep.postproc_cell['loads'][self.node_root, [4, 3]]
+        elif channel == 'pitch':
+            return algebra.quat2euler(structure_tstep.quat)[1]
+        elif channel == 'quat':
+            return structure_tstep.quat
+
+    def add_row(self, ts):
+        row = self.buffer[self.i_buffer, :]
+        row[0] = self.settings['time_offset'] + ts * self.caller.settings['dt']
+        i_column = 1
+        for channel in self.channels:
+            n_columns = len(channel_labels[channel])
+            row[i_column:i_column + n_columns] = self.get_channel(channel, ts)
+            i_column += n_columns
+        self.i_buffer += 1
+
+    def write_buffer(self):
+        if self.i_buffer == 0:
+            return
+        dataset = self.file['channels']
+        n_rows = dataset.shape[0]
+        dataset.resize(n_rows + self.i_buffer, axis=0)
+        dataset[n_rows:, :] = self.buffer[:self.i_buffer, :]
+        dataset.flush()
+        self.i_buffer = 0
+
+    def run(self, **kwargs):
+        online = settings_utils.set_value_or_default(kwargs, 'online', False)
+        if not online:
+            return self.data
+
+        self.add_row(self.data.ts)
+        last_timestep = self.data.ts >= self.caller.settings['n_time_steps']
+        if self.i_buffer == self.buffer.shape[0] or last_timestep:
+            self.write_buffer()
+        if last_timestep:
+            self.finalise()
+
+        if self.save_data is not None and self.data.ts % self.settings['full_dump_stride'] == 0:
+            self.save_data.run(online=True)
+        return self.data
+
+    def finalise(self):
+        if self.file is not None and self.file.id.valid:
+            self.write_buffer()
+            self.file.close()
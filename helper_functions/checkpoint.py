@@ -0,0 +1,183 @@
+"""
+    Periodic checkpoints of long dynamic simulations, e.g. continuous turbulence cases with tens of thousands of
+    timesteps, so that a pre-empted simulation can be resumed from the latest checkpoint instead of from scratch
+    (see resume_flexop_case in helper_functions/simulation_case.py).
+
+    The Checkpoint postprocessor is run at each timestep of DynamicCoupled and pickles the SHARPy data (structural
+    timestep info, aerodynamic grid and wake) every interval timesteps to
+    <output_folder>/checkpoints/<case>.checkpoint.<timestep>.pkl, which SHARPy's restart option continues from.
+    The gust velocity field and prescribed control surface inputs are evaluated at the timestep index of the data,
+    so they continue at the right time without being stored. Monitored channels (see channel_monitor.py) are
+    flushed before each checkpoint and truncated to the checkpoint when the simulation is resumed.
+
+    Checkpoints are written asynchronously by a forked child process, which pickles its copy-on-write image of the
+    data while the time loop of the parent continues. Only the latest checkpoints are kept.
+
+    The postprocessor is registered with SHARPy when this module is imported.
+"""
+
+import copy
+import glob
+import os
+import pickle
+import re
+import shutil
+import sharpy.utils.settings as settings_utils
+from sharpy.utils.solver_interface import solver, BaseSolver
+
+
+def get_checkpoint_route(output_route, case_name):
+    return os.path.join(output_route, case_name, 'checkpoints')
+
+
+def get_checkpoint_file(checkpoint_route, case_name, ts):
+    return os.path.join(checkpoint_route, '{}.checkpoint.{:08d}.pkl'.format(case_name, ts))
+
+
+def list_checkpoints(checkpoint_route, case_name):
+    """
+        Returns the complete checkpoints of a case as list of (timestep, file), sorted by timestep.
+    """
+    list_checkpoints = []
+    for checkpoint_file in glob.glob(os.path.join(checkpoint_route, case_name + '.checkpoint.*.pkl')):
+        match = re.match(re.escape(case_name) + r'\.checkpoint\.(\d+)\.pkl$', os.path.basename(checkpoint_file))
+        if match is not None:
+            list_checkpoints.append((int(match.group(1)), checkpoint_file))
+    return sorted(list_checkpoints)
+
+
+def find_latest_checkpoint(output_route, case_name):
+    """
+        Returns the latest checkpoint of a case as (timestep, file) or (None, None) if there is no checkpoint.
+    """
+    list_case_checkpoints = list_checkpoints(get_checkpoint_route(output_route, case_name), case_name)
+    if len(list_case_checkpoints) == 0:
+        return None, None
+    return list_case_checkpoints[-1]
+
+
+def remove_checkpoints(output_route, case_name):
+    checkpoint_route = get_checkpoint_route(output_route, case_name)
+    if os.path.exists(checkpoint_route):
+        shutil.rmtree(checkpoint_route)
+
+
+def write_checkpoint(data, checkpoint_file, num_stored_timesteps=0):
+    """
+        Pickles the SHARPy data to the checkpoint file. If num_stored_timesteps > 0, only the first and the last
+        num_stored_timesteps entries of the structural and aerodynamic timestep info are stored (the others are
+        stored as None), which is sufficient to continue the simulation. The data itself is not modified.
+    """
+    if num_stored_timesteps > 0:
+        data = copy.copy(data)
+        for model_name in ['structure', 'aero']:
+            model = copy.copy(getattr(data, model_name))
+            n_timesteps = len(model.timestep_info)
+            model.timestep_info = [timestep_info if i_ts == 0 or i_ts >= n_timesteps - num_stored_timesteps else None
+                                   for i_ts, timestep_info in enumerate(model.timestep_info)]
+            setattr(data, model_name, model)
+    # Write to a temporary file first, so that an interrupted write never leaves an incomplete checkpoint
+    temporary_file = checkpoint_file + '.tmp'
+    with open(temporary_file, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_file, checkpoint_file)
+
+
+@solver
+class Checkpoint(BaseSolver):
+    """
+        Writes a checkpoint of the SHARPy data every interval timesteps (in a forked child process if
+        asynchronous) and keeps the latest checkpoints.
+    """
+    solver_id = 'Checkpoint'
+    solver_classification = 'postprocessor'
+
+    settings_types = dict()
+    settings_default = dict()
+    settings_description = dict()
+
+    settings_types['interval'] = 'int'
+    settings_default['interval'] = 1000
+    settings_description['interval'] = 'Number of timesteps between checkpoints'
+
+    settings_types['keep'] = 'int'
+    settings_default['keep'] = 2
+    settings_description['keep'] = 'Number of latest checkpoints kept'
+
+    settings_types['num_stored_timesteps'] = 'int'
+    settings_default['num_stored_timesteps'] = 2
+    settings_description['num_stored_timesteps'] = 'Number of latest timesteps stored in a checkpoint (0: all)'
+
+    settings_types['asynchronous'] = 'bool'
+    settings_default['asynchronous'] = True
+    settings_description['asynchronous'] = 'Write checkpoints in a forked child process'
+
+    def __init__(self):
+        self.settings = None
+        self.data = None
+        self.caller = None
+        self.folder = None
+        self.case = None
+        self.writer_pid = None
+
+    def initialise(self, data, custom_settings=None, caller=None, restart=False):
+        self.data = data
+        if custom_settings is None:
+            self.settings = data.settings[self.solver_id]
+        else:
+            self.settings = custom_settings
+        settings_utils.to_custom_types(self.settings, self.settings_types, self.settings_default)
+        self.caller = caller
+        self.case = self.data.settings['SHARPy']['case']
+        self.folder = os.path.join(self.data.output_folder, 'checkpoints')
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    def wait_for_writer(self):
+        if self.writer_pid is None:
+            return
+        _, status = os.waitpid(self.writer_pid, 0)
+        self.writer_pid = None
+        if status != 0:
+            raise RuntimeError('Writing checkpoint of case {} failed.'.format(self.case))
+        self.remove_old_checkpoints()
+
+    def remove_old_checkpoints(self):
+        for ts, checkpoint_file in list_checkpoints(self.folder, self.case)[:-self.settings['keep']]:
+            os.remove(checkpoint_file)
+
+    def flush_postprocessors(self):
+        # Monitored channels written up to the checkpoint
+        for postprocessor in getattr(self.caller, 'postprocessors', {}).values():
+            if hasattr(postprocessor, 'write_buffer'):
+                postprocessor.write_buffer()
+
+    def run(self, **kwargs):
+        online = settings_utils.set_value_or_default(kwargs, 'online', False)
+        if not online:
+            return self.data
+
+        last_timestep = self.data.ts >= self.caller.settings['n_time_steps']
+        if last_timestep:
+            self.wait_for_writer()
+            return self.data
+        if self.data.ts % self.settings['interval'] != 0:
+            return self.data
+
+        self.flush_postprocessors()
+        self.wait_for_writer()
+        checkpoint_file = get_checkpoint_file(self.folder, self.case, self.data.ts)
+        if self.settings['asynchronous'] and hasattr(os, 'fork'):
+            pid = os.fork()
+            if pid == 0:
+                exit_code = 1
+                try:
+                    write_checkpoint(self.data, checkpoint_file, self.settings['num_stored_timesteps'])
+                    exit_code = 0
+                finally:
+                    os._exit(exit_code)
+            self.writer_pid = pid
+        else:
+            write_checkpoint(self.data, checkpoint_file, self.settings['num_stored_timesteps'])
+            self.remove_old_checkpoints()
+        return self.data
@@ -0,0 +1,124 @@
+"""
+    Binary multi-channel control surface deflection input. The deflections of all control surfaces are stored in a
+    single .npy file as array of shape (n_steps, 1 + n_control_surfaces), where the first column is the time [s]
+    and column 1 + i_cs the deflection [rad] of control surface i_cs. Existing one-column CSV input files (one row
+    per timestep) are converted with convert_csv_inputs, which is done automatically when a case with a binary
+    input file (case parameter cs_input_file) that does not exist yet is generated.
+
+    The MultiChannelControlSurface generator reads the deflection of one control surface from this file. The file
+    is memory-mapped and loaded only once per process for all control surfaces, and is resampled to the time step
+    of the simulation if its time vector does not match. It is registered with SHARPy when this module is
+    imported.
+"""
+
+import os
+import numpy as np
+import sharpy.utils.generator_interface as generator_interface
+import sharpy.utils.settings as settings_utils
+
+# Deflection inputs loaded in this process: (file, modification time, dt, time offset) -> (deflection, deflection_dot)
+deflection_input_cache = {}
+
+
+def convert_csv_inputs(dict_cs_input_files, dt, n_control_surfaces, output_file):
+    """
+        Converts the CSV deflection input files of the control surfaces (as in dict_predefined_cs_input_files of
+        run_nonlinear_simulation.py, i.e. control surface index as string -> CSV file or None) with time step dt into
+        a single binary input file. Control surfaces without input file are set to zero and files referenced by
+        several control surfaces are parsed once.
+    """
+    loaded_files = {}
+    for cs_input_file in dict_cs_input_files.values():
+        if cs_input_file is not None and cs_input_file not in loaded_files:
+            loaded_files[cs_input_file] = np.atleast_1d(np.loadtxt(cs_input_file, delimiter=','))
+    n_steps = max([len(deflection) for deflection in loaded_files.values()], default=0)
+
+    deflection_input = np.zeros((n_steps, 1 + n_control_surfaces))
+    deflection_input[:, 0] = np.arange(n_steps) * dt
+    for i_cs in range(n_control_surfaces):
+        cs_input_file = dict_cs_input_files.get(str(i_cs))
+        if cs_input_file is not None:
+            deflection = loaded_files[cs_input_file]
+            deflection_input[:len(deflection), 1 + i_cs] = deflection
+            deflection_input[len(deflection):, 1 + i_cs] = deflection[-1] # hold last value
+    if os.path.dirname(output_file) != '' and not os.path.exists(os.path.dirname(output_file)):
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    # Write to a temporary file first, so that concurrent cases never read an incomplete file
+    temporary_file = '{}.{}.tmp'.format(output_file, os.getpid())
+    with open(temporary_file, 'wb') as f:
+        np.save(f, deflection_input)
+    os.replace(temporary_file, output_file)
+    return output_file
+
+
+def get_deflection_input(input_file, dt, time_offset=0.):
+    """
+        Returns the deflections of all control surfaces and their time derivatives at the timesteps of a simulation
+        with time step dt (timestep it at time time_offset + it * dt), each as array of shape (n_steps,
+        n_control_surfaces). If the time vector of the input matches the time steps, the deflections are a view of
+        the memory-mapped file.
+    """
+    key = (os.path.abspath(input_file), os.path.getmtime(input_file), dt, time_offset)
+    if key not in deflection_input_cache:
+        deflection_input = np.load(input_file, mmap_mode='r')
+        time = deflection_input[:, 0]
+        n_steps = int(np.floor((time[-1] - time_offset) / dt + 1e-6)) + 1
+        time_steps = time_offset + np.arange(n_steps) * dt
+        if len(time) == n_steps and np.allclose(time, time_steps, rtol=0., atol=1e-6 * dt):
+            deflection = deflection_input[:, 1:]
+        else:
+            time = np.array(time)
+            deflection = np.column_stack([np.interp(time_steps, time, deflection_input[:, 1 + i_cs])
+                                          for i_cs in range(deflection_input.shape[1] - 1)])
+        deflection_dot = np.zeros(deflection.shape)
+        deflection_dot[:-1, :] = np.diff(deflection, axis=0) / dt
+        deflection_input_cache[key] = (deflection, deflection_dot)
+    return deflection_input_cache[key]
+
+
+@generator_interface.generator
+class MultiChannelControlSurface(generator_interface.BaseGenerator):
+    """
+        Prescribed deflection of a control surface read from a binary multi-channel input file (see
+        convert_csv_inputs). Same as SHARPy's DynamicControlSurface, but the file is shared by all control
+        surfaces. After the end of the input, the last deflection is held.
+    """
+    generator_id = 'MultiChannelControlSurface'
+
+    settings_types = dict()
+    settings_default = dict()
+    settings_description = dict()
+
+    settings_types['dt'] = 'float'
+    settings_default['dt'] = None
+    settings_description['dt'] = 'Time step of the simulation'
+
+    settings_types['input_file'] = 'str'
+    settings_default['input_file'] = None
+    settings_description['input_file'] = 'Binary deflection input file (.npy)'
+
+    settings_types['channel'] = 'int'
+    settings_default['channel'] = 0
+    settings_description['channel'] = 'Index of the control surface in the input file'
+
+    settings_types['time_offset'] = 'float'
+    settings_default['time_offset'] = 0.
+    settings_description['time_offset'] = 'Time of timestep 0 (non-zero for the segments of a time step schedule)'
+
+    def __init__(self):
+        self.in_dict = dict()
+        self.deflection = None
+        self.deflection_dot = None
+
+    def initialise(self, in_dict, **kwargs):
+        self.in_dict = in_dict
+        settings_utils.to_custom_types(self.in_dict, self.settings_types, self.settings_default)
+        deflection, deflection_dot = get_deflection_input(self.in_dict['input_file'],
+                                                          self.in_dict['dt'],
+                                                          self.in_dict['time_offset'])
+        self.deflection = deflection[:, self.in_dict['channel']]
+        self.deflection_dot = deflection_dot[:, self.in_dict['channel']]
+
+    def generate(self, params):
+        it = min(params['it'], len(self.deflection) - 1) # deflection_dot of the last timestep is zero
+        return self.deflection[it], self.deflection_dot[it]
@@ -0,0 +1,189 @@
+"""
+    Frequency-domain gust load screening with the discrete-time linear aeroelastic state space generated by
+    generate_linear_system.py (with remove_gust_input_in_statespace = False).
+
+    The transfer functions from the gust velocity input to the output channels (e.g. root bending and torsional
+    moment and tip deflection, labels as in postprocess_gust_response.py)
+        H(w) = C (z I - A)^-1 b + d,   z = exp((damping + i w) dt)
+    are evaluated on a frequency grid (with one Schur decomposition of dense systems and a triangular solve per
+    frequency, see get_frequency_response), and used for
+        - continuous turbulence: RMS loads per unit turbulence intensity and characteristic frequency from the
+          Dryden or von Karman spectrum (see helper_functions/turbulence_spectra.py),
+        - discrete gusts: responses to a sweep of 1-cos gusts by multiplication with the discrete Fourier transform
+          of the gust inputs. The exponential window (damping > 0) removes the wrap-around of the circular
+          convolution and allows evaluating systems with poles on the unit circle, e.g. rigid body modes of free
+          flight systems.
+    The frequency response only depends on the linear system and the frequency grid and is cached on disk (see
+    get_cached_frequency_response), so that changing the gust spectrum, intensity or gust lengths does not require
+    any further linear solve.
+
+    Note that the outputs of the linear system are perturbations around the linearisation (trim) point.
+"""
+
+import os
+import h5py as h5
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.integrate import trapezoid
+from scipy.linalg import schur, solve_triangular
+from helper_functions.linear_gust_response import get_output_combinations, load_state_space, response_labels, to_dense
+from helper_functions.settings_tools import get_fingerprint
+from helper_functions.turbulence_spectra import get_spectra, get_turbulence_scales
+
+
+def get_fft_frequencies(n_steps, dt):
+    """
+        Returns the angular frequencies [rad/s] of the real discrete Fourier transform of n_steps timesteps.
+    """
+    return 2 * np.pi * np.fft.rfftfreq(n_steps, d=dt)
+
+
+def get_window_damping(simulation_time, attenuation=1e-4):
+    """
+        Returns the damping [1/s] of the exponential window attenuating the signal by the given factor at the end of
+        the simulation time.
+    """
+    return -np.log(attenuation) / simulation_time
+
+
+def get_frequency_response(A, B, C, D, dt, frequencies, gust_input_index, output_rows, damping=0.):
+    """
+        Returns the frequency response of the output rows to the gust input(s) of the discrete-time system at the
+        given angular frequencies [rad/s]. Dense systems are reduced once to the complex Schur form A = Z T Z^H, so
+        that each frequency only requires a triangular solve (O(n^2) instead of O(n^3)); sparse systems are factorised
+        at each frequency.
+
+        Args:
+            gust_input_index (int or list): input(s) of the state space driven by the gust velocity
+            output_rows (list): output rows
+            damping (float): real part of the Laplace variable [1/s] (exponential window)
+
+        Returns:
+            np.ndarray: frequency response (len(output_rows), n_frequencies)
+    """
+    b_gust = np.atleast_2d(to_dense(B[:, gust_input_index]).T).sum(axis=0)
+    c_out = to_dense(C[output_rows, :])
+    d_gust = np.atleast_2d(to_dense(D[output_rows, :][:, gust_input_index]).T).sum(axis=0)
+    z = np.exp((damping + 1j * np.asarray(frequencies)) * dt)
+
+    n_states = A.shape[0]
+    frequency_response = np.zeros((len(output_rows), len(z)), dtype=complex)
+    if sp.issparse(A):
+        identity = sp.identity(n_states, format='csc')
+        A = sp.csc_matrix(A)
+        for i_frequency, z_i in enumerate(z):
+            x = spla.splu((z_i * identity - A).astype(complex)).solve(b_gust.astype(complex))
+            frequency_response[:, i_frequency] = c_out @ x
+    else:
+        # (z I - A)^-1 b = Z (z I - T)^-1 Z^H b with the upper triangular T
+        T, Z = schur(np.asarray(A), output='complex')
+        b_schur = Z.conj().T @ b_gust
+        c_schur = c_out @ Z
+        i_diagonal = np.diag_indices(n_states)
+        system = np.empty_like(T)
+        for i_frequency, z_i in enumerate(z):
+            np.negative(T, out=system)
+            system[i_diagonal] += z_i
+            frequency_response[:, i_frequency] = c_schur @ solve_triangular(system, b_schur, check_finite=False)
+    return frequency_response + d_gust[:, None]
+
+
+def get_frequency_response_key(system_file, frequencies, gust_input_index, output_channels, damping):
+    return get_fingerprint({'system_file': os.path.abspath(system_file),
+                            'modification_time': os.path.getmtime(system_file),
+                            'frequencies': np.asarray(frequencies, dtype=float),
+                            'gust_input_index': gust_input_index,
+                            'output_channels': output_channels,
+                            'damping': float(damping)})
+
+
+def get_cached_frequency_response(cache_route, system_file, frequencies, gust_input_index, output_channels,
+                                  damping=0.):
+    """
+        Returns the frequency response of the output channels (label -> output row, (output row, scaling factor) or
+        list of (output row, coefficient), as in get_gust_responses) of the linear system saved in system_file. The response is read from
+        <cache_route>/<key>.h5 if it has been computed before for the same system file, frequencies, channels and
+        damping, and computed and stored otherwise.
+
+        Returns:
+            np.ndarray: frequency response (len(output_channels), n_frequencies) with the channels in the order of
+                        output_channels
+    """
+    cache_file = os.path.join(cache_route, get_frequency_response_key(system_file,
+                                                                      frequencies,
+                                                                      gust_input_index,
+                                                                      output_channels,
+                                                                      damping) + '.h5')
+    if os.path.isfile(cache_file):
+        with h5.File(cache_file, 'r') as f:
+            return f['frequency_response'][()]
+
+    A, B, C, D, dt = load_state_space(system_file)
+    output_rows, combination_matrix = get_output_combinations(output_channels)
+    frequency_response = combination_matrix @ get_frequency_response(A, B, C, D, dt,
+                                                                     frequencies,
+                                                                     gust_input_index,
+                                                                     output_rows,
+                                                                     damping=damping)
+    if not os.path.exists(cache_route):
+        os.makedirs(cache_route, exist_ok=True)
+    # Write to a temporary file first, so that concurrent processes never read an incomplete response
+    temporary_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+    with h5.File(temporary_file, 'w') as f:
+        f.create_dataset('frequency_response', data=frequency_response)
+        f.create_dataset('frequencies', data=np.asarray(frequencies, dtype=float))
+        f.attrs['labels'] = list(output_channels.keys())
+        f.attrs['system_file'] = os.path.abspath(system_file)
+        f.attrs['damping'] = damping
+    os.replace(temporary_file, cache_file)
+    return frequency_response
+
+
+def get_gust_spectrum(frequencies, u_inf, model='von_karman', altitude=800.):
+    """
+        Returns the one-sided power spectral density of the vertical gust velocity with unit intensity at the given
+        angular frequencies [rad/s] for a flight speed u_inf (frozen turbulence).
+    """
+    scale_lengths, _ = get_turbulence_scales(altitude, model)
+    return get_spectra(model, np.asarray(frequencies) / u_inf, scale_lengths)[2] / u_inf
+
+
+def get_turbulence_loads(frequency_response, frequencies, u_inf, model='von_karman', altitude=800.):
+    """
+        Returns the RMS value of each output channel per unit vertical turbulence intensity (A-bar) and its
+        characteristic frequency [Hz] (expected number of zero crossings with positive slope per second),
+        integrated over the frequency grid.
+
+        Returns:
+            tuple: RMS values (n_channels), characteristic frequencies (n_channels)
+    """
+    output_spectra = np.abs(frequency_response) ** 2 * get_gust_spectrum(frequencies, u_inf, model, altitude)
+    variance = trapezoid(output_spectra, frequencies, axis=1)
+    variance_rate = trapezoid(output_spectra * np.asarray(frequencies) ** 2, frequencies, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        characteristic_frequency = np.sqrt(variance_rate / variance) / (2 * np.pi)
+    return np.sqrt(variance), characteristic_frequency
+
+
+def get_gust_responses_from_frequency_response(frequency_response, labels, dt, gust_input, damping=0.):
+    """
+        Returns the responses to a batch of gust inputs (n_steps, n_cases) from the frequency response at the
+        frequencies get_fft_frequencies(n_steps, dt) evaluated with the given damping, arranged as in
+        get_gust_responses.
+
+        Returns:
+            np.ndarray: responses (n_cases, n_steps, len(response_labels))
+    """
+    n_steps, n_cases = gust_input.shape
+    time = np.arange(n_steps) * dt
+    window = np.exp(-damping * time)
+    gust_input_spectrum = np.fft.rfft(gust_input * window[:, None], axis=0)
+
+    responses = np.full((n_cases, n_steps, len(response_labels)), np.nan)
+    responses[:, :, 0] = time
+    responses[:, :, 1] = gust_input.T
+    for i_channel, label in enumerate(labels):
+        output = np.fft.irfft(frequency_response[i_channel, :, None] * gust_input_spectrum, n=n_steps, axis=0)
+        responses[:, :, response_labels.index(label)] = (output / window[:, None]).T
+    return responses
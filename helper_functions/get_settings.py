@@ -1,5 +1,6 @@
 import numpy as np
 import sharpy.utils.algebra as algebra
+from helper_functions.settings_tools import copy_settings
 
 def get_settings(flexop_model, flow, dt, **kwargs):
     alpha = kwargs.get('alpha', 0.) # rad
@@ -106,6 +107,14 @@ def get_settings(flexop_model, flow, dt, **kwargs):
         settings['AerogridLoader']['control_surface_deflection_generator_settings'] = {}
         for i_cs in range(flexop_model.aero.n_control_surfaces):
             if str(i_cs) in dict_predefined_cs_input_files.keys() and dict_predefined_cs_input_files[str(i_cs)] is not None:
+                if kwargs.get('cs_input_file', None) is not None:
+                    # Binary multi-channel input shared by all control surfaces (see helper_functions/control_surface_input.py)
+                    settings['AerogridLoader']['control_surface_deflection_generator_settings'][str(i_cs)] = {'dt': dt,
+                                                                                                              'input_file': kwargs['cs_input_file'],
+                                                                                                              'channel': i_cs,
+                                                                                                              'time_offset': kwargs.get('time_offset', 0.)}
+                    settings['AerogridLoader']['control_surface_deflection'][i_cs] = 'MultiChannelControlSurface'
+                    continue
                 settings['AerogridLoader']['control_surface_deflection_generator_settings'][str(i_cs)] = {'dt': dt,
                                                                                                           'deflection_file': dict_predefined_cs_input_files[str(i_cs)]} 
 
@@ -161,11 +170,20 @@ def get_settings(flexop_model, flow, dt, **kwargs):
                                                         # 'gust_shape': 'time varying',
                                                         # 'gust_parameters': {'file': '../02_gust_input/bturbulence_time_7200s_uinf_45_altitude_800_moderate_noise_seeds_23361_23362_23363_23364.txt',},
                                                         'gust_shape': gust_settings['gust_shape'],
-                                                        'gust_parameters': {
+                                                    }
+        if gust_settings['gust_shape'] == 'turbulence field':
+            # Continuous turbulence from the turbulence field store (see helper_functions/turbulence_field.py)
+            settings['StepUvlm']['velocity_field_input']['gust_parameters'] = {'file': gust_settings['file'],
+                                                                               'gust_component': gust_settings['gust_component'],
+                                                                               'intensity': gust_settings['gust_intensity'] * u_inf,
+                                                                               'window_start': gust_settings['window_start'],
+                                                                               'window_length': gust_settings['window_length'],
+                                                                               }
+        else:
+            settings['StepUvlm']['velocity_field_input']['gust_parameters'] = {
                                                                             'gust_length': gust_settings['gust_length'],
                                                                             'gust_intensity': gust_settings['gust_intensity'] * u_inf,
-                                                                           }                                                                
-                                                    }
+                                                                           }
 
     if free_flight:
         structural_solver = 'NonLinearDynamicCoupledStep'
@@ -179,6 +197,31 @@ def get_settings(flexop_model, flow, dt, **kwargs):
         unsteady_force_distribution = False
     else:
         unsteady_force_distribution = True
+    postprocessor_each_timestep = list(kwargs.get('postprocessor_each_timestep', []))
+    monitor_channels = kwargs.get('monitor_channels', None)
+    if monitor_channels is not None:
+        # Lightweight per-timestep output replacing the full SaveData dump (see helper_functions/channel_monitor.py)
+        settings['ChannelMonitor'] = {'channels': monitor_channels,
+                                      'full_dump_stride': kwargs.get('full_dump_stride', 0),
+                                      'time_offset': kwargs.get('time_offset', 0.),
+                                      'save_data_settings': settings['SaveData']}
+        if 'SaveData' in postprocessor_each_timestep:
+            postprocessor_each_timestep.remove('SaveData')
+        postprocessor_each_timestep.append('ChannelMonitor')
+    if kwargs.get('telemetry', False):
+        # Wall time, FSI substeps, solver times and residual history of each timestep (see
+        # helper_functions/run_telemetry.py)
+        settings['RunTelemetry'] = {'time_offset': kwargs.get('time_offset', 0.)}
+        postprocessor_each_timestep.append('RunTelemetry')
+    checkpoint_interval = kwargs.get('checkpoint_interval', 0)
+    if checkpoint_interval > 0:
+        # Periodic checkpoints of the dynamic simulation after all other postprocessors (see
+        # helper_functions/checkpoint.py)
+        settings['Checkpoint'] = {'interval': checkpoint_interval,
+                                  'keep': kwargs.get('checkpoint_keep', 2),
+                                  'num_stored_timesteps': kwargs.get('checkpoint_num_stored_timesteps', 2)}
+        postprocessor_each_timestep.append('Checkpoint')
+
     settings['DynamicCoupled'] = {'structural_solver': structural_solver,
                                     'structural_solver_settings': settings[structural_solver],
                                     'aero_solver': 'StepUvlm',
@@ -193,12 +236,12 @@ def get_settings(flexop_model, flow, dt, **kwargs):
                                     'dt': dt,
                                     # 'nonlifting_body_interaction': not lifting_only,
                                     'include_unsteady_force_contribution': unsteady_force_distribution, 
-                                    'postprocessors': kwargs.get('postprocessor_each_timestep', []),
+                                    'postprocessors': postprocessor_each_timestep,
                                     'postprocessors_settings': {},
         }
 
     
-    for postprocessor in kwargs.get('postprocessor_each_timestep', []):
+    for postprocessor in postprocessor_each_timestep:
         try:
             settings_postprocessor = settings[postprocessor]
         except KeyError:
@@ -243,7 +286,7 @@ def get_settings(flexop_model, flow, dt, **kwargs):
                                                             'integr_order': 2,
                                                             'density': rho,
                                                             'remove_predictor': True,
-                                                            'use_sparse': 'off',
+                                                            'use_sparse': kwargs.get('use_sparse', False),
                                                             'gust_assembler':  'LeadingEdge', #'leading_edge',
                                                             # 'ScalingDict': {'length':flexop_model.aero.chord_main_root/2, 'speed': u_inf, 'density': rho},
                                                             },
@@ -260,6 +303,12 @@ def get_settings(flexop_model, flow, dt, **kwargs):
             settings['LinearAssembler']['linear_system_settings']['aero_settings']['rom_method'] = rom_settings['rom_method'],
             settings['LinearAssembler']['linear_system_settings']['aero_settings']['rom_method_settings'] = rom_settings['rom_method_settings']
 
+    if 'LinearSystemSaver' in flow:
+        # Low-memory alternative to SaveData for the linear system, also saving the input and output variables (see
+        # helper_functions/linear_system_store.py)
+        settings['LinearSystemSaver'] = {'save_uvlm': kwargs.get('save_linear_uvlm', False),
+                                         'save_matrices': 'SaveData' not in flow}
+
     if not free_flight:
         settings['Modal']['rigid_body_modes'] = False
 
@@ -267,18 +316,22 @@ def get_settings(flexop_model, flow, dt, **kwargs):
                                         'frequency_cutoff': 0,
                                         'export_eigenvalues': 'on',
                                         'modes_to_plot': num_modes,
-                                        'velocity_analysis': [20, 80, 13]
+                                        'velocity_analysis': kwargs.get('velocity_analysis', [20, 80, 13])
                                         }
 
     settings['LiftDistribution'] = {'rho': rho}
 
     settings['BeamPlot'] = {}
 
+    settings['PickleData'] = {}
+
     settings['AerogridPlot'] = {'include_rbm': 'off',
                                 'include_applied_forces': 'on',
                                 'minus_m_star': 0,
                                 'u_inf': u_inf,
                                 }
 
-    return settings
+    # Blocks embedded in other blocks (e.g. the solver settings of StaticCoupled) are copied, so that modifying
+    # one block never changes another one
+    return copy_settings(settings)
 
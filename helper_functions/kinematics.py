@@ -0,0 +1,116 @@
+"""
+    Vectorised rigid body and beam kinematics for the postprocessing, operating on whole time histories instead
+    of single timesteps (same conventions as sharpy.utils.algebra, see benchmarks/check_kinematics.py):
+        quat2euler      (..., 4) quaternions -> (..., 3) Euler angles [roll, pitch, yaw] in rad
+        quat2rotation   (..., 4) quaternions -> (..., 3, 3) rotation matrices C^GA (body to inertial frame)
+        crv2rotation    (..., 3) Cartesian rotation vectors psi -> (..., 3, 3) rotation matrices
+        crv2tan         (..., 3) Cartesian rotation vectors psi -> (..., 3, 3) tangential operators
+        body_to_inertial  nodal positions in the body frame A of all timesteps -> inertial frame G
+    The leading dimensions are arbitrary, e.g. (n_steps,) for the quaternion of each timestep or (n_steps, n_elem,
+    3) for psi of all nodes of all timesteps.
+"""
+
+import numpy as np
+
+
+def skew(vector):
+    """
+        Returns the skew-symmetric (cross product) matrices (..., 3, 3) of the vectors (..., 3).
+    """
+    vector = np.asarray(vector, dtype=float)
+    matrix = np.zeros(vector.shape + (3,))
+    matrix[..., 0, 1] = -vector[..., 2]
+    matrix[..., 0, 2] = vector[..., 1]
+    matrix[..., 1, 0] = vector[..., 2]
+    matrix[..., 1, 2] = -vector[..., 0]
+    matrix[..., 2, 0] = -vector[..., 1]
+    matrix[..., 2, 1] = vector[..., 0]
+    return matrix
+
+
+def quat2euler(quat):
+    """
+        Returns the Euler angles [roll, pitch, yaw] (..., 3) in rad of the quaternions (..., 4) with the scalar
+        part first. Roll and yaw are computed with arctan2 and are therefore valid in all quadrants.
+    """
+    quat = np.asarray(quat, dtype=float)
+    q0, q1, q2, q3 = quat[..., 0], quat[..., 1], quat[..., 2], quat[..., 3]
+    euler = np.zeros(quat.shape[:-1] + (3,))
+    euler[..., 0] = np.arctan2(2. * (q0 * q1 + q2 * q3), 1. - 2. * (q1 ** 2 + q2 ** 2))
+    euler[..., 1] = np.arcsin(np.clip(2. * (q0 * q2 - q1 * q3), -1., 1.))
+    euler[..., 2] = np.arctan2(2. * (q0 * q3 + q1 * q2), 1. - 2. * (q2 ** 2 + q3 ** 2))
+    return euler
+
+
+def quat2rotation(quat):
+    """
+        Returns the rotation matrices C^GA (..., 3, 3) of the quaternions (..., 4), which rotate vectors from the
+        body frame A to the inertial frame G. The quaternions are normalised.
+    """
+    quat = np.asarray(quat, dtype=float)
+    quat = quat / np.linalg.norm(quat, axis=-1, keepdims=True)
+    q0, q1, q2, q3 = quat[..., 0], quat[..., 1], quat[..., 2], quat[..., 3]
+    rotation = np.zeros(quat.shape[:-1] + (3, 3))
+    rotation[..., 0, 0] = q0 ** 2 + q1 ** 2 - q2 ** 2 - q3 ** 2
+    rotation[..., 1, 1] = q0 ** 2 - q1 ** 2 + q2 ** 2 - q3 ** 2
+    rotation[..., 2, 2] = q0 ** 2 - q1 ** 2 - q2 ** 2 + q3 ** 2
+    rotation[..., 1, 0] = 2. * (q1 * q2 + q0 * q3)
+    rotation[..., 0, 1] = 2. * (q1 * q2 - q0 * q3)
+    rotation[..., 2, 0] = 2. * (q1 * q3 - q0 * q2)
+    rotation[..., 0, 2] = 2. * (q1 * q3 + q0 * q2)
+    rotation[..., 2, 1] = 2. * (q2 * q3 + q0 * q1)
+    rotation[..., 1, 2] = 2. * (q2 * q3 - q0 * q1)
+    return rotation
+
+
+def crv2rotation(psi):
+    """
+        Returns the rotation matrices (..., 3, 3) of the Cartesian rotation vectors psi (..., 3) (Rodrigues'
+        formula, with the series expansion of the coefficients for small rotations).
+    """
+    psi = np.asarray(psi, dtype=float)
+    angle = np.linalg.norm(psi, axis=-1)
+    small = angle < 1e-4
+    # Coefficients sin(angle)/angle and (1 - cos(angle))/angle**2
+    safe_angle = np.where(small, 1., angle)
+    factor_1 = np.where(small, 1. - angle ** 2 / 6., np.sin(safe_angle) / safe_angle)
+    factor_2 = np.where(small, 0.5 - angle ** 2 / 24., (1. - np.cos(safe_angle)) / safe_angle ** 2)
+    skew_psi = skew(psi)
+    return (np.eye(3) + factor_1[..., np.newaxis, np.newaxis] * skew_psi
+            + factor_2[..., np.newaxis, np.newaxis] * skew_psi @ skew_psi)
+
+
+def crv2tan(psi):
+    """
+        Returns the tangential operators T (..., 3, 3) of the Cartesian rotation vectors psi (..., 3), which relate
+        the derivative of psi to the angular velocity or curvature in the rotated frame, e.g. kappa = T(psi) psi'.
+    """
+    psi = np.asarray(psi, dtype=float)
+    angle = np.linalg.norm(psi, axis=-1)
+    small = angle < 1e-4
+    safe_angle = np.where(small, 1., angle)
+    # Coefficients (cos(angle) - 1)/angle**2 and (1 - sin(angle)/angle)/angle**2
+    factor_1 = np.where(small, -0.5 + angle ** 2 / 24., (np.cos(safe_angle) - 1.) / safe_angle ** 2)
+    factor_2 = np.where(small, 1. / 6. - angle ** 2 / 120., (1. - np.sin(safe_angle) / safe_angle) / safe_angle ** 2)
+    skew_psi = skew(psi)
+    return (np.eye(3) + factor_1[..., np.newaxis, np.newaxis] * skew_psi
+            + factor_2[..., np.newaxis, np.newaxis] * skew_psi @ skew_psi)
+
+
+def body_to_inertial(pos, quat, for_pos=None):
+    """
+        Transforms nodal positions in the body frame A to the inertial frame G for all timesteps at once.
+
+        Args:
+            pos (np.array): positions in frame A (n_steps, n_node, 3)
+            quat (np.array): orientation of frame A of each timestep (n_steps, 4)
+            for_pos (np.array): position of the origin of frame A in frame G of each timestep (n_steps, 3) or
+                                (n_steps, 6) as saved by SHARPy, None for a fixed origin
+
+        Returns:
+            np.array: positions in frame G (n_steps, n_node, 3)
+    """
+    inertial_pos = np.einsum('tij,tnj->tni', quat2rotation(quat), pos)
+    if for_pos is not None:
+        inertial_pos += np.asarray(for_pos)[:, np.newaxis, 0:3]
+    return inertial_pos
@@ -0,0 +1,297 @@
+"""
+    Batched gust response simulations with the discrete-time linear aeroelastic state space generated by
+    generate_linear_system.py (saved by SaveData with save_linear, requires the gust input to be kept in the
+    state space, i.e. remove_gust_input_in_statespace = False).
+
+    The state space is loaded once and many gust inputs, e.g. 1-cos gusts of different lengths and intensities
+    or turbulence time series of different seeds, are stacked as columns of one input matrix and time-marched
+    simultaneously. The responses are returned with the columns written by postprocess_gust_response.py, so
+    that thousands of gust cases can be screened in seconds and only the critical ones need to be simulated
+    with the nonlinear solver.
+
+    Note that the outputs of the linear system are perturbations around the linearisation (trim) point.
+"""
+
+import os
+import h5py as h5
+import numpy as np
+import scipy.sparse as sp
+from helper_functions.kinematics import crv2tan
+
+# Columns of postprocess_gust_response.py
+response_labels = ['time', 'omega_z', 'x', 'y', 'z', 'x_dot', 'y_dot', 'z_dot',
+                   'r', 'p', 'q', 'r_dot', 'p_dot', 'q_dot',
+                   'OOP', 'MT', 'Pitch']
+
+
+def get_linear_system_file(output_route, case_name):
+    return os.path.join(output_route, case_name, 'savedata', case_name + '.linss.h5')
+
+
+def read_matrix(item, lazy=False):
+    """
+        Reads a matrix of a saved state space. Matrices stored in compressed sparse row format (group with the
+        datasets data, indices and indptr, see helper_functions/linear_system_store.py) are returned as
+        scipy.sparse.csr_matrix. If lazy, dense matrices are returned as HDF5 dataset, i.e. rows are only read
+        from disk when indexed (the file needs to be kept open).
+    """
+    if isinstance(item, h5.Group):
+        return sp.csr_matrix((item['data'][()], item['indices'][()], item['indptr'][()]),
+                             shape=tuple(item.attrs['shape']))
+    if lazy:
+        return item
+    return np.array(item)
+
+
+def to_dense(matrix):
+    return matrix.toarray() if sp.issparse(matrix) else np.asarray(matrix)
+
+
+def load_state_space(file):
+    """
+        Loads the discrete-time state space (A, B, C, D, dt) saved by SaveData or LinearSystemSaver. The first
+        group of the file containing the matrices A, B, C and D is used. Matrices saved in sparse format are
+        returned as scipy.sparse.csr_matrix.
+
+        Returns:
+            tuple: A, B, C, D, dt
+    """
+    with h5.File(file, 'r') as f:
+        list_groups = [f]
+        f.visititems(lambda name, item: list_groups.append(item) if isinstance(item, h5.Group) else None)
+        for group in list_groups:
+            if all(matrix in group for matrix in ['A', 'B', 'C', 'D']):
+                dt = float(np.array(group['dt'])) if 'dt' in group else None
+                return tuple(read_matrix(group[matrix]) for matrix in ['A', 'B', 'C', 'D']) + (dt,)
+    raise KeyError('No state space found in {}.'.format(file))
+
+
+def get_nodal_output_rows(node, first_row=0, num_dof_node=6):
+    """
+        Returns the output rows of the displacements (3) and rotations (3) of a node for outputs in nodal
+        coordinates (inout_coordinates = 'nodes'), starting at first_row.
+    """
+    row_node = first_row + num_dof_node * node
+    return list(range(row_node, row_node + 3)), list(range(row_node + 3, row_node + 6))
+
+
+def read_variables(group):
+    return {name.decode(): (int(first_position), int(size))
+            for name, first_position, size in zip(group['names'][()], group['first_positions'][()], group['sizes'][()])}
+
+
+def read_linear_system_reference(file, system='ss'):
+    """
+        Reads the input and output variables (name -> (first index, size)) and the reference structure of the
+        linearisation saved by LinearSystemSaver (see helper_functions/linear_system_store.py).
+
+        Returns:
+            tuple: input variables, output variables, structure (dict of arrays)
+    """
+    with h5.File(file, 'r') as f:
+        group = f[system]
+        if not all(name in group for name in ['input_variables', 'output_variables', 'structure']):
+            raise KeyError('The linear system {} has been saved without its input and output variables. Generate '
+                           'it again with generate_linear_system.py (LinearSystemSaver) or specify the gust input '
+                           'and the output channels explicitly.'.format(file))
+        structure = {name: np.array(dataset) for name, dataset in group['structure'].items()}
+        return read_variables(group['input_variables']), read_variables(group['output_variables']), structure
+
+
+def get_variable_indices(variables, name, kind='output'):
+    if name not in variables:
+        raise KeyError('The linear system has no {} variable {} (available: {}).'.format(
+            kind, name, ', '.join(variables.keys())))
+    first_position, size = variables[name]
+    return list(range(first_position, first_position + size))
+
+
+def get_node_rows(variables, structure, name, node):
+    """
+        Returns the output rows of the displacements (3) and rotations (3) of a node in the nodal output variable
+        with the given name (e.g. eta), or None for a node without degrees of freedom (e.g. the clamped node).
+    """
+    vdof = int(structure['vdof'][node])
+    if vdof < 0:
+        return None
+    return get_nodal_output_rows(vdof, first_row=variables[name][0])
+
+
+def get_root_load_combinations(variables, structure, name='eta', element=0):
+    """
+        Returns the root torsional (MT) and out-of-plane bending moment (OOP) of an element as linear combinations
+        of the nodal rotation outputs (list of (output row, coefficient)). The moments in the material frame are
+        evaluated from the linearised curvature between the end nodes of the element,
+            M = K (T(psi_0) (delta psi_end - delta psi_start) / L),
+        with the stiffness K of the element and the tangential operator T at the reference rotation psi_0 of the
+        element's midpoint. Like the loads written by postprocess_gust_response.py, these are the components 3 (MT)
+        and 4 (OOP) of the element loads.
+    """
+    node_start, node_end = structure['connectivities'][element][0:2]
+    length = np.linalg.norm(structure['pos'][node_end] - structure['pos'][node_start])
+    stiffness = structure['stiffness_db'][structure['elem_stiffness'][element]][3:6, 3:6]
+    # Moments per rotation difference between the end nodes
+    moment_coefficients = stiffness @ crv2tan(structure['psi'][element, 2]) / length
+
+    combinations = {'MT': {}, 'OOP': {}}
+    for node, sign in [(node_end, 1.), (node_start, -1.)]:
+        node_rows = get_node_rows(variables, structure, name, node)
+        if node_rows is None:
+            continue
+        for i_moment, label in [(0, 'MT'), (1, 'OOP')]:
+            for row, coefficient in zip(node_rows[1], moment_coefficients[i_moment]):
+                combinations[label][row] = combinations[label].get(row, 0.) + sign * float(coefficient)
+    return {label: sorted(combination.items()) for label, combination in combinations.items()}
+
+
+def get_screening_channels(file, node_tip=None, root_element=0, gust_input='u_gust', displacement_output='eta',
+                           velocity_output='eta_dot', euler_output='euler'):
+    """
+        Returns the gust input and the output channels of the screening (labels as in postprocess_gust_response.py)
+        from the variables and reference structure saved with the linear system (outputs in nodal coordinates):
+            - x, y, z, r, p, q: displacements and rotations of the tip node (by default the node with the largest
+              spanwise coordinate, as in postprocess_gust_response.py)
+            - x_dot, ..., q_dot: their rates, if the velocity output is available
+            - MT, OOP: root torsional and out-of-plane bending moment of the root element (see
+              get_root_load_combinations)
+            - Pitch: pitch angle, if the Euler angles are an output (free flight)
+
+        Returns:
+            tuple: gust input indices, output channels (label -> output row or list of (output row, coefficient))
+    """
+    input_variables, output_variables, structure = read_linear_system_reference(file)
+    gust_input_index = get_variable_indices(input_variables, gust_input, kind='input')
+    get_variable_indices(output_variables, displacement_output)
+    if node_tip is None:
+        node_tip = int(np.argmax(structure['pos'][:, 1]))
+    tip_rows = get_node_rows(output_variables, structure, displacement_output, node_tip)
+    if tip_rows is None:
+        raise ValueError('The tip node {} has no degrees of freedom in the linear system.'.format(node_tip))
+
+    output_channels = dict(zip(['x', 'y', 'z', 'r', 'p', 'q'], tip_rows[0] + tip_rows[1]))
+    if velocity_output in output_variables:
+        tip_rate_rows = get_node_rows(output_variables, structure, velocity_output, node_tip)
+        output_channels.update(zip(['x_dot', 'y_dot', 'z_dot', 'r_dot', 'p_dot', 'q_dot'],
+                                   tip_rate_rows[0] + tip_rate_rows[1]))
+    output_channels.update(get_root_load_combinations(output_variables, structure, displacement_output, root_element))
+    if euler_output in output_variables:
+        output_channels['Pitch'] = get_variable_indices(output_variables, euler_output)[1]
+    return gust_input_index, output_channels
+
+
+def get_one_minus_cos_gusts(time, u_inf, gust_lengths, gust_intensities, gust_offset=0.):
+    """
+        Returns the vertical gust velocities of 1-cos gusts at the leading edge reference point (as in SHARPy's
+        GustVelocityField with relative gust intensities), stacked as columns of one input matrix.
+
+        Returns:
+            np.ndarray: gust velocities (n_steps, n_gusts)
+    """
+    gust_lengths = np.atleast_1d(gust_lengths)
+    gust_intensities = np.atleast_1d(gust_intensities)
+    x_gust = u_inf * time[:, None] - gust_offset
+    inside_gust = np.logical_and(x_gust >= 0., x_gust <= gust_lengths[None, :])
+    return inside_gust * gust_intensities[None, :] * u_inf * np.sin(np.pi * x_gust / gust_lengths[None, :]) ** 2
+
+
+def simulate_batch(A, B, C, D, gust_input, gust_input_index, output_rows, x0=None):
+    """
+        Time-marches the discrete-time system for all gust inputs simultaneously, i.e. the states of all cases
+        are stored as columns of one matrix and advanced with a single matrix product per timestep.
+
+        Args:
+            gust_input (np.ndarray): gust velocities (n_steps, n_cases)
+            gust_input_index (int or list): input(s) of the state space driven by the gust velocity
+            output_rows (list): output rows to be computed
+
+        Returns:
+            np.ndarray: outputs (n_steps, len(output_rows), n_cases)
+    """
+    n_steps, n_cases = gust_input.shape
+    b_gust = np.atleast_2d(to_dense(B[:, gust_input_index]).T).sum(axis=0)
+    c_out = C[output_rows, :]
+    d_gust = np.atleast_2d(to_dense(D[output_rows, :][:, gust_input_index]).T).sum(axis=0)
+
+    x = np.zeros((A.shape[0], n_cases)) if x0 is None else np.tile(np.reshape(x0, (-1, 1)), (1, n_cases))
+    y = np.zeros((n_steps, len(output_rows), n_cases))
+    for i_step in range(n_steps):
+        y[i_step] = c_out @ x + np.outer(d_gust, gust_input[i_step])
+        x = A @ x + np.outer(b_gust, gust_input[i_step])
+    return y
+
+
+def get_output_combinations(output_channels):
+    """
+        Returns the output rows needed by the output channels (label -> output row, (output row, scaling factor) or
+        list of (output row, coefficient)) and the matrix combining them to the channels (n_channels, n_rows).
+    """
+    channel_combinations = []
+    for channel in output_channels.values():
+        if isinstance(channel, tuple):
+            channel_combinations.append([channel])
+        elif isinstance(channel, (list, np.ndarray)):
+            channel_combinations.append([(row, coefficient) for row, coefficient in channel])
+        else:
+            channel_combinations.append([(channel, 1.)])
+    output_rows = sorted(set(int(row) for combination in channel_combinations for row, _ in combination))
+    combination_matrix = np.zeros((len(channel_combinations), len(output_rows)))
+    for i_channel, combination in enumerate(channel_combinations):
+        for row, coefficient in combination:
+            combination_matrix[i_channel, output_rows.index(int(row))] += coefficient
+    return output_rows, combination_matrix
+
+
+def get_gust_responses(A, B, C, D, dt, gust_input, gust_input_index, output_channels):
+    """
+        Simulates the responses to a batch of gust inputs and arranges them as in postprocess_gust_response.py.
+
+        Args:
+            output_channels (dict): label (see response_labels) -> output row, (output row, scaling factor) or list
+                                    of (output row, coefficient), see get_screening_channels. Channels not given
+                                    are set to NaN.
+
+        Returns:
+            np.ndarray: responses (n_cases, n_steps, len(response_labels))
+    """
+    n_steps, n_cases = gust_input.shape
+    output_rows, combination_matrix = get_output_combinations(output_channels)
+    y = np.einsum('cr,trn->tcn', combination_matrix,
+                  simulate_batch(A, B, C, D, gust_input, gust_input_index, output_rows))
+
+    responses = np.full((n_cases, n_steps, len(response_labels)), np.nan)
+    responses[:, :, 0] = np.arange(n_steps) * dt
+    responses[:, :, 1] = gust_input.T
+    for i_channel, label in enumerate(output_channels.keys()):
+        responses[:, :, response_labels.index(label)] = y[:, i_channel, :].T
+    return responses
+
+
+def get_peak_values(responses, labels=('OOP', 'MT', 'z')):
+    """
+        Returns the peak absolute values of the given channels of each case (n_cases, len(labels)).
+    """
+    return np.stack([np.nanmax(np.abs(responses[:, :, response_labels.index(label)]), axis=1)
+                     for label in labels], axis=1)
+
+
+def get_critical_cases(responses, num_cases, label='OOP'):
+    """
+        Returns the indices of the num_cases cases with the highest peak absolute value of the given channel.
+    """
+    peaks = get_peak_values(responses, labels=[label])[:, 0]
+    return np.argsort(peaks)[::-1][:num_cases]
+
+
+def write_batch_results(file, responses, case_parameters):
+    """
+        Writes the responses of all cases and their parameters (dict of arrays with one entry per case)
+        into a single HDF5 file.
+    """
+    folder = os.path.dirname(os.path.abspath(file))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with h5.File(file, 'w') as f:
+        f.create_dataset('responses', data=responses, chunks=(1,) + responses.shape[1:], compression='gzip')
+        f['responses'].attrs['labels'] = response_labels
+        for parameter, values in case_parameters.items():
+            f['case_parameters/' + parameter] = np.asarray(values)
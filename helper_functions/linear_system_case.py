@@ -0,0 +1,139 @@
+"""
+    Builds and runs a single linearisation case of the (Super)Flexop from a dictionary of case parameters, i.e.
+    the steps of generate_linear_system.py. The keys of the parameter dictionary match the names of the parameters
+    defined in generate_linear_system.py.
+"""
+
+import os
+import numpy as np
+import flexop as aircraft
+import helper_functions.linear_system_store # registers the LinearSystemSaver postprocessor with SHARPy
+from helper_functions.get_settings import get_settings
+from helper_functions.trim_cache import apply_trim_cache, read_trim_results, store_trim
+
+
+def get_linear_flow(use_trim, stability_analysis=False, low_memory=False):
+    flow = ['BeamLoader',
+            'Modal',
+            'AerogridLoader',
+            'StaticCoupled',
+            'DynamicCoupled',
+            'Modal',
+            'LinearAssembler',
+            'AsymptoticStability',
+            'SaveData',
+    ]
+    if use_trim:
+        flow[flow.index('StaticCoupled')] = 'StaticTrim'
+    if not stability_analysis:
+        flow.remove('AsymptoticStability')
+    if low_memory:
+        flow[flow.index('SaveData')] = 'LinearSystemSaver'
+    else:
+        # Appends the variables and the reference structure of the linear system to the file written by SaveData
+        flow.append('LinearSystemSaver')
+    return flow
+
+
+def get_default_rom_settings(use_rom):
+    return {'use': use_rom,
+            'rom_method': 'Krylov',
+            'rom_method_settings': {'Krylov': {'algorithm': 'mimo_rational_arnoldi',
+                                               'r': 4,
+                                               'frequency': np.array([0]),
+                                               'single_side': 'observability',
+                                               },
+                                    },
+            }
+
+
+def init_linear_model(case_name, cases_route, output_route, case_parameters):
+    for route in [cases_route, output_route]:
+        if not os.path.exists(route):
+            os.makedirs(route)
+    flexop_model = aircraft.FLEXOP(case_name, cases_route, output_route)
+    flexop_model.clean()
+    flexop_model.init_structure(sigma=case_parameters['factor_material_stiffness'],
+                                n_elem_multiplier=case_parameters['n_elem_multiplier'], # Discretisation of wing beam
+                                n_elem_multiplier_tail=case_parameters['n_elem_multiplier_tail'], # Discretisation of tail beam
+                                n_elem_multiplier_fuselage=1, # Discretisation of fuselage beam
+                                lifting_only=case_parameters['lifting_only'],
+                                wing_only=case_parameters['wing_only'])
+    flexop_model.init_aero(m=case_parameters['num_chord_panels'], cs_deflection=case_parameters['cs_deflection'])
+    flexop_model.structure.set_thrust(case_parameters['thrust'])
+    return flexop_model
+
+
+def get_linear_time_step(flexop_model, case_parameters):
+    return case_parameters['CFL'] * flexop_model.aero.chord_main_root / flexop_model.aero.m / case_parameters['u_inf']
+
+
+def generate_linear_case(case_name, cases_route, output_route, case_parameters, flow=None):
+    """
+        Initialises the aircraft model, writes all SHARPy input files of the linearisation case and returns the
+        model ready to be run with flexop_model.run(). By default, the flow is defined by get_linear_flow.
+    """
+    flexop_model = init_linear_model(case_name, cases_route, output_route, case_parameters)
+    if flow is None:
+        flow = get_linear_flow(case_parameters['use_trim'],
+                               case_parameters['stability_analysis'],
+                               case_parameters.get('low_memory', False))
+    rom_settings = case_parameters.get('rom_settings')
+    if rom_settings is None:
+        rom_settings = get_default_rom_settings(case_parameters['use_rom'])
+    else:
+        rom_settings = dict(rom_settings, use=case_parameters['use_rom'])
+    settings = get_settings(flexop_model,
+                            flow,
+                            get_linear_time_step(flexop_model, case_parameters),
+                            alpha=case_parameters['alpha'],
+                            cs_deflection=case_parameters['cs_deflection'],
+                            cs_deflection_initial=case_parameters['cs_deflection'],
+                            u_inf=case_parameters['u_inf'],
+                            rho=case_parameters['rho'],
+                            thrust=case_parameters['thrust'],
+                            gravity=case_parameters['gravity'],
+                            horseshoe=case_parameters['horseshoe'],
+                            wake_length=case_parameters['wake_length'],
+                            free_flight=case_parameters['free_flight'],
+                            num_cores=case_parameters['num_cores'],
+                            tolerance=case_parameters['tolerance'],
+                            fsi_tolerance=case_parameters['fsi_tolerance'],
+                            structural_relaxation_factor=case_parameters['structural_relaxation_factor'],
+                            newmark_damp=case_parameters['newmark_damp'],
+                            n_tstep=case_parameters['n_tstep'],
+                            num_modes=case_parameters['num_modes'],
+                            rom_settings=rom_settings,
+                            use_sparse=case_parameters.get('low_memory', False),
+                            save_linear_uvlm=case_parameters.get('save_linear_uvlm', False),
+                            velocity_analysis=case_parameters.get('velocity_analysis', [20, 80, 13]),
+                            remove_gust_input_in_statespace=case_parameters['remove_gust_input_in_statespace'])
+
+    # Generate finale FLEXOP model
+    flexop_model.generate()
+    flexop_model.create_settings(settings)
+    return flexop_model
+
+
+def run_linear_case(case_name, cases_route, output_route, case_parameters, flow=None):
+    """
+        Generates and runs a linearisation case. The linear system is saved by SaveData to
+        <output_route>/<case_name>/savedata/<case_name>.linss.h5.
+
+        In low-memory mode (case parameter low_memory), the UVLM is assembled with sparse matrices and the linear
+        system is saved to the same file by LinearSystemSaver without densifying them, which also reports the
+        matrix sizes and the peak memory (see helper_functions/linear_system_store.py).
+
+        If a trim cache file is specified (case parameter trim_cache_file), the trim state is taken from the cache
+        or, if not cached yet, computed with StaticTrim and stored afterwards.
+    """
+    trim_cache_file = case_parameters.get('trim_cache_file')
+    if trim_cache_file is not None:
+        case_parameters, trim_cache_hit = apply_trim_cache(trim_cache_file, case_parameters)
+
+    flexop_model = generate_linear_case(case_name, cases_route, output_route, case_parameters, flow=flow)
+    flexop_model.run()
+
+    if trim_cache_file is not None and not trim_cache_hit:
+        store_trim(trim_cache_file, case_parameters, read_trim_results(output_route, case_name))
+    return flexop_model
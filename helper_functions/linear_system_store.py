@@ -0,0 +1,216 @@
+"""
+    Low-memory storage of the linear aeroelastic system. The LinearSystemSaver postprocessor replaces SaveData
+    (save_linear, save_linear_uvlm) at the end of the linearisation flow and writes the state space of the coupled
+    aeroelastic system (group 'ss') and optionally of the full-order UVLM (group 'uvlm') to
+    <output_folder>/savedata/<case>.linss.h5, the same file read by load_state_space.
+
+    Sparse matrices (e.g. the UVLM matrices assembled with use_sparse) are stored in compressed sparse row format
+    (datasets data, indices and indptr of a group with the matrix shape as attribute) and are never converted to
+    dense arrays. Dense matrices are stored as chunked datasets of row blocks, which can be read block by block
+    without loading the whole matrix (see read_matrix in helper_functions/linear_gust_response.py with lazy=True).
+
+    The shape, number of non-zero entries and stored size of each matrix, as well as the peak memory of the process,
+    are written to <output_folder>/savedata/<case>.linss.report.json.
+
+    The input and output variables of the aeroelastic state space (name, first row/column and size, groups
+    'ss/input_variables' and 'ss/output_variables') and the reference structure of the linearisation (group
+    'ss/structure') are saved as well, so that the gust input and the output channels are found without knowing
+    the linear system settings (see get_screening_channels in helper_functions/linear_gust_response.py). With
+    save_matrices = False, only these are appended to the file written by SaveData.
+
+    The postprocessor is registered with SHARPy when this module is imported.
+"""
+
+import json
+import os
+import resource
+import h5py as h5
+import numpy as np
+import scipy.sparse as sp
+import sharpy.utils.cout_utils as cout
+import sharpy.utils.settings as settings_utils
+from sharpy.utils.solver_interface import solver, BaseSolver
+
+state_space_matrices = ['A', 'B', 'C', 'D']
+
+
+def get_peak_memory():
+    """
+        Returns the peak resident memory of the process in bytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_matrix_report(matrix):
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        nnz = matrix.nnz
+        stored_bytes = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    else:
+        nnz = int(np.count_nonzero(matrix))
+        stored_bytes = matrix.nbytes
+    return {'shape': list(matrix.shape),
+            'sparse': sp.issparse(matrix),
+            'nnz': nnz,
+            'stored_bytes': int(stored_bytes),
+            'dense_bytes': int(np.prod(matrix.shape)) * matrix.dtype.itemsize}
+
+
+def write_matrix(group, name, matrix, row_block_size=2000):
+    """
+        Writes a dense or sparse matrix to an HDF5 group (see module description) and returns its size report.
+    """
+    if name in group:
+        del group[name]
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix)
+        matrix_group = group.create_group(name)
+        matrix_group.attrs['shape'] = matrix.shape
+        for array_name in ['data', 'indices', 'indptr']:
+            matrix_group.create_dataset(array_name, data=getattr(matrix, array_name))
+    else:
+        matrix = np.atleast_2d(matrix)
+        chunks = (max(1, min(row_block_size, matrix.shape[0])), max(1, matrix.shape[1]))
+        dataset = group.create_dataset(name, shape=matrix.shape, dtype=matrix.dtype, chunks=chunks)
+        for i_row in range(0, matrix.shape[0], row_block_size):
+            dataset[i_row:i_row + row_block_size, :] = matrix[i_row:i_row + row_block_size, :]
+    return get_matrix_report(matrix)
+
+
+def write_state_space(file, group_name, state_space, row_block_size=2000):
+    """
+        Writes the matrices and the time step of a (SHARPy) state space to a group of the file.
+
+        Returns:
+            dict: matrix name -> size report
+    """
+    group = file.require_group(group_name)
+    report = {}
+    for matrix_name in state_space_matrices:
+        report[matrix_name] = write_matrix(group, matrix_name, getattr(state_space, matrix_name), row_block_size)
+    if 'dt' in group:
+        del group['dt']
+    if getattr(state_space, 'dt', None) is not None:
+        group.create_dataset('dt', data=state_space.dt)
+    return report
+
+
+def write_variables(group, name, linear_vector):
+    """
+        Writes the names, first indices and sizes of the variables of a SHARPy LinearVector (inputs, outputs or
+        states of a state space) to a subgroup of the given group.
+    """
+    if name in group:
+        del group[name]
+    variables_group = group.create_group(name)
+    vector_variables = linear_vector.vector_variables
+    variables_group.create_dataset('names', data=np.array([variable.name for variable in vector_variables], dtype='S'))
+    variables_group.create_dataset('first_positions',
+                                   data=np.array([variable.first_position for variable in vector_variables], dtype=int))
+    variables_group.create_dataset('sizes', data=np.array([variable.size for variable in vector_variables], dtype=int))
+
+
+def write_structure_reference(group, structure, tstep):
+    """
+        Writes the beam properties and the structural state of the linearisation needed to locate nodal outputs
+        and to evaluate internal loads from them (see helper_functions/linear_gust_response.py).
+    """
+    if 'structure' in group:
+        del group['structure']
+    structure_group = group.create_group('structure')
+    structure_group.create_dataset('vdof', data=structure.vdof)
+    structure_group.create_dataset('connectivities', data=structure.connectivities)
+    structure_group.create_dataset('stiffness_db', data=structure.stiffness_db)
+    structure_group.create_dataset('elem_stiffness', data=structure.elem_stiffness)
+    structure_group.create_dataset('pos', data=tstep.pos)
+    structure_group.create_dataset('psi', data=tstep.psi)
+
+
+def format_bytes(num_bytes):
+    return '{:.1f} MB'.format(num_bytes / 1024 ** 2)
+
+
+@solver
+class LinearSystemSaver(BaseSolver):
+    """
+        Saves the linear state space(s) assembled by LinearAssembler without densifying sparse matrices and reports
+        the matrix sizes and the peak memory of the process.
+    """
+    solver_id = 'LinearSystemSaver'
+    solver_classification = 'postprocessor'
+
+    settings_types = dict()
+    settings_default = dict()
+    settings_description = dict()
+
+    settings_types['save_uvlm'] = 'bool'
+    settings_default['save_uvlm'] = False
+    settings_description['save_uvlm'] = 'Save the full-order UVLM state space in addition to the aeroelastic one'
+
+    settings_types['save_matrices'] = 'bool'
+    settings_default['save_matrices'] = True
+    settings_description['save_matrices'] = 'Save the state space matrices, otherwise only the variables and the ' \
+                                            'reference structure are appended to the file written by SaveData'
+
+    settings_types['row_block_size'] = 'int'
+    settings_default['row_block_size'] = 2000
+    settings_description['row_block_size'] = 'Number of rows of dense matrices written (and chunked) at once'
+
+    def __init__(self):
+        self.settings = None
+        self.data = None
+        self.caller = None
+        self.folder = None
+
+    def initialise(self, data, custom_settings=None, caller=None, restart=False):
+        self.data = data
+        if custom_settings is None:
+            self.settings = data.settings[self.solver_id]
+        else:
+            self.settings = custom_settings
+        settings_utils.to_custom_types(self.settings, self.settings_types, self.settings_default)
+        self.caller = caller
+        self.folder = os.path.join(self.data.output_folder, 'savedata')
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    def run(self, **kwargs):
+        case = self.data.settings['SHARPy']['case']
+        file = os.path.join(self.folder, case + '.linss.h5')
+        state_space = self.data.linear.ss
+        if not self.settings['save_matrices']:
+            with h5.File(file, 'a') as f:
+                group = f.require_group('ss')
+                write_variables(group, 'input_variables', state_space.input_variables)
+                write_variables(group, 'output_variables', state_space.output_variables)
+                write_structure_reference(group, self.data.structure, self.data.linear.tsstruct0)
+            return self.data
+
+        report = {}
+        with h5.File(file, 'w') as f:
+            report['ss'] = write_state_space(f, 'ss', state_space, self.settings['row_block_size'])
+            write_variables(f['ss'], 'input_variables', state_space.input_variables)
+            write_variables(f['ss'], 'output_variables', state_space.output_variables)
+            write_structure_reference(f['ss'], self.data.structure, self.data.linear.tsstruct0)
+            if self.settings['save_uvlm']:
+                report['uvlm'] = write_state_space(f,
+                                                   'uvlm',
+                                                   self.data.linear.linear_system.uvlm.ss,
+                                                   self.settings['row_block_size'])
+        report['peak_memory'] = get_peak_memory()
+        with open(os.path.join(self.folder, case + '.linss.report.json'), 'w') as f:
+            json.dump(report, f, indent=4)
+
+        for system_name in ['ss', 'uvlm']:
+            if system_name not in report:
+                continue
+            cout.cout_wrap('Linear system {}: {} states'.format(system_name, report[system_name]['A']['shape'][0]), 1)
+            for matrix_name, matrix_report in report[system_name].items():
+                cout.cout_wrap('\t{}: {} x {}, {} non-zeros, {} stored ({} dense)'.format(
+                    matrix_name,
+                    *matrix_report['shape'],
+                    matrix_report['nnz'],
+                    format_bytes(matrix_report['stored_bytes']),
+                    format_bytes(matrix_report['dense_bytes'])), 1)
+        cout.cout_wrap('Peak memory: {}'.format(format_bytes(report['peak_memory'])), 1)
+        return self.data
@@ -0,0 +1,257 @@
+"""
+    Mesh convergence of gust response simulations. The discretisation of the (Super)Flexop (chordwise panels and
+    beam elements of the wing, tail and fuselage, see discretisation_parameters) required for converged gust loads
+    depends on the configuration, e.g. the stiffness factor, wing only and free flight or clamped. The cheapest
+    adequate discretisation is determined per configuration:
+        1) a short gust case is run for every combination of the discretisation parameters (run concurrently as a
+           campaign, see helper_functions/campaign.py),
+        2) the converged peak root out-of-plane moment and tip deflection are estimated by Richardson
+           extrapolation along each discretisation parameter from the finest cases, assuming that the
+           discretisation errors of the parameters add up,
+        3) the discretisation with the fewest degrees of freedom (bound panels and structural degrees of freedom of
+           the model files of the case, see get_degrees_of_freedom) whose peak values are within the tolerance of the
+           extrapolated values is recommended. The wall time, which depends on the load of the machine, only
+           breaks ties.
+
+    Recommendations are stored in a JSON file keyed by the configuration (see mesh_configuration_parameters).
+    Cases with the case parameter discretisation_settings_file use the recommended discretisation of their
+    configuration if available (see apply_discretisation_settings).
+"""
+
+import copy
+import fcntl
+import json
+import os
+import h5py as h5
+import numpy as np
+from scipy.optimize import brentq
+from helper_functions.campaign import read_wall_time
+from helper_functions.settings_tools import get_fingerprint
+
+# Case parameters defining a configuration for which the adequate discretisation is determined
+mesh_configuration_parameters = ['free_flight',
+                                 'wing_only',
+                                 'lifting_only',
+                                 'factor_material_stiffness',
+                                 'u_inf']
+# Discretisation parameters (number of chordwise panels and element multipliers of the beams)
+discretisation_parameters = ['num_chord_panels',
+                             'n_elem_multiplier',
+                             'n_elem_multiplier_tail',
+                             'n_elem_multiplier_fuselage']
+# Channels whose peak values are extrapolated
+mesh_convergence_labels = ['OOP', 'z']
+
+
+def get_mesh_configuration(case_parameters):
+    return {parameter: case_parameters[parameter] for parameter in mesh_configuration_parameters}
+
+
+def get_mesh_configuration_key(case_parameters):
+    return get_fingerprint(get_mesh_configuration(case_parameters))
+
+
+def get_discretisation(case_parameters):
+    return {parameter: case_parameters.get(parameter) for parameter in discretisation_parameters}
+
+
+def get_degrees_of_freedom(cases_route, case_name):
+    """
+        Returns the number of degrees of freedom of the model of a case, i.e. the number of bound panels (each
+        element of a lifting surface spans num_node_elem - 1 panels of surface_m chordwise panels) and the six
+        structural degrees of freedom of each node, from the model input files of the case.
+    """
+    fem_file = os.path.join(cases_route, case_name + '.fem.h5')
+    aero_file = os.path.join(cases_route, case_name + '.aero.h5')
+    for model_file in [fem_file, aero_file]:
+        if not os.path.isfile(model_file):
+            raise FileNotFoundError('Model file {} of case {} not found.'.format(model_file, case_name))
+    with h5.File(fem_file, 'r') as f:
+        num_node = int(f['num_node'][()])
+        num_node_elem = int(f['num_node_elem'][()])
+    with h5.File(aero_file, 'r') as f:
+        surface_distribution = f['surface_distribution'][()]
+        surface_m = f['surface_m'][()]
+    lifting_elements = surface_distribution >= 0
+    num_panels = int(np.sum(surface_m[surface_distribution[lifting_elements]])) * (num_node_elem - 1)
+    return num_panels + 6 * num_node
+
+
+def get_observed_order(h, f, assumed_order=2.):
+    """
+        Returns the observed order of convergence p of f = f_exact + C h^p from the three finest levels (h
+        ascending). The assumed order is returned if the convergence is not monotonic.
+    """
+    if f[1] == f[0]:
+        return assumed_order
+    ratio = (f[2] - f[1]) / (f[1] - f[0])
+
+    def residual(p):
+        return (h[2] ** p - h[1] ** p) / (h[1] ** p - h[0] ** p) - ratio
+
+    try:
+        return brentq(residual, 0.25, 8.)
+    except ValueError:
+        return assumed_order
+
+
+def richardson_extrapolation(h, f, assumed_order=2.):
+    """
+        Returns the Richardson extrapolation of f to h = 0 and the order of convergence used, given the values f at
+        the mesh sizes h (e.g. the inverse of the number of panels or elements). The order is estimated from the
+        three finest levels if available and the assumed order is used otherwise.
+
+        Returns:
+            tuple: extrapolated value, order of convergence
+    """
+    order = np.argsort(h)
+    h = np.asarray(h, dtype=float)[order]
+    f = np.asarray(f, dtype=float)[order]
+    if len(h) < 2:
+        return f[0], np.nan
+    p = get_observed_order(h, f, assumed_order) if len(h) >= 3 else assumed_order
+    coefficient = (f[1] - f[0]) / (h[1] ** p - h[0] ** p)
+    return f[0] - coefficient * h[0] ** p, p
+
+
+def get_extrapolated_peaks(list_results, labels, assumed_order=2.):
+    """
+        Returns the converged peak values of each channel, extrapolated from the finest case along each
+        discretisation parameter varied in the study (with all other parameters at their finest value).
+
+        Returns:
+            tuple: dict label -> extrapolated peak value, dict parameter -> dict label -> order of convergence
+    """
+    varied_parameters = [parameter for parameter in discretisation_parameters
+                         if len(set(result['discretisation'][parameter] for result in list_results)) > 1]
+    finest = {parameter: max(result['discretisation'][parameter] for result in list_results)
+              if parameter in varied_parameters else list_results[0]['discretisation'][parameter]
+              for parameter in discretisation_parameters}
+    finest_result = [result for result in list_results if result['discretisation'] == finest]
+    if len(finest_result) == 0:
+        raise ValueError('The study does not include the finest discretisation {}.'.format(finest))
+
+    extrapolated_peaks = dict(finest_result[0]['peaks'])
+    orders = {}
+    for parameter in varied_parameters:
+        axis_results = [result for result in list_results
+                        if all(result['discretisation'][other] == finest[other]
+                               for other in discretisation_parameters if other != parameter)]
+        h = [1. / result['discretisation'][parameter] for result in axis_results]
+        orders[parameter] = {}
+        for label in labels:
+            extrapolated_peak, orders[parameter][label] = richardson_extrapolation(
+                h, [result['peaks'][label] for result in axis_results], assumed_order)
+            extrapolated_peaks[label] += extrapolated_peak - finest_result[0]['peaks'][label]
+    return extrapolated_peaks, orders
+
+
+def evaluate_mesh_study(list_cases, get_time_history, parameter_labels, labels=None, assumed_order=2.):
+    """
+        Evaluates the peak values of all cases of a mesh convergence study (cases as returned by get_campaign_cases)
+        and their errors relative to the extrapolated peak values.
+
+        Args:
+            get_time_history: function returning the time history of a case from its output route and name
+                              (see postprocess_gust_response.py)
+            parameter_labels (list): labels of the columns of the time history (without time)
+            labels (list): evaluated channels (default: mesh_convergence_labels)
+
+        Returns:
+            tuple: list of the results per case (dict with the case name, discretisation, degrees of freedom,
+                   wall time, peak values and relative errors), sorted by degrees of freedom (see
+                   get_degrees_of_freedom) and wall time, dict of the extrapolated peak values, dict of the orders of
+                   convergence
+    """
+    if labels is None:
+        labels = mesh_convergence_labels
+    list_results = []
+    for case_name, cases_route, output_route, case_parameters in list_cases:
+        data = get_time_history(output_route, case_name)
+        list_results.append({'case_name': case_name,
+                             'discretisation': get_discretisation(case_parameters),
+                             'degrees_of_freedom': get_degrees_of_freedom(cases_route, case_name),
+                             'wall_time': read_wall_time(output_route, case_name),
+                             'peaks': {label: float(np.nanmax(np.abs(data[:, parameter_labels.index(label) + 1])))
+                                       for label in labels}})
+
+    extrapolated_peaks, orders = get_extrapolated_peaks(list_results, labels, assumed_order)
+    for result in list_results:
+        result['relative_errors'] = {label: abs(result['peaks'][label] - extrapolated_peaks[label])
+                                            / abs(extrapolated_peaks[label]) for label in labels}
+    return (sorted(list_results, key=lambda result: (result['degrees_of_freedom'], result['wall_time'])),
+            extrapolated_peaks,
+            orders)
+
+
+def recommend_discretisation(list_results, tolerance):
+    """
+        Returns the result of the cheapest case whose relative errors are all below the tolerance, or None if no
+        case of the study is converged.
+    """
+    for result in list_results:
+        if max(result['relative_errors'].values()) <= tolerance:
+            return result
+    return None
+
+
+def load_discretisation_settings(settings_file):
+    if not os.path.isfile(settings_file):
+        return {}
+    with open(settings_file, 'r') as f:
+        return json.load(f)
+
+
+def store_discretisation(settings_file, case_parameters, recommendation, tolerance):
+    """
+        Stores the recommended discretisation of the configuration of the case. The file is locked while being
+        updated, so that studies of several configurations can share the same file.
+    """
+    settings_folder = os.path.dirname(os.path.abspath(settings_file))
+    if not os.path.exists(settings_folder):
+        os.makedirs(settings_folder)
+    with open(settings_file + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        discretisation_settings = load_discretisation_settings(settings_file)
+        discretisation_settings[get_mesh_configuration_key(case_parameters)] = {
+            'configuration': get_mesh_configuration(case_parameters),
+            'discretisation': recommendation['discretisation'],
+            'tolerance': tolerance,
+            'relative_errors': recommendation['relative_errors']}
+        with open(settings_file + '.tmp', 'w') as f:
+            json.dump(discretisation_settings, f, indent=4)
+        os.replace(settings_file + '.tmp', settings_file)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def apply_discretisation_settings(settings_file, case_parameters):
+    """
+        Sets the discretisation of a case to the recommended discretisation of its configuration. Cases of
+        configurations without recommendation are unchanged.
+
+        Returns:
+            tuple: updated copy of the case parameters, flag whether a recommendation was found
+    """
+    case_parameters = copy.deepcopy(case_parameters)
+    entry = load_discretisation_settings(settings_file).get(get_mesh_configuration_key(case_parameters))
+    if entry is None:
+        return case_parameters, False
+    case_parameters.update(entry['discretisation'])
+    return case_parameters, True
+
+
+def format_mesh_results(list_results, extrapolated_peaks, tolerance):
+    labels = list(extrapolated_peaks.keys())
+    lines = ['{:>6} {:>6} {:>6} {:>6} {:>8} {:>12}  {}'.format('m', 'n', 'n_tail', 'n_fus', 'DOFs', 'wall time',
+                                                                 '  '.join('{:>9}'.format(label) for label in labels)),
+             '{:>6} {:>6} {:>6} {:>6} {:>8} {:>12}  {}'.format('', '', '', '', '', 'extrapolated', '  '.join(
+                 '{:9.3e}'.format(extrapolated_peaks[label]) for label in labels))]
+    for result in list_results:
+        converged = max(result['relative_errors'].values()) <= tolerance
+        lines.append('{:>6} {:>6} {:>6} {:>6} {:>8} {:>10.1f} s  {}{}'.format(
+            *[str(result['discretisation'][parameter]) for parameter in discretisation_parameters],
+            result['degrees_of_freedom'],
+            result['wall_time'],
+            '  '.join('{:9.2e}'.format(result['relative_errors'][label]) for label in labels),
+            '' if converged else '  not converged'))
+    return '\n'.join(lines)
@@ -0,0 +1,98 @@
+"""
+    Content-addressed cache of the SHARPy model input files (e.g. <case>.fem.h5, <case>.aero.h5) written by
+    flexop_model.generate(). In a gust sweep, the structural and aerodynamic models are identical for all cases,
+    so the files are generated once per model and linked into the case route of every other case instead of
+    being regenerated.
+
+    The cache key is a hash of the case parameters defining the model files (see model_key_parameters) and of the
+    installed flexop model source files. Cached files are write-protected, so removing a case's input files
+    (flexop_model.clean()) only removes the links of the case and never changes the cache.
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+from helper_functions.settings_tools import get_fingerprint
+
+# Case parameters defining the model input files
+model_key_parameters = ['factor_material_stiffness',
+                        'n_elem_multiplier',
+                        'n_elem_multiplier_tail',
+                        'n_elem_multiplier_fuselage',
+                        'num_chord_panels',
+                        'ailerons_type',
+                        'cs_deflection',
+                        'thrust',
+                        'wing_only',
+                        'lifting_only']
+
+
+def get_model_source_stamp():
+    # Invalidates cached files if the flexop model source files change
+    import flexop
+    model_stamp = hashlib.sha1()
+    for source_file in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(flexop.__file__)), '**', '*.py'),
+                                        recursive=True)):
+        model_stamp.update('{}{}'.format(source_file, os.path.getmtime(source_file)).encode())
+    return model_stamp.hexdigest()
+
+
+def get_model_key(case_parameters):
+    return get_fingerprint({'parameters': {parameter: case_parameters.get(parameter)
+                                           for parameter in model_key_parameters},
+                            'model_source': get_model_source_stamp()})
+
+
+def link_file(source, destination):
+    # Hard link if possible, symbolic link across file systems, copy otherwise
+    try:
+        os.link(source, destination)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(source), destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+
+def link_cached_model(model_cache_route, model_key, cases_route, case_name):
+    """
+        Links the cached model input files into the case route.
+
+        Returns:
+            bool: True if the model files were cached, False otherwise
+    """
+    cached_model_folder = os.path.join(model_cache_route, model_key)
+    if not os.path.isdir(cached_model_folder):
+        return False
+    for cached_file in os.listdir(cached_model_folder):
+        case_file = os.path.join(cases_route, case_name + cached_file[len('model'):])
+        if os.path.lexists(case_file):
+            os.remove(case_file)
+        link_file(os.path.join(cached_model_folder, cached_file), case_file)
+    return True
+
+
+def store_model(model_cache_route, model_key, cases_route, case_name):
+    """
+        Adds the model input files generated for a case to the cache. The files are copied into a temporary folder
+        which is then renamed, so that concurrent cases never see an incomplete cache entry.
+    """
+    cached_model_folder = os.path.join(model_cache_route, model_key)
+    if os.path.isdir(cached_model_folder):
+        return
+    if not os.path.exists(model_cache_route):
+        os.makedirs(model_cache_route, exist_ok=True)
+    temporary_folder = tempfile.mkdtemp(dir=model_cache_route)
+    for case_file in glob.glob(os.path.join(cases_route, glob.escape(case_name) + '.*.h5')):
+        cached_file = os.path.join(temporary_folder, 'model' + os.path.basename(case_file)[len(case_name):])
+        shutil.copyfile(case_file, cached_file)
+        os.chmod(cached_file, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    os.chmod(temporary_folder, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
+    try:
+        os.rename(temporary_folder, cached_model_folder)
+    except OSError:
+        # Another case has stored the same model in the meantime
+        shutil.rmtree(temporary_folder, ignore_errors=True)
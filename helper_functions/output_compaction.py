@@ -0,0 +1,235 @@
+"""
+    Post-run compaction of the output folder of a case (<output_route>/<case>/), so that campaigns of hundreds of
+    gust cases fit into the scratch quota:
+        - the SaveData file (savedata/<case>.data.h5) is rewritten with chunked and compressed datasets. The
+          structural timestep info is kept entirely, whereas the aerodynamic grid and wake history is only kept
+          every stride timesteps (the datasets in kept_aero_datasets, e.g. the gust velocity u_ext, are kept at
+          every timestep). The wake can be dropped entirely.
+        - the VTK output (BeamPlot, AerogridPlot, Modal) and the modal matrices are packed into a single archive
+          (<case>.vtk.tar.gz).
+        - checkpoints of the finished simulation are removed.
+    The compacted file has the same layout as the SaveData file, so the postprocessing reads it transparently
+    (aerodynamic datasets of dropped timesteps are read as NaN by CaseResults, see case_results.py). What has been
+    retained is recorded in the manifest <case>/compaction.json.
+
+    Compaction is run after a case if the case parameter output_compaction is set (dict of the keyword arguments
+    of compact_case_output, e.g. {'stride': 10, 'keep_wake': False}), or for existing output with compact_output.py.
+"""
+
+import glob
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import h5py as h5
+from helper_functions.case_results import get_savedata_file
+
+# Aerodynamic datasets kept at every timestep
+default_kept_aero_datasets = ['u_ext']
+# Aerodynamic datasets of the wake
+wake_datasets = ['zeta_star', 'gamma_star', 'u_ext_star', 'dist_to_orig', 'wake_conv_vel']
+# Output files packed into the VTK archive (relative to the case output folder)
+default_packed_patterns = ['**/*.vtu', '**/*.vtp', '**/*.vtk', '**/*.pvd', 'beam_modal_analysis/**/*']
+# Datasets with fewer elements are neither chunked nor compressed
+min_compressed_size = 64
+
+
+def get_manifest_file(output_route, case_name):
+    return os.path.join(output_route, case_name, 'compaction.json')
+
+
+def read_compaction_manifest(output_route, case_name):
+    """
+        Returns the compaction manifest of a case or None if its output has not been compacted.
+    """
+    manifest_file = get_manifest_file(output_route, case_name)
+    if not os.path.isfile(manifest_file):
+        return None
+    with open(manifest_file, 'r') as f:
+        return json.load(f)
+
+
+def copy_attributes(source, destination):
+    for key, value in source.attrs.items():
+        destination.attrs[key] = value
+
+
+def copy_group(source, destination, is_kept=None, compression_level=4):
+    """
+        Copies the members of an HDF5 group recursively, with numeric datasets of at least min_compressed_size
+        elements chunked and compressed. Members for which is_kept(name) returns False are skipped.
+    """
+    copy_attributes(source, destination)
+    for name, item in source.items():
+        if is_kept is not None and not is_kept(name):
+            continue
+        if isinstance(item, h5.Group):
+            copy_group(item, destination.create_group(name), compression_level=compression_level)
+        elif item.dtype.kind in 'biufc' and item.size >= min_compressed_size:
+            dataset = destination.create_dataset(name,
+                                                 data=item[()],
+                                                 chunks=True,
+                                                 compression='gzip',
+                                                 compression_opts=compression_level,
+                                                 shuffle=True)
+            copy_attributes(item, dataset)
+        else:
+            source.copy(item, destination, name=name)
+
+
+def compact_savedata(file, stride=1, keep_wake=True, kept_aero_datasets=None, compression_level=4):
+    """
+        Rewrites a SaveData file with compressed datasets, keeping the aerodynamic grid and wake only every stride
+        timesteps (and the first and last timestep). The file is replaced once the compacted file is complete.
+
+        Returns:
+            dict: sizes of the original and compacted file [bytes] and number of aerodynamic timesteps with the
+                  full grid
+    """
+    if kept_aero_datasets is None:
+        kept_aero_datasets = default_kept_aero_datasets
+    original_size = os.path.getsize(file)
+    temporary_file = file + '.compact.tmp'
+    n_full_aero_timesteps = 0
+    with h5.File(file, 'r') as f_source, h5.File(temporary_file, 'w') as f_destination:
+        for name, item in f_source.items():
+            if name != 'data':
+                f_source.copy(item, f_destination, name=name)
+        data_source = f_source['data']
+        data_destination = f_destination.create_group('data')
+        copy_group(data_source, data_destination, is_kept=lambda name: name != 'aero',
+                   compression_level=compression_level)
+        if 'aero' in data_source:
+            aero_destination = data_destination.create_group('aero')
+            copy_group(data_source['aero'], aero_destination, is_kept=lambda name: name != 'timestep_info',
+                       compression_level=compression_level)
+            timestep_info_source = data_source['aero']['timestep_info']
+            timestep_info_destination = aero_destination.create_group('timestep_info')
+            copy_attributes(timestep_info_source, timestep_info_destination)
+            ts_names = sorted(timestep_info_source.keys())
+            for i_name, ts_name in enumerate(ts_names):
+                full_timestep = int(ts_name) % stride == 0 or i_name == len(ts_names) - 1
+
+                def is_kept(name):
+                    if not keep_wake and name in wake_datasets:
+                        return False
+                    return full_timestep or name in kept_aero_datasets
+
+                copy_group(timestep_info_source[ts_name], timestep_info_destination.create_group(ts_name),
+                           is_kept=is_kept, compression_level=compression_level)
+                n_full_aero_timesteps += full_timestep
+    os.replace(temporary_file, file)
+    return {'original_size': original_size,
+            'compacted_size': os.path.getsize(file),
+            'n_full_aero_timesteps': n_full_aero_timesteps}
+
+
+def pack_files(case_folder, archive_file, patterns=None):
+    """
+        Packs the files of the case output folder matching the patterns into a compressed tar archive and removes
+        them (and the folders left empty).
+
+        Returns:
+            list: packed files (relative to the case output folder)
+    """
+    if patterns is None:
+        patterns = default_packed_patterns
+    packed_files = sorted(set(file for pattern in patterns
+                              for file in glob.glob(os.path.join(case_folder, pattern), recursive=True)
+                              if os.path.isfile(file)))
+    if len(packed_files) == 0:
+        return []
+    if os.path.isfile(archive_file):
+        # Repeated compaction, e.g. of a resumed case: files packed before are kept in the archive
+        with tarfile.open(archive_file, 'r:gz') as archive:
+            previous_members = [(member, archive.extractfile(member).read()) for member in archive.getmembers()
+                                if member.isfile()]
+    else:
+        previous_members = []
+    temporary_file = archive_file + '.tmp'
+    relative_files = [os.path.relpath(file, case_folder) for file in packed_files]
+    with tarfile.open(temporary_file, 'w:gz') as archive:
+        for member, content in previous_members:
+            if member.name not in relative_files:
+                archive.addfile(member, fileobj=io.BytesIO(content))
+        for file, relative_file in zip(packed_files, relative_files):
+            archive.add(file, arcname=relative_file)
+    os.replace(temporary_file, archive_file)
+    for file in packed_files:
+        os.remove(file)
+    for folder in sorted(set(os.path.dirname(file) for file in packed_files), key=len, reverse=True):
+        while folder != case_folder and os.path.isdir(folder) and len(os.listdir(folder)) == 0:
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+    return relative_files
+
+
+def compact_case_output(output_route, case_name, stride=10, keep_wake=False, kept_aero_datasets=None,
+                        pack_vtk=True, packed_patterns=None, remove_checkpoints=True, compression_level=4):
+    """
+        Compacts the output folder of a finished case (see module description) and writes the compaction manifest.
+
+        Args:
+            stride (int): the aerodynamic grid (and wake) is kept every stride timesteps
+            keep_wake (bool): keep the wake at the retained timesteps
+            kept_aero_datasets (list): aerodynamic datasets kept at every timestep (default: u_ext)
+            pack_vtk (bool): pack the VTK output and modal matrices into <case>.vtk.tar.gz
+            packed_patterns (list): glob patterns of the packed files (default: default_packed_patterns)
+            remove_checkpoints (bool): remove the checkpoints of the finished simulation
+
+        Returns:
+            dict: manifest
+    """
+    case_folder = os.path.join(output_route, case_name)
+    manifest = read_compaction_manifest(output_route, case_name) or {'case_name': case_name, 'history': []}
+    settings = {'stride': stride,
+                'keep_wake': keep_wake,
+                'kept_aero_datasets': kept_aero_datasets or default_kept_aero_datasets,
+                'pack_vtk': pack_vtk,
+                'remove_checkpoints': remove_checkpoints}
+    entry = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'settings': settings}
+
+    savedata_file = get_savedata_file(output_route, case_name)
+    if os.path.isfile(savedata_file):
+        entry['savedata'] = compact_savedata(savedata_file,
+                                             stride=stride,
+                                             keep_wake=keep_wake,
+                                             kept_aero_datasets=kept_aero_datasets,
+                                             compression_level=compression_level)
+    if pack_vtk:
+        archive_file = os.path.join(case_folder, case_name + '.vtk.tar.gz')
+        packed_files = pack_files(case_folder, archive_file, packed_patterns)
+        manifest['archive'] = os.path.basename(archive_file) if os.path.isfile(archive_file) else None
+        manifest['packed_files'] = sorted(set(manifest.get('packed_files', [])) | set(packed_files))
+        entry['n_packed_files'] = len(packed_files)
+    checkpoint_route = os.path.join(case_folder, 'checkpoints')
+    if remove_checkpoints and os.path.isdir(checkpoint_route):
+        shutil.rmtree(checkpoint_route)
+        entry['removed'] = ['checkpoints']
+
+    manifest['savedata_retained'] = {'structure': 'all timesteps',
+                                     'aero': 'full grid every {} timesteps{}, {} at all timesteps'.format(
+                                         stride, '' if keep_wake else ' without wake',
+                                         ', '.join(settings['kept_aero_datasets']))}
+    manifest['history'].append(entry)
+    with open(get_manifest_file(output_route, case_name) + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(get_manifest_file(output_route, case_name) + '.tmp', get_manifest_file(output_route, case_name))
+    return manifest
+
+
+def compact_finished_case(output_route, case_name, case_parameters):
+    """
+        Compacts the output of a finished case with the settings of the case parameter output_compaction (no
+        compaction if it is not set).
+    """
+    compaction_settings = case_parameters.get('output_compaction')
+    if not compaction_settings:
+        return None
+    return compact_case_output(output_route, case_name, **compaction_settings)
+
+
+def get_folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(folder) for file in files)
@@ -0,0 +1,312 @@
+"""
+    Parametric reduced-order model (ROM) of the linear aeroelastic system across flight conditions.
+
+    Linear systems (with Krylov ROM of the aerodynamics, see generate_linear_system.py) are generated on a grid of
+    flight conditions, e.g. flight speeds and air densities, with the cases run concurrently in a process pool (see
+    helper_functions/campaign.py). The state spaces of the grid points are
+        1) converted to continuous time (bilinear transformation with the time step of each grid point),
+        2) transformed to a common set of coordinates, namely their balanced realisation of a common order with
+           the sign of each balanced state aligned to the first grid point. SHARPy does not save the projection
+           bases of the ROMs, so the balanced realisation (unique up to the sign of each state for distinct Hankel
+           singular values) is used instead of aligning the bases themselves. For free-flight systems with rigid
+           body modes, the Gramians are computed for the system shifted by a common shift, which makes all grid
+           points asymptotically stable.
+        3) interpolated entry by entry (multilinear interpolation on the grid) at the requested flight condition,
+           which is finally discretised with the requested time step.
+    The linear system at a new flight condition is thus obtained in milliseconds instead of a full linearisation
+    run. The interpolation requires the grid to be fine enough that the balanced states do not change their order,
+    i.e. the Hankel singular values do not cross between neighbouring grid points.
+
+    Note that the inputs and outputs of the linear systems are perturbations around the trim point of each grid
+    point.
+"""
+
+import json
+import os
+import time
+import traceback
+import h5py as h5
+import numpy as np
+import scipy.linalg as sclalg
+from scipy.interpolate import RegularGridInterpolator
+from helper_functions.campaign import get_campaign_cases, write_done_marker
+from helper_functions.linear_gust_response import get_linear_system_file, load_state_space, to_dense
+
+
+def run_linear_grid_case(case):
+    """
+        Runs the linearisation case of a grid point. Executed in a worker process of the campaign's process pool
+        (see run_campaign).
+
+        Returns:
+            tuple: case name, success flag, wall time, error message
+    """
+    from helper_functions.linear_system_case import run_linear_case
+
+    case_name, cases_route, output_route, case_parameters = case
+    start_time = time.time()
+    try:
+        run_linear_case(case_name, cases_route, output_route, case_parameters)
+    except Exception:
+        return case_name, False, time.time() - start_time, traceback.format_exc()
+    wall_time = time.time() - start_time
+    write_done_marker(output_route, case_name, case_parameters, wall_time)
+    return case_name, True, wall_time, ''
+
+
+def get_rom_grid_cases(campaign_route, base_name, base_parameters, parameter_grid):
+    """
+        Returns the linearisation cases of all grid points (see get_campaign_cases) with the ROM enabled. The grid
+        points are ordered as the flattened (C order) grid.
+    """
+    return get_campaign_cases(campaign_route, base_name, dict(base_parameters, use_rom=True), parameter_grid)
+
+
+def discrete_to_continuous(A, B, C, D, dt):
+    """
+        Returns the continuous-time state space of a discrete-time state space with time step dt (inverse of the
+        bilinear transformation).
+    """
+    A_plus_I = A + np.eye(A.shape[0])
+    A_plus_I_inv_B = np.linalg.solve(A_plus_I, B)
+    C_A_plus_I_inv = np.linalg.solve(A_plus_I.T, C.T).T
+    return (2 / dt * np.linalg.solve(A_plus_I, A - np.eye(A.shape[0])),
+            2 / dt * A_plus_I_inv_B,
+            2 * C_A_plus_I_inv,
+            D - C @ A_plus_I_inv_B)
+
+
+def continuous_to_discrete(A, B, C, D, dt):
+    """
+        Returns the discrete-time state space with time step dt of a continuous-time state space (bilinear
+        transformation).
+    """
+    I_minus_A = np.eye(A.shape[0]) - 0.5 * dt * A
+    B_d = np.linalg.solve(I_minus_A, dt * B)
+    return (np.linalg.solve(I_minus_A, np.eye(A.shape[0]) + 0.5 * dt * A),
+            B_d,
+            np.linalg.solve(I_minus_A.T, C.T).T,
+            D + 0.5 * C @ B_d)
+
+
+def get_gramian_factor(W):
+    """
+        Returns a factor L of a symmetric positive semi-definite Gramian with W = L L^T.
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh(0.5 * (W + W.T))
+    return eigenvectors * np.sqrt(np.clip(eigenvalues, 0., None))
+
+
+def get_balanced_factors(A, B, C, shift=0.):
+    """
+        Returns the Hankel singular values and the factors of the square root balancing method of the
+        continuous-time system (A - shift * I, B, C).
+
+        Returns:
+            tuple: Hankel singular values, controllability and observability Gramian factors, left and right
+                   singular vectors
+    """
+    A_shifted = A - shift * np.eye(A.shape[0])
+    L_c = get_gramian_factor(sclalg.solve_continuous_lyapunov(A_shifted, -B @ B.T))
+    L_o = get_gramian_factor(sclalg.solve_continuous_lyapunov(A_shifted.T, -C.T @ C))
+    U, hsv, Vh = np.linalg.svd(L_o.T @ L_c)
+    return hsv, L_c, L_o, U, Vh
+
+
+def balance_system(A, B, C, D, factors, order):
+    """
+        Returns the balanced realisation of the given order of a continuous-time system, with the balancing
+        factors from get_balanced_factors.
+    """
+    hsv, L_c, L_o, U, Vh = factors
+    scaling = 1 / np.sqrt(hsv[:order])
+    T = L_c @ Vh[:order, :].T * scaling
+    T_inv = scaling[:, None] * (U[:, :order].T @ L_o.T)
+    return T_inv @ A @ T, T_inv @ B, C @ T, D
+
+
+def align_signs(A, B, C, D, A_reference, B_reference, C_reference):
+    """
+        Flips the sign of each state of a balanced realisation such that its input and output vectors point in the
+        direction of the corresponding state of the reference system.
+    """
+    correlation = np.sum(B * B_reference, axis=1) + np.sum(C * C_reference, axis=0)
+    signs = np.where(correlation < 0, -1., 1.)
+    return signs[:, None] * A * signs[None, :], signs[:, None] * B, C * signs[None, :], D
+
+
+def get_stability_shift(list_A, shift_margin):
+    """
+        Returns the shift making all continuous-time systems asymptotically stable, i.e. the largest real part of
+        their eigenvalues (at least zero for the rigid body modes) plus a margin.
+    """
+    max_real_part = max([np.max(np.linalg.eigvals(A).real) for A in list_A])
+    return max(max_real_part, 0.) + shift_margin
+
+
+class ParametricROM:
+    """
+        Continuous-time linear systems in aligned (balanced) coordinates on a grid of flight conditions, which are
+        interpolated at intermediate flight conditions.
+
+        Args:
+            parameter_names (list): names of the grid parameters, e.g. ['u_inf', 'rho']
+            grid_values (list): grid values of each parameter (ascending)
+            A, B, C, D (np.ndarray): aligned continuous-time state space matrices of all grid points, each of
+                shape grid shape + matrix shape
+            dt (np.ndarray): time step of the linear system of each grid point
+            hsv (np.ndarray): Hankel singular values of the (shifted) system of each grid point
+            shift (float): shift used for the balancing
+    """
+    def __init__(self, parameter_names, grid_values, A, B, C, D, dt, hsv, shift):
+        self.parameter_names = list(parameter_names)
+        self.grid_values = [np.array(values, dtype=float) for values in grid_values]
+        self.A = A
+        self.B = B
+        self.C = C
+        self.D = D
+        self.dt = dt
+        self.hsv = hsv
+        self.shift = shift
+        grid_shape = tuple(len(values) for values in self.grid_values)
+        self.matrix_shapes = [matrix.shape[len(grid_shape):] for matrix in [A, B, C, D]]
+        matrix_entries = np.concatenate([matrix.reshape(grid_shape + (-1,)) for matrix in [A, B, C, D]], axis=-1)
+        self.interpolator = RegularGridInterpolator(self.grid_values, matrix_entries)
+        self.dt_interpolator = RegularGridInterpolator(self.grid_values, dt * self.get_time_step_scaling())
+
+    @property
+    def num_states(self):
+        return self.matrix_shapes[0][0]
+
+    @classmethod
+    def from_systems(cls, parameter_grid, list_systems, order=None, shift_margin=0.1, tolerance=1e-10):
+        """
+            Builds the parametric ROM from the discrete-time systems (A, B, C, D, dt) of all grid points, ordered
+            as the flattened (C order) grid (see get_rom_grid_cases).
+
+            Args:
+                parameter_grid (dict): parameter name -> grid values
+                list_systems (list): discrete-time state space of each grid point
+                order (int): order of the balanced realisations. By default, the smallest number of Hankel
+                    singular values larger than tolerance times the largest one of all grid points.
+                shift_margin (float): margin of the shift making all systems asymptotically stable [1/s]
+                tolerance (float): relative tolerance of the Hankel singular values defining the default order
+        """
+        parameter_names = list(parameter_grid.keys())
+        grid_values = [np.array(parameter_grid[name], dtype=float) for name in parameter_names]
+        grid_shape = tuple(len(values) for values in grid_values)
+        if len(list_systems) != int(np.prod(grid_shape)):
+            raise ValueError('{} systems given for a grid of {} points.'.format(len(list_systems),
+                                                                              int(np.prod(grid_shape))))
+        for name, values in zip(parameter_names, grid_values):
+            if np.any(np.diff(values) <= 0):
+                raise ValueError('Grid values of {} need to be ascending.'.format(name))
+        for A, B, C, D, dt in list_systems[1:]:
+            if B.shape[1] != list_systems[0][1].shape[1] or C.shape[0] != list_systems[0][2].shape[0]:
+                raise ValueError('Inputs and outputs of the linear systems differ between the grid points.')
+
+        continuous_systems = [discrete_to_continuous(*[to_dense(matrix) for matrix in [A, B, C, D]], dt)
+                              for A, B, C, D, dt in list_systems]
+        shift = get_stability_shift([system[0] for system in continuous_systems], shift_margin)
+        list_factors = [get_balanced_factors(A, B, C, shift=shift) for A, B, C, D in continuous_systems]
+        hsv = np.array([factors[0][:min(factors[0].shape[0] for factors in list_factors)]
+                        for factors in list_factors])
+        if order is None:
+            order = int(min(np.sum(factors[0] > tolerance * factors[0][0]) for factors in list_factors))
+
+        balanced_systems = []
+        for system, factors in zip(continuous_systems, list_factors):
+            balanced_system = balance_system(*system, factors, order)
+            if len(balanced_systems) > 0:
+                balanced_system = align_signs(*balanced_system, *balanced_systems[0][:3])
+            balanced_systems.append(balanced_system)
+
+        A, B, C, D = [np.array([system[i_matrix] for system in balanced_systems]).reshape(
+            grid_shape + balanced_systems[0][i_matrix].shape) for i_matrix in range(4)]
+        dt = np.array([system[4] for system in list_systems]).reshape(grid_shape)
+        return cls(parameter_names, grid_values, A, B, C, D, dt, hsv.reshape(grid_shape + (-1,)), shift)
+
+    @classmethod
+    def from_cases(cls, parameter_grid, list_cases, **kwargs):
+        """
+            Builds the parametric ROM from the linear systems saved by the cases of get_rom_grid_cases.
+        """
+        list_systems = [load_state_space(get_linear_system_file(output_route, case_name))
+                        for case_name, cases_route, output_route, case_parameters in list_cases]
+        return cls.from_systems(parameter_grid, list_systems, **kwargs)
+
+    def get_point(self, conditions):
+        try:
+            return np.array([conditions[name] for name in self.parameter_names], dtype=float)
+        except KeyError as error:
+            raise KeyError('Flight condition requires the parameters {}.'.format(self.parameter_names)) from error
+
+    def get_time_step_scaling(self, conditions=None):
+        # The time step of the linear systems is inversely proportional to the flight speed (constant CFL), so
+        # the product of both is interpolated if the flight speed is a grid parameter
+        if 'u_inf' not in self.parameter_names:
+            return 1.
+        if conditions is None:
+            return np.meshgrid(*self.grid_values, indexing='ij')[self.parameter_names.index('u_inf')]
+        return conditions['u_inf']
+
+    def get_continuous_system(self, **conditions):
+        """
+            Returns the interpolated continuous-time state space (A, B, C, D) at the given flight condition, e.g.
+            get_continuous_system(u_inf=42., rho=1.1).
+        """
+        matrix_entries = self.interpolator(self.get_point(conditions))[0]
+        system = []
+        i_entry = 0
+        for shape in self.matrix_shapes:
+            num_entries = int(np.prod(shape))
+            system.append(matrix_entries[i_entry:i_entry + num_entries].reshape(shape))
+            i_entry += num_entries
+        return tuple(system)
+
+    def get_time_step(self, **conditions):
+        """
+            Returns the time step of the linear system at the given flight condition (interpolated between the
+            grid points).
+        """
+        return float(self.dt_interpolator(self.get_point(conditions))[0] / self.get_time_step_scaling(conditions))
+
+    def get_system(self, dt=None, **conditions):
+        """
+            Returns the interpolated discrete-time state space at the given flight condition with time step dt (by
+            default the time step of the linear systems at this flight condition, see get_time_step).
+
+            Returns:
+                tuple: A, B, C, D, dt
+        """
+        if dt is None:
+            dt = self.get_time_step(**conditions)
+        return continuous_to_discrete(*self.get_continuous_system(**conditions), dt) + (dt,)
+
+    def get_eigenvalues(self, **conditions):
+        """
+            Returns the continuous-time eigenvalues of the interpolated system at the given flight condition,
+            sorted by descending real part.
+        """
+        eigenvalues = np.linalg.eigvals(self.get_continuous_system(**conditions)[0])
+        return eigenvalues[np.argsort(-eigenvalues.real)]
+
+    def save(self, file):
+        if os.path.dirname(file) != '' and not os.path.exists(os.path.dirname(file)):
+            os.makedirs(os.path.dirname(file))
+        with h5.File(file, 'w') as f:
+            f.attrs['parameter_names'] = json.dumps(self.parameter_names)
+            f.attrs['shift'] = self.shift
+            for name, values in zip(self.parameter_names, self.grid_values):
+                f.create_dataset('grid/' + name, data=values)
+            for name in ['A', 'B', 'C', 'D', 'dt', 'hsv']:
+                f.create_dataset(name, data=getattr(self, name))
+
+    @classmethod
+    def load(cls, file):
+        with h5.File(file, 'r') as f:
+            parameter_names = json.loads(f.attrs['parameter_names'])
+            return cls(parameter_names,
+                       [f['grid'][name][()] for name in parameter_names],
+                       *[f[name][()] for name in ['A', 'B', 'C', 'D', 'dt', 'hsv']],
+                       float(f.attrs['shift']))
@@ -0,0 +1,196 @@
+"""
+    Columnar results store of gust response simulations: a single HDF5 file containing
+        - cases/<column>: one 1D dataset per column with one entry per case, i.e. the case name, the case parameters
+          (scalar parameters, nested dictionaries such as the gust settings flattened to e.g. gust_settings.gust_length)
+          and peak/envelope statistics of the time history (see get_case_statistics),
+        - time_history/<case>: time history of a case (columns as in postprocess_gust_response.py, labels stored as
+          attribute).
+    Numeric and boolean columns are stored as float64 with NaN for cases without the entry, all other scalars as
+    strings. Envelope queries over many cases, e.g. the maximum root bending moment of all cases, are a single read
+    of the corresponding column (see read_case_table).
+"""
+
+import os
+import h5py as h5
+import numpy as np
+
+statistics_labels = ['max_OOP', 'min_OOP', 'max_abs_OOP', 'max_abs_MT', 'max_z', 'min_z', 'max_abs_tip_deflection',
+                     'time_max_abs_OOP']
+
+
+def get_case_statistics(data, labels, z_reference=None):
+    """
+        Returns the peak values of the root loads and tip deflection of a time history (array with the time in the
+        first column and the columns given by labels). The tip deflection is relative to z_reference, by default the
+        tip position at the first timestep.
+    """
+    statistics = dict.fromkeys(statistics_labels, np.nan)
+    if data.shape[0] == 0:
+        return statistics
+    oop = data[:, 1 + labels.index('OOP')]
+    mt = data[:, 1 + labels.index('MT')]
+    z = data[:, 1 + labels.index('z')]
+    if not np.all(np.isnan(oop)):
+        i_max_abs_oop = np.nanargmax(np.abs(oop))
+        statistics.update({'max_OOP': np.nanmax(oop),
+                           'min_OOP': np.nanmin(oop),
+                           'max_abs_OOP': np.abs(oop[i_max_abs_oop]),
+                           'time_max_abs_OOP': data[i_max_abs_oop, 0]})
+    if not np.all(np.isnan(mt)):
+        statistics['max_abs_MT'] = np.nanmax(np.abs(mt))
+    if not np.all(np.isnan(z)):
+        statistics.update({'max_z': np.nanmax(z),
+                           'min_z': np.nanmin(z),
+                           'max_abs_tip_deflection': np.nanmax(np.abs(z - (z[0] if z_reference is None else z_reference)))})
+    return statistics
+
+
+def get_case_columns(case_parameters, prefix=''):
+    """
+        Returns the scalar case parameters as flat dictionary of columns. Entries that are not scalar (e.g. lists of
+        postprocessors) or None are skipped.
+    """
+    columns = {}
+    for key, value in case_parameters.items():
+        if isinstance(value, dict):
+            columns.update(get_case_columns(value, prefix + key + '.'))
+        elif isinstance(value, (bool, int, float, str, np.generic)):
+            columns[prefix + key] = value
+    return columns
+
+
+def is_numeric(value):
+    return isinstance(value, (bool, int, float, np.number, np.bool_))
+
+
+def create_column(cases_group, column, value, n_cases):
+    if is_numeric(value):
+        return cases_group.create_dataset(column, shape=(n_cases,), maxshape=(None,), chunks=(1024,),
+                                          dtype=np.float64, fillvalue=np.nan)
+    return cases_group.create_dataset(column, shape=(n_cases,), maxshape=(None,), chunks=(1024,),
+                                      dtype=h5.string_dtype())
+
+
+def merge_case_statistics(statistics, new_statistics):
+    """
+        Returns the statistics of a time history from the statistics of its first part and of the following part
+        (e.g. new timesteps of a running simulation). The tip deflection of both parts needs to be relative to the
+        same reference (see get_case_statistics).
+    """
+    merged_statistics = dict(statistics)
+    for label in ['max_OOP', 'max_abs_MT', 'max_z', 'max_abs_tip_deflection']:
+        merged_statistics[label] = np.fmax(statistics[label], new_statistics[label])
+    for label in ['min_OOP', 'min_z']:
+        merged_statistics[label] = np.fmin(statistics[label], new_statistics[label])
+    if np.isnan(statistics['max_abs_OOP']) or new_statistics['max_abs_OOP'] > statistics['max_abs_OOP']:
+        merged_statistics['max_abs_OOP'] = new_statistics['max_abs_OOP']
+        merged_statistics['time_max_abs_OOP'] = new_statistics['time_max_abs_OOP']
+    return merged_statistics
+
+
+def open_store(store_file):
+    if os.path.dirname(store_file) != '' and not os.path.exists(os.path.dirname(store_file)):
+        os.makedirs(os.path.dirname(store_file))
+    f = h5.File(store_file, 'a')
+    f.require_group('time_history')
+    if 'case_name' not in f.require_group('cases'):
+        create_column(f['cases'], 'case_name', '', 0)
+    return f
+
+
+def get_case_indices(cases_group, list_case_names):
+    """
+        Returns the rows of the given cases in the case table. Rows are added for cases not in the table yet.
+    """
+    case_indices = {case_name.decode() if isinstance(case_name, bytes) else case_name: i_case
+                    for i_case, case_name in enumerate(cases_group['case_name'][()])}
+    n_cases = len(case_indices)
+    for case_name in list_case_names:
+        if case_name not in case_indices:
+            case_indices[case_name] = n_cases
+            n_cases += 1
+    for column in cases_group.values():
+        column.resize((n_cases,))
+    return case_indices
+
+
+def write_case_columns(cases_group, i_case, case_name, case_columns):
+    for column, value in dict(case_columns, case_name=case_name).items():
+        if column not in cases_group:
+            create_column(cases_group, column, value, cases_group['case_name'].shape[0])
+        cases_group[column][i_case] = float(value) if is_numeric(value) else str(value)
+
+
+def write_cases(store_file, list_case_results, labels):
+    """
+        Writes the results of several cases to the store, each given as (case name, case columns, time history),
+        where the case columns are e.g. the case parameters (see get_case_columns) and statistics. Cases already in
+        the store are overwritten.
+    """
+    with open_store(store_file) as f:
+        case_indices = get_case_indices(f['cases'], [case_result[0] for case_result in list_case_results])
+        time_history_group = f['time_history']
+        for case_name, case_columns, data in list_case_results:
+            write_case_columns(f['cases'], case_indices[case_name], case_name, case_columns)
+            if case_name in time_history_group:
+                del time_history_group[case_name]
+            time_history = time_history_group.create_dataset(case_name,
+                                                             data=data,
+                                                             maxshape=(None, data.shape[1]),
+                                                             chunks=(min(max(data.shape[0], 1), 1024), data.shape[1]))
+            time_history.attrs['labels'] = ['time'] + list(labels)
+
+
+def append_case_results(store_file, case_name, case_columns, data, labels):
+    """
+        Appends timesteps to the time history of a case (created if not in the store yet) and updates its case
+        columns, e.g. the statistics of a running simulation.
+    """
+    with open_store(store_file) as f:
+        case_indices = get_case_indices(f['cases'], [case_name])
+        write_case_columns(f['cases'], case_indices[case_name], case_name, case_columns)
+        time_history_group = f['time_history']
+        if case_name not in time_history_group:
+            time_history = time_history_group.create_dataset(case_name,
+                                                             shape=(0, data.shape[1]),
+                                                             maxshape=(None, data.shape[1]),
+                                                             chunks=(1024, data.shape[1]),
+                                                             dtype=np.float64)
+            time_history.attrs['labels'] = ['time'] + list(labels)
+        time_history = time_history_group[case_name]
+        n_rows = time_history.shape[0]
+        time_history.resize(n_rows + data.shape[0], axis=0)
+        time_history[n_rows:, :] = data
+
+
+def truncate_case_time_history(store_file, case_name, n_rows):
+    """
+        Removes all timesteps from n_rows on of the time history of a case, e.g. the timesteps recomputed by a
+        simulation restarted from a checkpoint. The case columns are not modified.
+    """
+    with open_store(store_file) as f:
+        if case_name in f['time_history'] and f['time_history'][case_name].shape[0] > n_rows:
+            f['time_history'][case_name].resize(n_rows, axis=0)
+
+
+def read_case_table(store_file, columns=None):
+    """
+        Returns the case table as dictionary column -> array with one entry per case. By default, all columns are
+        read.
+    """
+    with h5.File(store_file, 'r') as f:
+        cases_group = f['cases']
+        if columns is None:
+            columns = list(cases_group.keys())
+        case_table = {}
+        for column in columns:
+            if h5.check_string_dtype(cases_group[column].dtype) is not None:
+                case_table[column] = cases_group[column].asstr()[()]
+            else:
+                case_table[column] = cases_group[column][()]
+    return case_table
+
+
+def read_case_time_history(store_file, case_name):
+    with h5.File(store_file, 'r') as f:
+        return f['time_history'][case_name][()]
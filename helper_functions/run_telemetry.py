@@ -0,0 +1,256 @@
+"""
+    Run telemetry of the nonlinear dynamic simulations: the RunTelemetry postprocessor is run at each timestep of
+    DynamicCoupled and records the solver effort of each timestep, i.e.
+        - the wall time of the timestep (time between two calls of the postprocessor, including all postprocessors),
+        - the number of FSI substeps and whether the FSI iteration converged,
+        - the time spent in the aerodynamic (StepUvlm) and structural solver,
+        - the residual history (displacements, velocities and accelerations) of each FSI substep,
+    to <output_folder>/telemetry/<case>.telemetry.h5. The structural and aerodynamic solvers and the convergence
+    check of DynamicCoupled are wrapped when the postprocessor is initialised, so that SHARPy itself is unchanged.
+    Note that the Newton iterations of the structural solver are run within xbeam and are not accessible.
+
+    get_telemetry_summary evaluates the log, e.g. to tune the relaxation factor, FSI tolerance and Newmark damping
+    for throughput, and detects the timesteps where the FSI convergence stalls (e.g. during the gust peak loading),
+    see report_run_telemetry.py.
+
+    The postprocessor is registered with SHARPy when this module is imported.
+"""
+
+import os
+import time
+import h5py as h5
+import numpy as np
+import sharpy.utils.settings as settings_utils
+from sharpy.utils.solver_interface import solver, BaseSolver
+
+timestep_labels = ['time', 'ts', 'wall_time', 'n_substeps', 'converged', 'aero_time', 'structural_time',
+                   'residual', 'residual_dqdt', 'residual_dqddt']
+residual_labels = ['time', 'substep', 'residual', 'residual_dqdt', 'residual_dqddt']
+
+
+def get_telemetry_file(output_folder, case):
+    return os.path.join(output_folder, case, 'telemetry', case + '.telemetry.h5')
+
+
+def read_telemetry(file):
+    """
+        Returns the timestep and residual logs of a telemetry file as structured arrays with the fields
+        timestep_labels and residual_labels, respectively.
+    """
+    with h5.File(file, 'r', libver='latest', swmr=True) as f:
+        timesteps = f['timesteps'][()]
+        residuals = f['residuals'][()]
+    return (np.rec.fromarrays(timesteps.T, names=timestep_labels),
+            np.rec.fromarrays(residuals.T, names=residual_labels))
+
+
+def get_stall_windows(stalled, time):
+    # Contiguous windows (start time, end time, number of timesteps) of stalled timesteps
+    windows = []
+    i_stalled = np.flatnonzero(stalled)
+    for window in np.split(i_stalled, np.flatnonzero(np.diff(i_stalled) > 1) + 1):
+        if len(window) > 0:
+            windows.append((float(time[window[0]]), float(time[window[-1]]), len(window)))
+    return windows
+
+
+def get_telemetry_summary(file, stall_factor=3.):
+    """
+        Summarises the telemetry of a run. A timestep is considered stalled if the FSI iteration did not converge or
+        required more than stall_factor times the median number of substeps.
+
+        Returns:
+            dict: summary with the number of timesteps, total and mean wall time, fractions of the wall time spent in
+                  the aerodynamic and structural solver, statistics of the number of substeps, number of unconverged
+                  timesteps and the stalled timesteps as windows (start time, end time, number of timesteps)
+    """
+    timesteps, _ = read_telemetry(file)
+    n_substeps = timesteps.n_substeps
+    stall_threshold = stall_factor * max(np.median(n_substeps), 1.)
+    stalled = (timesteps.converged == 0) | (n_substeps > stall_threshold)
+    total_wall_time = float(np.sum(timesteps.wall_time))
+    return {'n_timesteps': len(timesteps),
+            'total_wall_time': total_wall_time,
+            'mean_wall_time': float(np.mean(timesteps.wall_time)),
+            'aero_fraction': float(np.sum(timesteps.aero_time)) / total_wall_time,
+            'structural_fraction': float(np.sum(timesteps.structural_time)) / total_wall_time,
+            'mean_substeps': float(np.mean(n_substeps)),
+            'median_substeps': float(np.median(n_substeps)),
+            'max_substeps': int(np.max(n_substeps)),
+            'n_unconverged': int(np.sum(timesteps.converged == 0)),
+            'stall_threshold': float(stall_threshold),
+            'stalled_wall_time': float(np.sum(timesteps.wall_time[stalled])),
+            'stall_windows': get_stall_windows(stalled, timesteps.time)}
+
+
+def format_telemetry_summary(summary):
+    lines = ['Timesteps: {}, wall time: {:.1f} s ({:.3f} s per timestep, aero {:.0f} %, structure {:.0f} %)'.format(
+                 summary['n_timesteps'], summary['total_wall_time'], summary['mean_wall_time'],
+                 100 * summary['aero_fraction'], 100 * summary['structural_fraction']),
+             'FSI substeps: mean {:.1f}, median {:.0f}, max {}, unconverged timesteps: {}'.format(
+                 summary['mean_substeps'], summary['median_substeps'], summary['max_substeps'],
+                 summary['n_unconverged'])]
+    if len(summary['stall_windows']) == 0:
+        lines.append('No stalled timesteps (more than {:.0f} substeps or unconverged).'.format(
+            summary['stall_threshold']))
+    else:
+        lines.append('Stalled timesteps (more than {:.0f} substeps or unconverged), {:.1f} s wall time:'.format(
+            summary['stall_threshold'], summary['stalled_wall_time']))
+        for start_time, end_time, n_timesteps in summary['stall_windows']:
+            lines.append('    t = {:.4f} s to {:.4f} s ({} timesteps)'.format(start_time, end_time, n_timesteps))
+    return '\n'.join(lines)
+
+
+@solver
+class RunTelemetry(BaseSolver):
+    """
+        Records the wall time, FSI substeps, solver times and residual history of each timestep of DynamicCoupled.
+    """
+    solver_id = 'RunTelemetry'
+    solver_classification = 'postprocessor'
+
+    settings_types = dict()
+    settings_default = dict()
+    settings_description = dict()
+
+    settings_types['buffer_size'] = 'int'
+    settings_default['buffer_size'] = 100
+    settings_description['buffer_size'] = 'Number of timesteps buffered in memory before being written to disk'
+
+    settings_types['time_offset'] = 'float'
+    settings_default['time_offset'] = 0.
+    settings_description['time_offset'] = 'Physical time minus timestep index * dt (non-zero for the segments of a time step schedule)'
+
+    def __init__(self):
+        self.settings = None
+        self.data = None
+        self.caller = None
+        self.file = None
+        self.buffer = None
+        self.i_buffer = 0
+        self.residual_buffer = []
+        self.substeps = None
+        self.last_time = None
+
+    def initialise(self, data, custom_settings=None, caller=None, restart=False):
+        self.data = data
+        if custom_settings is None:
+            self.settings = data.settings[self.solver_id]
+        else:
+            self.settings = custom_settings
+        settings_utils.to_custom_types(self.settings, self.settings_types, self.settings_default)
+        self.caller = caller
+        self.buffer = np.zeros((self.settings['buffer_size'], len(timestep_labels)))
+        self.i_buffer = 0
+        self.residual_buffer = []
+        self.reset_timestep()
+
+        folder = os.path.join(self.data.output_folder, 'telemetry')
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.file = h5.File(os.path.join(folder, self.data.settings['SHARPy']['case'] + '.telemetry.h5'),
+                            'a' if restart else 'w',
+                            libver='latest')
+        for name, labels in [('timesteps', timestep_labels), ('residuals', residual_labels)]:
+            if name not in self.file:
+                self.file.create_dataset(name,
+                                         shape=(0, len(labels)),
+                                         maxshape=(None, len(labels)),
+                                         chunks=(self.settings['buffer_size'], len(labels)),
+                                         dtype=np.float64)
+                self.file[name].attrs['labels'] = labels
+            elif restart:
+                # Drop the telemetry recorded after the timestep the simulation is restarted from (see
+                # channel_monitor.py)
+                dt = self.caller.settings['dt']
+                restart_time = self.settings['time_offset'] + (len(self.data.structure.timestep_info) - 1) * dt
+                time_column = self.file[name][:, 0]
+                self.file[name].resize(int(np.sum(time_column <= restart_time + 1e-6 * dt)), axis=0)
+        self.file.swmr_mode = True
+
+        if caller is not None:
+            self.instrument_solvers()
+        self.last_time = time.perf_counter()
+
+    def reset_timestep(self):
+        self.substeps = {'n_substeps': 0, 'converged': False, 'aero_time': 0., 'structural_time': 0.,
+                         'residuals': []}
+
+    def instrument_solvers(self):
+        """
+            Wraps the aerodynamic and structural solver and the FSI convergence check of the calling DynamicCoupled
+            instance to record the solver times and substeps.
+        """
+        for solver_name, time_key in [('aero_solver', 'aero_time'), ('structural_solver', 'structural_time')]:
+            coupled_solver = getattr(self.caller, solver_name, None)
+            if coupled_solver is not None:
+                coupled_solver.run = self.get_timed_run(coupled_solver.run, time_key)
+        if hasattr(self.caller, 'convergence'):
+            self.caller.convergence = self.get_recorded_convergence(self.caller.convergence)
+
+    def get_timed_run(self, run, time_key):
+        def timed_run(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return run(*args, **kwargs)
+            finally:
+                self.substeps[time_key] += time.perf_counter() - start_time
+        return timed_run
+
+    def get_recorded_convergence(self, convergence):
+        def recorded_convergence(*args, **kwargs):
+            converged = convergence(*args, **kwargs)
+            self.substeps['residuals'].append([getattr(self.caller, 'res', np.nan),
+                                               getattr(self.caller, 'res_dqdt', np.nan),
+                                               getattr(self.caller, 'res_dqddt', np.nan)])
+            self.substeps['n_substeps'] += 1
+            self.substeps['converged'] |= bool(converged)
+            return converged
+        return recorded_convergence
+
+    def write_buffer(self):
+        if self.i_buffer == 0:
+            return
+        for name, rows in [('timesteps', self.buffer[:self.i_buffer, :]),
+                           ('residuals', np.array(self.residual_buffer).reshape(-1, len(residual_labels)))]:
+            dataset = self.file[name]
+            n_rows = dataset.shape[0]
+            dataset.resize(n_rows + rows.shape[0], axis=0)
+            dataset[n_rows:, :] = rows
+            dataset.flush()
+        self.i_buffer = 0
+        self.residual_buffer = []
+
+    def run(self, **kwargs):
+        online = settings_utils.set_value_or_default(kwargs, 'online', False)
+        if not online:
+            return self.data
+
+        current_time = time.perf_counter()
+        time_step = self.settings['time_offset'] + self.data.ts * self.caller.settings['dt']
+        residuals = self.substeps['residuals']
+        last_residuals = residuals[-1] if len(residuals) > 0 else [np.nan] * 3
+        self.buffer[self.i_buffer, :] = [time_step,
+                                         self.data.ts,
+                                         current_time - self.last_time,
+                                         self.substeps['n_substeps'],
+                                         self.substeps['converged'],
+                                         self.substeps['aero_time'],
+                                         self.substeps['structural_time']] + list(last_residuals)
+        self.residual_buffer.extend([[time_step, i_substep] + list(residual)
+                                     for i_substep, residual in enumerate(residuals)])
+        self.i_buffer += 1
+        self.reset_timestep()
+
+        last_timestep = self.data.ts >= self.caller.settings['n_time_steps']
+        if self.i_buffer == self.buffer.shape[0] or last_timestep:
+            self.write_buffer()
+        if last_timestep:
+            self.finalise()
+        self.last_time = time.perf_counter()
+        return self.data
+
+    def finalise(self):
+        if self.file is not None and self.file.id.valid:
+            self.write_buffer()
+            self.file.close()
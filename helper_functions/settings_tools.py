@@ -0,0 +1,196 @@
+"""
+    Tools to handle SHARPy settings dictionaries, as returned by get_settings, across many cases:
+
+    - FrozenSettings: immutable and hashable version of a settings dictionary. New cases are derived from a
+      base case with overrides, which only copies the solver blocks that change.
+    - settings_fingerprint: hash of the settings of a case, ignoring case-specific entries such as the case
+      name and routes, to detect identical cases before running any solver.
+    - diff_settings: structural difference between the settings of two cases.
+    - get_frozen_settings: memoized get_settings.
+"""
+
+import copy
+import hashlib
+import json
+from collections.abc import Mapping
+import numpy as np
+
+# Entries of the SHARPy block that differ between otherwise identical cases
+case_specific_entries = ['case', 'route', 'log_folder', 'log_file']
+
+
+def copy_settings(settings):
+    """
+        Returns a copy of a (nested) settings dictionary in which no sub-dictionary, list or array is shared,
+        neither with the original nor between different entries (e.g. settings['NonLinearStatic'] and the
+        structural solver settings of settings['StaticCoupled']).
+    """
+    if isinstance(settings, Mapping):
+        return {key: copy_settings(value) for key, value in settings.items()}
+    if isinstance(settings, (list, tuple)):
+        return [copy_settings(value) for value in settings]
+    return copy.copy(settings)
+
+
+def get_canonical_settings(settings):
+    """
+        Returns a JSON serialisable representation of the settings with sorted keys and numpy types converted to
+        Python types.
+    """
+    if isinstance(settings, Mapping):
+        return {str(key): get_canonical_settings(settings[key]) for key in sorted(settings.keys(), key=str)}
+    if isinstance(settings, (list, tuple)):
+        return [get_canonical_settings(value) for value in settings]
+    if isinstance(settings, np.ndarray):
+        return get_canonical_settings(settings.tolist())
+    if isinstance(settings, np.generic):
+        return settings.item()
+    if isinstance(settings, (bool, int, float, str)) or settings is None:
+        return settings
+    return str(settings)
+
+
+def get_fingerprint(value):
+    return hashlib.sha1(json.dumps(get_canonical_settings(value), sort_keys=True).encode()).hexdigest()
+
+
+def settings_fingerprint(settings, ignore_case_specific=True):
+    """
+        Returns a hash of the settings. By default, the case name, route and log entries of the SHARPy block
+        are ignored, so that identical simulations of cases with different names have the same fingerprint.
+    """
+    settings = dict(settings)
+    if ignore_case_specific and 'SHARPy' in settings:
+        settings['SHARPy'] = {key: value for key, value in settings['SHARPy'].items()
+                              if key not in case_specific_entries}
+    return get_fingerprint(settings)
+
+
+def diff_settings(settings_a, settings_b, path=()):
+    """
+        Returns the differences between two settings dictionaries as dict: path (tuple of keys) -> (value a,
+        value b). Entries that only exist in one of the dictionaries are returned with None for the other.
+    """
+    differences = {}
+    for key in list(settings_a.keys()) + [key for key in settings_b.keys() if key not in settings_a]:
+        value_a = settings_a.get(key)
+        value_b = settings_b.get(key)
+        if isinstance(value_a, Mapping) and isinstance(value_b, Mapping):
+            differences.update(diff_settings(value_a, value_b, path + (key,)))
+        elif get_canonical_settings(value_a) != get_canonical_settings(value_b) or (key in settings_a) != (key in settings_b):
+            differences[path + (key,)] = (value_a, value_b)
+    return differences
+
+
+def freeze_value(value):
+    if isinstance(value, FrozenSettings):
+        return value
+    if isinstance(value, Mapping):
+        return FrozenSettings(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_value(item) for item in value)
+    if isinstance(value, np.ndarray):
+        value = value.copy()
+        value.flags.writeable = False
+        return value
+    return value
+
+
+def thaw_value(value):
+    if isinstance(value, FrozenSettings):
+        return value.thaw()
+    if isinstance(value, tuple):
+        return [thaw_value(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    return value
+
+
+class FrozenSettings(Mapping):
+    """
+        Immutable, hashable settings dictionary. Blocks are shared between settings derived from each other,
+        which is safe as none of them can be modified. Use thaw() to obtain a plain dictionary, e.g. to pass the
+        settings to flexop_model.create_settings().
+    """
+    def __init__(self, settings):
+        self._settings = {key: freeze_value(value) for key, value in settings.items()}
+        self._fingerprint = None
+
+    def __getitem__(self, key):
+        return self._settings[key]
+
+    def __iter__(self):
+        return iter(self._settings)
+
+    def __len__(self):
+        return len(self._settings)
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenSettings):
+            return self.fingerprint == other.fingerprint
+        return NotImplemented
+
+    def __repr__(self):
+        return 'FrozenSettings({})'.format(self.fingerprint[:10])
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = settings_fingerprint(self, ignore_case_specific=False)
+        return self._fingerprint
+
+    def derive(self, overrides):
+        """
+            Returns new settings with the (nested) overrides applied, e.g.
+            settings.derive({'StepUvlm': {'velocity_field_input': {'offset': 2.}}}). Only the blocks containing
+            overrides are rebuilt, all other blocks are shared with these settings. Note that solver settings
+            embedded in other blocks (e.g. the aero_solver_settings of DynamicCoupled) are independent copies
+            and need to be overridden where they are used.
+        """
+        derived_settings = dict(self._settings)
+        for key, value in overrides.items():
+            if isinstance(value, Mapping) and isinstance(self._settings.get(key), FrozenSettings):
+                derived_settings[key] = self._settings[key].derive(value)
+            else:
+                derived_settings[key] = freeze_value(value)
+        return FrozenSettings(derived_settings)
+
+    def thaw(self):
+        return {key: thaw_value(value) for key, value in self._settings.items()}
+
+
+# Memoized settings (see get_frozen_settings)
+frozen_settings_cache = {}
+max_frozen_settings_cache_size = 256
+
+
+def get_case_specific_settings(flexop_model):
+    # Entries of the SHARPy block that differ between otherwise identical cases (see case_specific_entries)
+    return {'case': flexop_model.case_name,
+            'route': flexop_model.case_route,
+            'log_folder': flexop_model.output_route,
+            'log_file': flexop_model.case_name + '.log'}
+
+
+def get_frozen_settings(flexop_model, flow, dt, **kwargs):
+    """
+        Memoized version of get_settings returning FrozenSettings. The settings are only regenerated if the
+        model properties used by get_settings, the flow, the time step or any keyword argument changes, so that
+        the cases of a sweep that only differ in their names and routes share all solver blocks and only the
+        case-specific entries of the SHARPy block are derived for each case.
+    """
+    from helper_functions.get_settings import get_settings
+
+    key = get_fingerprint({'m': flexop_model.aero.m,
+                           'n_control_surfaces': flexop_model.aero.n_control_surfaces,
+                           'flow': flow,
+                           'dt': dt,
+                           'kwargs': kwargs})
+    if key not in frozen_settings_cache:
+        if len(frozen_settings_cache) >= max_frozen_settings_cache_size:
+            frozen_settings_cache.pop(next(iter(frozen_settings_cache)))
+        frozen_settings_cache[key] = FrozenSettings(get_settings(flexop_model, flow, dt, **kwargs))
+    return frozen_settings_cache[key].derive({'SHARPy': get_case_specific_settings(flexop_model)})
@@ -0,0 +1,426 @@
+"""
+    Builds a single nonlinear gust response case of the (Super)Flexop from a dictionary of case parameters,
+    i.e. steps 6) to 11) of run_nonlinear_simulation.py. The keys of the parameter dictionary match the names
+    of the main parameters defined in run_nonlinear_simulation.py.
+"""
+
+import copy
+import os
+import flexop as aircraft
+import helper_functions.channel_monitor # registers the ChannelMonitor postprocessor with SHARPy
+import helper_functions.run_telemetry # registers the RunTelemetry postprocessor with SHARPy
+from helper_functions.checkpoint import find_latest_checkpoint, remove_checkpoints # registers the Checkpoint postprocessor with SHARPy
+from helper_functions.control_surface_input import convert_csv_inputs # registers the MultiChannelControlSurface generator with SHARPy
+from helper_functions.mesh_convergence import apply_discretisation_settings
+from helper_functions.model_cache import get_model_key, link_cached_model, store_model
+from helper_functions.settings_tools import get_frozen_settings
+from helper_functions.snapshot import (get_snapshot_file, get_snapshot_key, get_snapshot_lock, get_static_flow,
+                                       find_pickle_file, prepare_restart_file, run_sharpy)
+from helper_functions.turbulence_field import get_turbulence_file # registers the TurbulenceField gust with SHARPy
+from helper_functions.time_step_schedule import (default_schedule_settings, get_gust_window, get_time_offset,
+                                                 get_time_step_schedule, write_schedule)
+from helper_functions.trim_cache import apply_trim_cache, read_trim_results, store_trim
+from helper_functions.wake_convergence import apply_wake_settings
+
+
+def get_case_parameters(base_parameters, **overrides):
+    """
+        Returns a deep copy of the base case parameters with the given overrides applied. Gust parameters
+        (e.g. gust_length, gust_intensity) are written into the nested gust settings.
+    """
+    case_parameters = copy.deepcopy(base_parameters)
+    for key, value in overrides.items():
+        if key in case_parameters:
+            case_parameters[key] = copy.deepcopy(value)
+        elif key.startswith('gust_'):
+            case_parameters['gust_settings'][key] = value
+        else:
+            raise KeyError('Unknown case parameter {}.'.format(key))
+    return case_parameters
+
+
+def get_flow(use_trim):
+    flow = ['BeamLoader',
+            'AerogridLoader',
+            'StaticCoupled',
+            'StaticTrim',
+            'BeamLoads',
+            'BeamPlot',
+            'AerogridPlot',
+            'AeroForcesCalculator',
+            'DynamicCoupled',
+    ]
+    if use_trim:
+        flow.remove('StaticCoupled')
+    else:
+        flow.remove('StaticTrim')
+    return flow
+
+
+def get_time_step(flexop_model, case_parameters):
+    return case_parameters['CFL'] * flexop_model.aero.chord_main_root / flexop_model.aero.m / case_parameters['u_inf']
+
+
+def init_flexop_model(case_name, cases_route, output_route, case_parameters, clean=True):
+    # Without clean, existing input files of the case are kept, e.g. to only evaluate the settings of the case
+    flexop_model = aircraft.FLEXOP(case_name, cases_route, output_route)
+    if clean:
+        for route in [cases_route, output_route]:
+            if not os.path.exists(route):
+                os.makedirs(route)
+        flexop_model.clean()
+    structure_kwargs = {}
+    if case_parameters.get('n_elem_multiplier_tail') is not None:
+        structure_kwargs['n_elem_multiplier_tail'] = case_parameters['n_elem_multiplier_tail']
+    flexop_model.init_structure(sigma=case_parameters['factor_material_stiffness'],
+                                n_elem_multiplier=case_parameters['n_elem_multiplier'],
+                                n_elem_multiplier_fuselage=case_parameters['n_elem_multiplier_fuselage'],
+                                lifting_only=case_parameters['lifting_only'],
+                                wing_only=case_parameters['wing_only'],
+                                **structure_kwargs)
+    flexop_model.init_aero(m=case_parameters['num_chord_panels'],
+                           cs_deflection=case_parameters['cs_deflection'],
+                           ailerons_type=case_parameters['ailerons_type'])
+    flexop_model.structure.set_thrust(case_parameters['thrust'])
+    return flexop_model
+
+
+def get_gust_settings(flexop_model, case_parameters, write_files=True):
+    gust_settings = copy.deepcopy(case_parameters['gust_settings'])
+    dt = get_time_step(flexop_model, case_parameters)
+    # Gust encounters starts 10 ts after simulation start
+    gust_settings['gust_offset'] = 10 * dt * case_parameters['u_inf']
+    if gust_settings['gust_shape'] == 'turbulence field':
+        # Turbulence field with the resolution of the time step (generated if not in the store yet) and the window
+        # passed within the simulation time
+        turbulence_route = case_parameters.get('turbulence_route')
+        if turbulence_route is None:
+            turbulence_route = os.path.join(flexop_model.output_route, 'turbulence_fields') + '/'
+        gust_settings['file'] = get_turbulence_file(turbulence_route,
+                                                    gust_settings['gust_model'],
+                                                    gust_settings['gust_altitude'],
+                                                    gust_settings['gust_seed'],
+                                                    dt * case_parameters['u_inf'],
+                                                    gust_settings['gust_record_length'],
+                                                    generate=write_files)
+        gust_settings['window_start'] = gust_settings.get('gust_record_start', 0.)
+        gust_settings['window_length'] = case_parameters['simulation_time'] * case_parameters['u_inf']
+    return gust_settings
+
+
+def get_case_settings(flexop_model, case_parameters, flow=None, segment=None, write_files=True):
+    """
+        Returns the SHARPy settings of a case as FrozenSettings (see helper_functions/settings_tools.py), which are
+        shared with all other cases of the sweep with the same settings apart from the case name and routes. If a
+        segment of a time step schedule is given (see helper_functions/time_step_schedule.py), the dynamic
+        simulation runs with the time step of the segment until the end of the segment. Without write_files, input
+        files referenced by the settings (turbulence field, binary control surface input) are not generated.
+    """
+    # Parameters dependent on the model geometry and discretisation
+    u_inf = case_parameters['u_inf']
+    gust_settings = get_gust_settings(flexop_model, case_parameters, write_files=write_files)
+    if segment is None:
+        dt = get_time_step(flexop_model, case_parameters)
+        number_timesteps = int(case_parameters['simulation_time'] / dt)
+        time_offset = 0.
+    else:
+        dt = segment['dt']
+        number_timesteps = segment['end_step']
+        time_offset = get_time_offset(segment)
+        if not case_parameters['free_flight']:
+            # With relative motion, SHARPy evaluates the gust at timestep index * dt, so the gust is shifted by the
+            # difference to the physical time
+            gust_settings['gust_offset'] -= u_inf * time_offset
+
+    # Binary control surface input converted from the CSV input files if not available yet
+    cs_input_file = case_parameters.get('cs_input_file')
+    if (write_files and case_parameters['dynamic_cs_input'] and cs_input_file is not None
+            and not os.path.isfile(cs_input_file)):
+        convert_csv_inputs(case_parameters['dict_predefined_cs_input_files'],
+                           get_time_step(flexop_model, case_parameters),
+                           flexop_model.aero.n_control_surfaces,
+                           cs_input_file)
+
+    # Define SHARPy flow
+    if flow is None:
+        flow = get_flow(case_parameters['use_trim'])
+
+    # Get settings dict
+    return get_frozen_settings(flexop_model,
+                               flow,
+                               dt,
+                               gust=case_parameters['use_gust'],
+                               gust_settings=gust_settings,
+                               alpha=case_parameters['alpha'],
+                               cs_deflection=case_parameters['cs_deflection'],
+                               # Initial elevator deflection of StaticTrim, e.g. from the trim cache (see
+                               # helper_functions/trim_cache.py)
+                               cs_deflection_initial=case_parameters['cs_deflection'] if case_parameters['use_trim'] else 0.,
+                               u_inf=u_inf,
+                               rho=case_parameters['rho'],
+                               thrust=case_parameters['thrust'],
+                               gravity=case_parameters['gravity'],
+                               horseshoe=case_parameters['horseshoe'],
+                               wake_length=case_parameters['wake_length'],
+                               variable_wake=case_parameters['wake_discretisation'],
+                               free_flight=case_parameters['free_flight'],
+                               num_cores=case_parameters['num_cores'],
+                               tolerance=case_parameters['tolerance'],
+                               fsi_tolerance=case_parameters['fsi_tolerance'],
+                               structural_relaxation_factor=case_parameters['structural_relaxation_factor'],
+                               newmark_damp=case_parameters['newmark_damp'],
+                               n_tstep=number_timesteps,
+                               postprocessor_each_timestep=list(case_parameters['postprocessor_each_timestep']),
+                               monitor_channels=case_parameters.get('monitor_channels'),
+                               full_dump_stride=case_parameters.get('full_dump_stride', 0),
+                               telemetry=case_parameters.get('telemetry', False),
+                               checkpoint_interval=case_parameters.get('checkpoint_interval', 0),
+                               checkpoint_num_stored_timesteps=case_parameters.get('checkpoint_num_stored_timesteps', 2),
+                               time_offset=time_offset,
+                               dynamic_cs_input=case_parameters['dynamic_cs_input'],
+                               dict_predefined_cs_input_files=case_parameters['dict_predefined_cs_input_files'],
+                               cs_input_file=cs_input_file,
+                               )
+
+
+def get_frozen_case_settings(case):
+    """
+        Returns the settings of a campaign case (case name, case route, output route, case parameters) as run by
+        run_flexop_case, without writing any file of the case, e.g. to detect identical cases of a campaign.
+    """
+    case_name, cases_route, output_route, case_parameters = case
+    case_parameters = get_recommended_settings(case_parameters)
+    flexop_model = init_flexop_model(case_name, cases_route, output_route, case_parameters, clean=False)
+    return get_case_settings(flexop_model, case_parameters, write_files=False)
+
+
+def generate_flexop_case(case_name, cases_route, output_route, case_parameters, flow=None, write_model_files=True,
+                         segment=None):
+    """
+        Initialises the aircraft model, writes all SHARPy input files of the case and returns the model
+        ready to be run with flexop_model.run(). By default, the flow is defined by get_flow.
+    """
+    flexop_model = init_flexop_model(case_name, cases_route, output_route, case_parameters)
+    settings = get_case_settings(flexop_model, case_parameters, flow=flow, segment=segment)
+
+    # Generate all required input files for a SHARPy simulation (model files are linked from the model cache if
+    # available)
+    if write_model_files:
+        model_cache_route = case_parameters.get('model_cache_route')
+        if model_cache_route is None:
+            flexop_model.generate()
+        else:
+            model_key = get_model_key(case_parameters)
+            if not link_cached_model(model_cache_route, model_key, cases_route, case_name):
+                flexop_model.generate()
+                store_model(model_cache_route, model_key, cases_route, case_name)
+    flexop_model.structure.calculate_aircraft_mass()
+    flexop_model.create_settings(settings.thaw())
+    return flexop_model
+
+
+def create_snapshot(snapshot_route, case_parameters):
+    """
+        Runs the static phase of the flow of a case (see get_static_flow) and stores the pickled SHARPy data as
+        snapshot, unless the snapshot already exists.
+
+        Returns:
+            str: snapshot file
+    """
+    snapshot_file = get_snapshot_file(snapshot_route, case_parameters)
+    lock = get_snapshot_lock(snapshot_route, case_parameters)
+    try:
+        if not os.path.isfile(snapshot_file):
+            snapshot_case_name = 'snapshot_' + get_snapshot_key(case_parameters)[:12]
+            snapshot_case_route = os.path.join(snapshot_route, snapshot_case_name) + '/'
+            static_case_parameters = copy.deepcopy(case_parameters)
+            static_case_parameters['snapshot_route'] = None
+            static_case_parameters['time_step_schedule'] = None
+            run_flexop_case(snapshot_case_name,
+                            snapshot_case_route,
+                            snapshot_case_route,
+                            static_case_parameters,
+                            flow=get_static_flow(get_flow(case_parameters['use_trim'])))
+            os.replace(find_pickle_file(snapshot_case_route, snapshot_case_name), snapshot_file)
+    finally:
+        lock.close()
+    return snapshot_file
+
+
+def get_case_schedule(flexop_model, case_parameters):
+    """
+        Returns the time step schedule of a case based on the case parameter time_step_schedule (see
+        helper_functions/time_step_schedule.py). The fine time step is the time step of the case.
+    """
+    schedule_settings = dict(default_schedule_settings)
+    schedule_settings.update(case_parameters['time_step_schedule'])
+    fine_window = schedule_settings['fine_window']
+    if fine_window is None:
+        fine_window = get_gust_window(get_gust_settings(flexop_model, case_parameters), case_parameters['u_inf'])
+    return get_time_step_schedule(get_time_step(flexop_model, case_parameters),
+                                  case_parameters['simulation_time'],
+                                  fine_window,
+                                  coarse_factor=schedule_settings['coarse_factor'],
+                                  margin=schedule_settings['margin'])
+
+
+def run_scheduled_case(case_name, cases_route, output_route, case_parameters, restart_source_file=None,
+                       restart_ts=0):
+    """
+        Runs a case with a time step schedule. The static phase of the flow is run once as snapshot (see
+        create_snapshot) and each segment of the schedule is run as DynamicCoupled simulation restarted from the
+        SHARPy data pickled at the end of the previous segment. The schedule is written to the output route, so
+        that the physical time of each timestep can be recovered in the postprocessing.
+
+        If a restart source file is given (e.g. a checkpoint at timestep restart_ts), the case is continued from it
+        and segments finished before restart_ts are skipped.
+
+        Control surface inputs from CSV files (dynamic_cs_input without cs_input_file) are given per timestep of the
+        fine time step, so they are converted to a binary input file of the case first, which is evaluated at the
+        physical time of each timestep (see helper_functions/control_surface_input.py).
+    """
+    # The wake is convected with the time step of each segment, which requires the variable wake discretisation
+    case_parameters = get_case_parameters(case_parameters, wake_discretisation=True)
+    if case_parameters['dynamic_cs_input'] and case_parameters.get('cs_input_file') is None:
+        cs_input_file = os.path.join(cases_route, case_name + '.cs_input.npy')
+        if restart_source_file is None and os.path.isfile(cs_input_file):
+            # Converted again from the current CSV files (see get_case_settings)
+            os.remove(cs_input_file)
+        case_parameters = dict(case_parameters, cs_input_file=cs_input_file)
+    if restart_source_file is None:
+        snapshot_route = case_parameters.get('snapshot_route')
+        if snapshot_route is None:
+            snapshot_route = os.path.join(output_route, 'snapshots') + '/'
+        restart_source_file = create_snapshot(snapshot_route, case_parameters)
+
+    flexop_model = init_flexop_model(case_name, cases_route, output_route, case_parameters)
+    schedule = get_case_schedule(flexop_model, case_parameters)
+    write_schedule(output_route, case_name, schedule)
+    restart_file = os.path.join(cases_route, case_name + '.restart.pkl')
+    for segment in [segment for segment in schedule if segment['end_step'] > restart_ts]:
+        flexop_model = generate_flexop_case(case_name,
+                                            cases_route,
+                                            output_route,
+                                            case_parameters,
+                                            flow=['DynamicCoupled', 'PickleData'],
+                                            write_model_files=False,
+                                            segment=segment)
+        prepare_restart_file(restart_source_file, restart_file, output_route, case_name)
+        run_sharpy(cases_route, case_name, restart_file=restart_file)
+        restart_source_file = find_pickle_file(output_route, case_name)
+    os.remove(restart_file)
+    return flexop_model
+
+
+def get_recommended_settings(case_parameters):
+    """
+        Applies the recommended discretisation (case parameter discretisation_settings_file, see
+        helper_functions/mesh_convergence.py) and afterwards the recommended wake setting (case parameter
+        wake_settings_file, see helper_functions/wake_convergence.py) of the configuration of the case.
+    """
+    discretisation_settings_file = case_parameters.get('discretisation_settings_file')
+    if discretisation_settings_file is not None:
+        case_parameters, discretisation_found = apply_discretisation_settings(discretisation_settings_file,
+                                                                              case_parameters)
+        if not discretisation_found:
+            print('No recommended discretisation for the configuration, using {} chordwise panels.'.format(
+                case_parameters['num_chord_panels']))
+    wake_settings_file = case_parameters.get('wake_settings_file')
+    if wake_settings_file is not None:
+        case_parameters, wake_settings_found = apply_wake_settings(wake_settings_file, case_parameters)
+        if not wake_settings_found:
+            print('No recommended wake setting for the configuration, using wake length {}.'.format(
+                case_parameters['wake_length']))
+    return case_parameters
+
+
+def run_flexop_case(case_name, cases_route, output_route, case_parameters, flow=None):
+    """
+        Generates and runs a case.
+
+        If a trim cache file is specified (case parameter trim_cache_file), the trim state is taken from the cache
+        or, if not cached yet, computed with StaticTrim and stored afterwards.
+
+        If a snapshot route is specified (case parameter snapshot_route), the static phase of the flow is only run
+        once for all cases sharing the same static solution and the case starts with DynamicCoupled from the
+        snapshot of the converged static state.
+
+        If a time step schedule is specified (case parameter time_step_schedule), the case is run with a fine time
+        step during the gust encounter and a coarser time step elsewhere (see run_scheduled_case).
+
+        If a discretisation or wake settings file is specified (case parameters discretisation_settings_file and
+        wake_settings_file), the case uses the converged discretisation and wake length recommended for its
+        configuration (see get_recommended_settings).
+    """
+    case_parameters = get_recommended_settings(case_parameters)
+    trim_cache_file = case_parameters.get('trim_cache_file')
+    if trim_cache_file is not None:
+        case_parameters, trim_cache_hit = apply_trim_cache(trim_cache_file, case_parameters)
+    # Checkpoints of a previous run of the case are outdated
+    remove_checkpoints(output_route, case_name)
+
+    if case_parameters.get('time_step_schedule') is not None:
+        return run_scheduled_case(case_name, cases_route, output_route, case_parameters)
+
+    snapshot_route = case_parameters.get('snapshot_route')
+    if snapshot_route is not None:
+        snapshot_file = create_snapshot(snapshot_route, case_parameters)
+        flexop_model = generate_flexop_case(case_name,
+                                            cases_route,
+                                            output_route,
+                                            case_parameters,
+                                            flow=['DynamicCoupled'],
+                                            write_model_files=False)
+        restart_file = prepare_restart_file(snapshot_file,
+                                            os.path.join(cases_route, case_name + '.restart.pkl'),
+                                            output_route,
+                                            case_name)
+        run_sharpy(cases_route, case_name, restart_file=restart_file)
+        os.remove(restart_file)
+        return flexop_model
+
+    flexop_model = generate_flexop_case(case_name, cases_route, output_route, case_parameters, flow=flow)
+    flexop_model.run()
+
+    if trim_cache_file is not None and not trim_cache_hit:
+        store_trim(trim_cache_file, case_parameters, read_trim_results(output_route, case_name))
+    return flexop_model
+
+
+def resume_flexop_case(case_name, cases_route, output_route, case_parameters):
+    """
+        Resumes a case from its latest checkpoint (written if the case parameter checkpoint_interval is set, see
+        helper_functions/checkpoint.py), e.g. after the job has been pre-empted, by continuing DynamicCoupled from
+        the checkpoint. The model files are not regenerated. If the case has no checkpoint, it is run from the
+        start with run_flexop_case.
+    """
+    checkpoint_ts, checkpoint_file = find_latest_checkpoint(output_route, case_name)
+    if checkpoint_file is None:
+        return run_flexop_case(case_name, cases_route, output_route, case_parameters)
+    print('Resuming case {} from timestep {}.'.format(case_name, checkpoint_ts))
+
+    case_parameters = get_recommended_settings(case_parameters)
+    trim_cache_file = case_parameters.get('trim_cache_file')
+    if trim_cache_file is not None:
+        case_parameters, trim_cache_hit = apply_trim_cache(trim_cache_file, case_parameters)
+
+    if case_parameters.get('time_step_schedule') is not None:
+        return run_scheduled_case(case_name,
+                                  cases_route,
+                                  output_route,
+                                  case_parameters,
+                                  restart_source_file=checkpoint_file,
+                                  restart_ts=checkpoint_ts)
+
+    flexop_model = generate_flexop_case(case_name,
+                                        cases_route,
+                                        output_route,
+                                        case_parameters,
+                                        flow=['DynamicCoupled'],
+                                        write_model_files=False)
+    run_sharpy(cases_route, case_name, restart_file=checkpoint_file)
+
+    if trim_cache_file is not None and not trim_cache_hit and case_parameters.get('snapshot_route') is None:
+        # Trimmed by the run the checkpoint was written by
+        store_trim(trim_cache_file, case_parameters, read_trim_results(output_route, case_name))
+    return flexop_model
@@ -0,0 +1,98 @@
+"""
+    Snapshots of the converged static aeroelastic state (structural timestep info, aerodynamic grid and wake) used
+    to warm-start dynamic simulations. All cases of a gust sweep at one flight condition share the same static
+    solution, so the static phase of the flow (StaticCoupled or StaticTrim and the subsequent postprocessors) is
+    run once, the SHARPy data is pickled (PickleData) and every case starts directly with DynamicCoupled from
+    this snapshot using SHARPy's restart option.
+
+    Snapshots are keyed by all case parameters except those only affecting the dynamic simulation
+    (see dynamic_parameters).
+"""
+
+import fcntl
+import glob
+import os
+import pickle
+from helper_functions.settings_tools import get_fingerprint
+
+# Case parameters that do not change the static solution
+dynamic_parameters = ['use_gust',
+                      'gust_settings',
+                      'turbulence_route',
+                      'simulation_time',
+                      'relaxation_factor',
+                      'newmark_damp',
+                      'postprocessor_each_timestep',
+                      'monitor_channels',
+                      'full_dump_stride',
+                      'checkpoint_interval',
+                      'telemetry',
+                      'num_cores',
+                      'trim_cache_file',
+                      'discretisation_settings_file',
+                      'wake_settings_file',
+                      'model_cache_route',
+                      'snapshot_route',
+                      'time_step_schedule',
+                      'output_compaction']
+
+
+def get_snapshot_key(case_parameters):
+    return get_fingerprint({key: value for key, value in case_parameters.items() if key not in dynamic_parameters})
+
+
+def get_snapshot_file(snapshot_route, case_parameters):
+    return os.path.join(snapshot_route, get_snapshot_key(case_parameters) + '.pkl')
+
+
+def get_snapshot_lock(snapshot_route, case_parameters):
+    """
+        Returns an open lock file of the snapshot, which is locked exclusively until closed, so that concurrent
+        cases wait for the first case to create the snapshot instead of computing it several times.
+    """
+    if not os.path.exists(snapshot_route):
+        os.makedirs(snapshot_route, exist_ok=True)
+    lock = open(os.path.join(snapshot_route, get_snapshot_key(case_parameters) + '.lock'), 'w')
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def get_static_flow(flow):
+    # Static phase of a flow followed by pickling the SHARPy data
+    static_flow = [solver for solver in flow if solver != 'DynamicCoupled']
+    static_flow.append('PickleData')
+    return static_flow
+
+
+def find_pickle_file(output_route, case_name):
+    list_pickle_files = glob.glob(os.path.join(output_route, case_name, '**', '*.pkl'), recursive=True)
+    if len(list_pickle_files) == 0:
+        raise FileNotFoundError('No pickled SHARPy data found in {}.'.format(os.path.join(output_route, case_name)))
+    return max(list_pickle_files, key=os.path.getmtime)
+
+
+def prepare_restart_file(snapshot_file, restart_file, output_route, case_name):
+    """
+        Writes a copy of a snapshot for a case, with the case's output folder set, so that the output of the
+        restarted simulation is not written into the folder of the case that created the snapshot.
+    """
+    with open(snapshot_file, 'rb') as f:
+        data = pickle.load(f)
+    data.output_folder = os.path.join(output_route, case_name) + '/'
+    if not os.path.exists(data.output_folder):
+        os.makedirs(data.output_folder)
+    with open(restart_file, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return restart_file
+
+
+def run_sharpy(cases_route, case_name, restart_file=None):
+    """
+        Runs SHARPy with the settings file of a case, restarting from the pickled SHARPy data if given.
+    """
+    import sharpy.sharpy_main
+
+    arguments = ['', os.path.join(cases_route, case_name + '.sharpy')]
+    if restart_file is not None:
+        arguments += ['-r', restart_file]
+    return sharpy.sharpy_main.main(arguments)
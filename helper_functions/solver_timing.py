@@ -0,0 +1,67 @@
+"""
+    Timing of the SHARPy solvers and postprocessors run within a simulation. While active, the run method of
+    every registered SHARPy solver is wrapped to accumulate its wall time and number of calls, e.g. the time
+    spent in StaticCoupled, DynamicCoupled and, within DynamicCoupled, in each StepUvlm and structural solver
+    call (FSI substep) and in the BeamLoads/SaveData postprocessors. Times are inclusive, i.e. the time of
+    DynamicCoupled includes the time of the solvers called by it.
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+
+
+class SolverTimer:
+    """
+        Context manager timing all SHARPy solvers run while it is active.
+
+        Example:
+            with SolverTimer() as timer:
+                flexop_model.run()
+            print(timer.timings) # solver id -> {'wall_time': ..., 'calls': ...}
+    """
+    def __init__(self):
+        self.timings = {}
+        self.stages = {}
+        self.original_run_methods = {}
+
+    def get_timed_run(self, solver_id, run_method):
+        @functools.wraps(run_method)
+        def timed_run(solver_instance, *args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return run_method(solver_instance, *args, **kwargs)
+            finally:
+                timing = self.timings.setdefault(solver_id, {'wall_time': 0., 'calls': 0})
+                timing['wall_time'] += time.perf_counter() - start_time
+                timing['calls'] += 1
+        return timed_run
+
+    def __enter__(self):
+        import sharpy.solvers # registers all SHARPy solvers
+        import sharpy.postproc # registers all SHARPy postprocessors
+        import sharpy.utils.solver_interface as solver_interface
+
+        for solver_id, solver_class in solver_interface.dict_of_solvers.items():
+            # Only wrap classes defining their own run method to avoid counting inherited methods twice
+            if 'run' in vars(solver_class):
+                self.original_run_methods[solver_class] = solver_class.run
+                solver_class.run = self.get_timed_run(solver_id, solver_class.run)
+        return self
+
+    def __exit__(self, *exc):
+        for solver_class, run_method in self.original_run_methods.items():
+            solver_class.run = run_method
+        self.original_run_methods = {}
+        return False
+
+    @contextmanager
+    def stage(self, stage_name):
+        """
+            Times a stage of the pipeline outside of SHARPy, e.g. the model generation or the postprocessing.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage_name] = self.stages.get(stage_name, 0.) + time.perf_counter() - start_time
@@ -0,0 +1,328 @@
+"""
+    Stability sweeps of the linear aeroelastic system, e.g. flutter boundaries over stiffness factor and flight
+    speed, with the speed points run concurrently in a process pool (see helper_functions/campaign.py).
+
+    Every speed point is linearised about its own trimmed and deformed equilibrium: it runs AerogridLoader, the static
+    (trim) solution, DynamicCoupled, the modal solve of the deformed aircraft and LinearAssembler (see
+    get_speed_point_flow), followed by AsymptoticStability, whose continuous-time eigenvalues are collected. Only the
+    model loading and the modal solve of the undeformed structure, i.e. the cheapest steps, are run once per
+    structural case (a point of a grid of e.g. stiffness factors or model variants) and shared through a pickled
+    structural snapshot; nothing expensive is shared. A speed point therefore costs about as much as the single
+    linearisation of generate_linear_system.py, whose velocity_analysis evaluates all speeds with the system
+    linearised at one speed and remains the cheaper choice if the equilibrium at each speed is not needed. The
+    sweep is faster only through running the speed points concurrently and through the adaptive refinement, which
+    needs fewer speed points than a fine fixed grid.
+
+    Instead of a fixed speed grid, the speed points are refined adaptively: starting from a coarse grid, new
+    points are added within the speed interval in which the damping (largest real part of the eigenvalues of the
+    oscillatory modes) first crosses zero, until the interval is smaller than the speed tolerance. The flutter
+    speed is interpolated within the final interval.
+
+    All eigenvalues of all speed points are collected into a single HDF5 file (see write_stability_sweep), from
+    which root loci are read with read_stability_sweep.
+"""
+
+import json
+import os
+import time
+import traceback
+import h5py as h5
+import numpy as np
+from helper_functions.campaign import (get_case_name, get_case_routes, get_parameter_grid, is_case_done,
+                                       run_campaign, write_done_marker)
+from helper_functions.settings_tools import get_fingerprint
+
+# Case parameters that differ between the speed points of a structural case
+speed_point_parameters = ['u_inf', 'num_cores']
+
+
+def get_structural_snapshot_key(case_parameters):
+    return get_fingerprint({key: value for key, value in case_parameters.items()
+                            if key not in speed_point_parameters})
+
+
+def get_structural_snapshot_file(snapshot_route, case_parameters):
+    return os.path.join(snapshot_route, get_structural_snapshot_key(case_parameters) + '.pkl')
+
+
+def get_eigenvalues_file(output_route, case_name):
+    return os.path.join(output_route, case_name + '.eigenvalues.npy')
+
+
+def get_speed_point_flow(case_parameters):
+    """
+        Returns the flow of a speed point restarted from the structural snapshot, i.e. the linearisation flow
+        without the model loading and the modal solve of the undeformed structure and without saving the linear
+        system.
+    """
+    from helper_functions.linear_system_case import get_linear_flow
+
+    flow = get_linear_flow(case_parameters['use_trim'], stability_analysis=True,
+                           low_memory=case_parameters.get('low_memory', False))
+    flow.remove('BeamLoader')
+    flow.remove('Modal') # first occurrence, i.e. the modal solve of the undeformed structure
+    return [solver for solver in flow if solver not in ['SaveData', 'LinearSystemSaver']]
+
+
+def read_stability_eigenvalues(output_route, case_name):
+    # Continuous-time eigenvalues exported by AsymptoticStability
+    eigenvalues = np.loadtxt(os.path.join(output_route, case_name, 'stability', 'eigenvalues.dat'), ndmin=2)
+    return eigenvalues[:, 0] + 1j * eigenvalues[:, 1]
+
+
+def run_structural_snapshot_case(case):
+    """
+        Runs the model loading and modal solve of a structural case and stores the pickled SHARPy data as
+        structural snapshot. Executed in a worker process of the campaign's process pool.
+
+        Returns:
+            tuple: case name, success flag, wall time, error message
+    """
+    from helper_functions.linear_system_case import generate_linear_case
+    from helper_functions.snapshot import find_pickle_file
+
+    case_name, cases_route, output_route, case_parameters = case
+    start_time = time.time()
+    try:
+        flexop_model = generate_linear_case(case_name,
+                                            cases_route,
+                                            output_route,
+                                            case_parameters,
+                                            flow=['BeamLoader', 'Modal', 'PickleData'])
+        flexop_model.run()
+        os.replace(find_pickle_file(output_route, case_name), case_parameters['structural_snapshot_file'])
+    except Exception:
+        return case_name, False, time.time() - start_time, traceback.format_exc()
+    return case_name, True, time.time() - start_time, ''
+
+
+def run_speed_point_case(case):
+    """
+        Runs a speed point restarted from the structural snapshot of its structural case and saves the eigenvalues
+        of AsymptoticStability to <output_route>/<case_name>.eigenvalues.npy. Executed in a worker process of the
+        campaign's process pool.
+
+        Returns:
+            tuple: case name, success flag, wall time, error message
+    """
+    from helper_functions.linear_system_case import generate_linear_case
+    from helper_functions.snapshot import prepare_restart_file, run_sharpy
+
+    case_name, cases_route, output_route, case_parameters = case
+    start_time = time.time()
+    try:
+        generate_linear_case(case_name,
+                             cases_route,
+                             output_route,
+                             case_parameters,
+                             flow=get_speed_point_flow(case_parameters))
+        restart_file = prepare_restart_file(case_parameters['structural_snapshot_file'],
+                                            os.path.join(cases_route, case_name + '.restart.pkl'),
+                                            output_route,
+                                            case_name)
+        run_sharpy(cases_route, case_name, restart_file=restart_file)
+        os.remove(restart_file)
+        np.save(get_eigenvalues_file(output_route, case_name), read_stability_eigenvalues(output_route, case_name))
+    except Exception:
+        return case_name, False, time.time() - start_time, traceback.format_exc()
+    wall_time = time.time() - start_time
+    write_done_marker(output_route, case_name, case_parameters, wall_time)
+    return case_name, True, wall_time, ''
+
+
+def get_damping(eigenvalues, min_frequency=1.):
+    """
+        Returns the largest real part [1/s] of the eigenvalues of the oscillatory modes (frequency above
+        min_frequency [rad/s]), i.e. rigid body modes and non-oscillatory aerodynamic states are excluded.
+    """
+    oscillatory = np.abs(eigenvalues.imag) >= min_frequency
+    if not np.any(oscillatory):
+        return -np.inf
+    return np.max(eigenvalues.real[oscillatory])
+
+
+def get_crossing_interval(speeds, damping):
+    """
+        Returns the index of the first speed interval in which the damping becomes positive, or None if the system
+        is stable for all speeds (or unstable from the first speed on).
+    """
+    for i_speed in range(len(speeds) - 1):
+        if damping[i_speed] <= 0. < damping[i_speed + 1]:
+            return i_speed
+    return None
+
+
+def get_refinement_speeds(speeds, damping, num_points, speed_tolerance):
+    """
+        Returns num_points new speeds evenly distributed within the first speed interval in which the damping
+        becomes positive, or an empty list if there is no such interval or it is smaller than the speed tolerance.
+    """
+    i_crossing = get_crossing_interval(speeds, damping)
+    if i_crossing is None or speeds[i_crossing + 1] - speeds[i_crossing] <= speed_tolerance:
+        return []
+    return list(np.linspace(speeds[i_crossing], speeds[i_crossing + 1], num_points + 2)[1:-1])
+
+
+def get_flutter_speed(speeds, damping):
+    """
+        Returns the speed at which the damping first becomes positive (linear interpolation) or NaN.
+    """
+    i_crossing = get_crossing_interval(speeds, damping)
+    if i_crossing is None:
+        return np.nan
+    return float(np.interp(0., damping[i_crossing:i_crossing + 2], speeds[i_crossing:i_crossing + 2]))
+
+
+class StructuralCase:
+    """
+        Speed points of a structural case of a stability sweep.
+    """
+    def __init__(self, name, overrides, case_parameters, campaign_route):
+        self.name = name
+        self.overrides = overrides
+        self.case_parameters = case_parameters
+        self.campaign_route = campaign_route
+        self.speed_cases = {}
+        self.eigenvalues = {}
+
+    def get_speed_case(self, u_inf):
+        u_inf = round(float(u_inf), 6)
+        case_name = get_case_name(self.name, {'u_inf': u_inf})
+        cases_route, output_route = get_case_routes(self.campaign_route, case_name)
+        return (case_name, cases_route, output_route, dict(self.case_parameters, u_inf=u_inf))
+
+    def add_speeds(self, speeds):
+        list_cases = []
+        for u_inf in speeds:
+            case = self.get_speed_case(u_inf)
+            if case[3]['u_inf'] not in self.speed_cases:
+                self.speed_cases[case[3]['u_inf']] = case
+                list_cases.append(case)
+        return list_cases
+
+    def collect_eigenvalues(self):
+        for u_inf, (case_name, _, output_route, _) in self.speed_cases.items():
+            if u_inf not in self.eigenvalues and is_case_done(output_route, case_name):
+                self.eigenvalues[u_inf] = np.load(get_eigenvalues_file(output_route, case_name))
+
+    @property
+    def speeds(self):
+        return np.array(sorted(self.eigenvalues.keys()))
+
+    def get_damping(self, min_frequency=1.):
+        return np.array([get_damping(self.eigenvalues[u_inf], min_frequency) for u_inf in self.speeds])
+
+
+def run_stability_sweep(campaign_route, base_name, base_parameters, structural_grid, speeds, num_cores_total,
+                        speed_tolerance=0.5, num_refinement_points=None, min_frequency=1., max_cores_per_case=4,
+                        max_processes=None):
+    """
+        Runs a stability sweep over the structural cases of the structural grid (see get_parameter_grid), each
+        evaluated at the given initial speeds and refined adaptively around its flutter speed.
+
+        Args:
+            speeds (list): initial speeds [m/s]
+            speed_tolerance (float): width of the speed interval [m/s] in which the flutter speed is refined
+            num_refinement_points (int): number of speed points added per refinement (default: number of
+                                         concurrent processes divided by the number of refined structural cases)
+            min_frequency (float): minimum frequency [rad/s] of the modes considered for the damping
+
+        Returns:
+            list: structural cases (see StructuralCase)
+    """
+    base_parameters = dict(base_parameters, stability_analysis=True, velocity_analysis=[])
+    snapshot_route = os.path.join(campaign_route, 'structural_snapshots') + '/'
+    if not os.path.exists(snapshot_route):
+        os.makedirs(snapshot_route)
+
+    # Structural snapshots
+    list_structural_cases = []
+    list_snapshot_cases = []
+    for overrides in get_parameter_grid(structural_grid):
+        name = get_case_name(base_name, overrides)
+        case_parameters = dict(base_parameters, **overrides)
+        case_parameters['structural_snapshot_file'] = get_structural_snapshot_file(snapshot_route, case_parameters)
+        list_structural_cases.append(StructuralCase(name, overrides, case_parameters, campaign_route))
+        if not os.path.isfile(case_parameters['structural_snapshot_file']):
+            cases_route, output_route = get_case_routes(campaign_route, name + '_structure')
+            list_snapshot_cases.append((name + '_structure', cases_route, output_route, case_parameters))
+    if len(list_snapshot_cases) > 0:
+        check_results(run_campaign(list_snapshot_cases, num_cores_total, max_cores_per_case=max_cores_per_case,
+                                   max_processes=max_processes, run_case=run_structural_snapshot_case,
+                                   case_settings=None))
+
+    # Initial speed grid and adaptive refinement
+    list_pending = [case for structural_case in list_structural_cases for case in structural_case.add_speeds(speeds)]
+    while len(list_pending) > 0:
+        check_results(run_campaign(list_pending, num_cores_total, max_cores_per_case=max_cores_per_case,
+                                   max_processes=max_processes, run_case=run_speed_point_case,
+                                   case_settings=None))
+        list_pending = []
+        refined_cases = []
+        for structural_case in list_structural_cases:
+            structural_case.collect_eigenvalues()
+            if get_refinement_speeds(structural_case.speeds, structural_case.get_damping(min_frequency), 1,
+                                     speed_tolerance):
+                refined_cases.append(structural_case)
+        for structural_case in refined_cases:
+            num_points = num_refinement_points
+            if num_points is None:
+                num_points = max(1, (num_cores_total // max(1, max_cores_per_case)) // len(refined_cases))
+            list_pending += structural_case.add_speeds(get_refinement_speeds(structural_case.speeds,
+                                                                             structural_case.get_damping(min_frequency),
+                                                                             num_points,
+                                                                             speed_tolerance))
+    return list_structural_cases
+
+
+def check_results(results):
+    list_failed = [case_name for case_name, result in results.items() if not result[0]]
+    if len(list_failed) > 0:
+        raise RuntimeError('Failed cases of the stability sweep: {}'.format(', '.join(list_failed)))
+
+
+def write_stability_sweep(file, list_structural_cases, min_frequency=1.):
+    """
+        Writes the eigenvalues of all speed points of all structural cases to a single HDF5 file with one group per
+        structural case containing the speeds, the eigenvalues (n_speeds, max. number of eigenvalues, padded with
+        NaN), the damping and the flutter speed (attribute).
+    """
+    folder = os.path.dirname(os.path.abspath(file))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with h5.File(file, 'w') as f:
+        for structural_case in list_structural_cases:
+            speeds = structural_case.speeds
+            damping = structural_case.get_damping(min_frequency)
+            num_eigenvalues = max([len(eigenvalues) for eigenvalues in structural_case.eigenvalues.values()] + [0])
+            eigenvalues = np.full((len(speeds), num_eigenvalues), np.nan, dtype=complex)
+            for i_speed, u_inf in enumerate(speeds):
+                eigenvalues[i_speed, :len(structural_case.eigenvalues[u_inf])] = structural_case.eigenvalues[u_inf]
+            group = f.create_group(structural_case.name)
+            group.create_dataset('u_inf', data=speeds)
+            group.create_dataset('eigenvalues', data=eigenvalues, compression='gzip')
+            group.create_dataset('damping', data=damping)
+            group.attrs['flutter_speed'] = get_flutter_speed(speeds, damping)
+            group.attrs['parameters'] = json.dumps(structural_case.overrides)
+        f.attrs['min_frequency'] = min_frequency
+
+
+def read_stability_sweep(file, structural_case_name=None):
+    """
+        Reads the results of a stability sweep (all structural cases or the given one).
+
+        Returns:
+            dict: structural case name -> dict with the parameters, speeds, eigenvalues (n_speeds, n_eigenvalues),
+                  damping and flutter speed
+    """
+    results = {}
+    with h5.File(file, 'r') as f:
+        for name, group in f.items():
+            if structural_case_name is not None and name != structural_case_name:
+                continue
+            results[name] = {'parameters': json.loads(group.attrs['parameters']),
+                             'u_inf': group['u_inf'][()],
+                             'eigenvalues': group['eigenvalues'][()],
+                             'damping': group['damping'][()],
+                             'flutter_speed': float(group.attrs['flutter_speed'])}
+    return results
@@ -0,0 +1,133 @@
+"""
+    Time step schedules for gust response simulations. Instead of a constant time step for the whole simulation,
+    the simulation is split into segments: a fine time step (the time step of the case, i.e. CFL = 1) is used
+    while the gust passes the aircraft and a coarser time step before the gust encounter and in the decaying
+    tail of the response.
+
+    SHARPy's DynamicCoupled uses a constant time step, so each segment is run as a separate DynamicCoupled
+    simulation restarted from the pickled SHARPy data of the previous segment (see
+    simulation_case.run_scheduled_case). The wake panels are convected with the time step of each segment, which
+    requires the variable wake discretisation (cfl1 = False).
+
+    A schedule is a list of segments, each given as dict with
+        - dt: time step of the segment
+        - start_step, end_step: timestep indices at the start and the end of the segment (global, i.e. counted
+          from the start of the simulation)
+        - start_time: physical time at the start of the segment
+    so that the physical time of timestep ts within a segment is start_time + (ts - start_step) * dt.
+
+    The schedule of a case is written to <output_route>/<case>/<case>.schedule.json and used by
+    postprocess_gust_response.py to compute the time of each timestep.
+"""
+
+import json
+import os
+import numpy as np
+
+# Default schedule settings (case parameter time_step_schedule)
+default_schedule_settings = {'coarse_factor': 4, # ratio of the coarse to the fine time step
+                             'margin': 0.1, # time [s] resolved with the fine time step before and after the gust
+                             'fine_window': None, # time window [s] of the fine time step; by default derived from the gust
+                             }
+
+
+def get_gust_window(gust_settings, u_inf):
+    """
+        Returns the time window during which a discrete gust (e.g. 1-cos) passes the leading edge, i.e. from the
+        gust front reaching the leading edge at gust_offset / u_inf until the gust has passed it. The time the gust
+        needs to pass the remaining aircraft (e.g. the tail) is covered by the margin of the schedule.
+    """
+    if 'gust_length' not in gust_settings:
+        raise ValueError('The gust window can only be derived for discrete gusts. Specify a fine_window instead.')
+    start_time = gust_settings['gust_offset'] / u_inf
+    end_time = (gust_settings['gust_offset'] + gust_settings['gust_length']) / u_inf
+    return start_time, end_time
+
+
+def get_time_step_schedule(dt, simulation_time, fine_window, coarse_factor=4, margin=0.1):
+    """
+        Returns a schedule with time step dt within the fine window (extended by the margin) and coarse_factor * dt
+        elsewhere. Segment boundaries are rounded to multiples of the fine time step and the last coarse segment is
+        extended to cover the simulation time.
+    """
+    n_steps_fine = int(simulation_time / dt)
+    fine_start = max(0, int(np.floor((fine_window[0] - margin) / dt)))
+    fine_end = min(n_steps_fine, int(np.ceil((fine_window[1] + margin) / dt)))
+    # Coarse segment before the gust in multiples of the coarse time step (the fine segment starts earlier instead)
+    fine_start -= fine_start % coarse_factor
+
+    schedule = []
+    step = 0
+    time = 0.
+    for segment_dt, n_steps in [(coarse_factor * dt, fine_start // coarse_factor),
+                                (dt, fine_end - fine_start),
+                                (coarse_factor * dt, int(np.ceil((n_steps_fine - fine_end) / coarse_factor)))]:
+        if n_steps <= 0:
+            continue
+        if len(schedule) > 0 and schedule[-1]['dt'] == segment_dt:
+            schedule[-1]['end_step'] += n_steps
+        else:
+            schedule.append({'dt': segment_dt, 'start_step': step, 'end_step': step + n_steps, 'start_time': time})
+        step += n_steps
+        time += n_steps * segment_dt
+    return schedule
+
+
+def get_time_offset(segment):
+    # Difference between the physical time and SHARPy's time (timestep index * dt) within a segment
+    return segment['start_time'] - segment['start_step'] * segment['dt']
+
+
+def get_step_times(schedule, steps):
+    """
+        Returns the physical time of the given timestep indices.
+    """
+    steps = np.asarray(steps)
+    times = np.zeros(steps.shape)
+    for segment in schedule:
+        in_segment = steps >= segment['start_step']
+        times[in_segment] = segment['start_time'] + (steps[in_segment] - segment['start_step']) * segment['dt']
+    return times
+
+
+def get_schedule_file(output_route, case_name):
+    return os.path.join(output_route, case_name, case_name + '.schedule.json')
+
+
+def write_schedule(output_route, case_name, schedule):
+    schedule_file = get_schedule_file(output_route, case_name)
+    if not os.path.exists(os.path.dirname(schedule_file)):
+        os.makedirs(os.path.dirname(schedule_file))
+    with open(schedule_file, 'w') as f:
+        json.dump(schedule, f, indent=4)
+
+
+def read_schedule(output_route, case_name):
+    """
+        Returns the schedule of a case or None if the case has been run with a constant time step.
+    """
+    schedule_file = get_schedule_file(output_route, case_name)
+    if not os.path.isfile(schedule_file):
+        return None
+    with open(schedule_file, 'r') as f:
+        return json.load(f)
+
+
+def compare_time_histories(reference_data, data, columns=None):
+    """
+        Convergence check of a simulation with a time step schedule against the reference simulation with constant
+        time step. Both time histories are given as arrays with the time in the first column (as returned by
+        postprocess_gust_response.get_time_history). The time history is interpolated onto the reference time
+        steps and the maximum absolute error of each column is returned relative to the maximum absolute
+        reference value.
+    """
+    if columns is None:
+        columns = range(1, reference_data.shape[1])
+    time = reference_data[:, 0]
+    in_range = time <= data[-1, 0]
+    relative_errors = {}
+    for column in columns:
+        error = np.interp(time[in_range], data[:, 0], data[:, column]) - reference_data[in_range, column]
+        reference_max = np.max(np.abs(reference_data[in_range, column]))
+        relative_errors[column] = np.max(np.abs(error)) / reference_max if reference_max > 0 else np.max(np.abs(error))
+    return relative_errors
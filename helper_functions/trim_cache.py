@@ -0,0 +1,137 @@
+"""
+    Persistent on-disk cache of trim states (angle of attack, elevator deflection and thrust) of the (Super)Flexop.
+
+    Entries are keyed by a hash of the structural and aerodynamic model inputs and the flight condition
+    (see trim_key_parameters). If a case's trim state is cached, the StaticTrim solver can be dropped from the
+    flow. Otherwise, the trim is computed by SHARPy's StaticTrim solver and the result is stored afterwards.
+    The closest cached trim state of the same model is used as initial guess for the trim solver, so that
+    sweeps through the flight envelope do not start converging the trim from zero each time.
+
+    The cache is a single JSON file which can be shared by concurrent cases (e.g. in a gust campaign).
+"""
+
+import copy
+import fcntl
+import hashlib
+import json
+import os
+import numpy as np
+
+# Case parameters defining a trim state (inputs of the structural and aerodynamic model and flight condition)
+trim_key_parameters = ['factor_material_stiffness',
+                       'n_elem_multiplier',
+                       'n_elem_multiplier_tail',
+                       'n_elem_multiplier_fuselage',
+                       'num_chord_panels',
+                       'ailerons_type',
+                       'wing_only',
+                       'lifting_only',
+                       'u_inf',
+                       'rho']
+# Parameters that can differ between a case and the cached trim state used as its initial guess
+trim_neighbour_parameters = ['factor_material_stiffness', 'u_inf', 'rho']
+
+
+def get_trim_key_parameters(case_parameters):
+    key_parameters = {}
+    for parameter in trim_key_parameters:
+        value = case_parameters.get(parameter)
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            value = round(float(value), 10)
+        key_parameters[parameter] = value
+    return key_parameters
+
+
+def get_trim_key(case_parameters):
+    key_parameters = get_trim_key_parameters(case_parameters)
+    return hashlib.sha1(json.dumps(key_parameters, sort_keys=True).encode()).hexdigest()
+
+
+def load_trim_cache(cache_file):
+    if not os.path.isfile(cache_file):
+        return {}
+    with open(cache_file, 'r') as f:
+        return json.load(f)
+
+
+def lookup_trim(cache_file, case_parameters):
+    """
+        Returns the cached trim values (dict with alpha, delta and thrust) of the case or None if the
+        trim state has not been cached yet.
+    """
+    entry = load_trim_cache(cache_file).get(get_trim_key(case_parameters))
+    if entry is None:
+        return None
+    return entry['trim_values']
+
+
+def find_nearest_trim(cache_file, case_parameters):
+    """
+        Returns the trim values of the closest cached trim state of the same model discretisation and
+        configuration, or None if no such entry exists. The distance is measured relative to the case's
+        stiffness factor, velocity and density.
+    """
+    key_parameters = get_trim_key_parameters(case_parameters)
+    nearest_trim_values = None
+    min_distance = np.inf
+    for entry in load_trim_cache(cache_file).values():
+        if any(entry['parameters'].get(parameter) != key_parameters[parameter]
+               for parameter in trim_key_parameters if parameter not in trim_neighbour_parameters):
+            continue
+        distance = np.linalg.norm([(entry['parameters'][parameter] - key_parameters[parameter])
+                                   / key_parameters[parameter] for parameter in trim_neighbour_parameters])
+        if distance < min_distance:
+            min_distance = distance
+            nearest_trim_values = entry['trim_values']
+    return nearest_trim_values
+
+
+def store_trim(cache_file, case_parameters, trim_values):
+    """
+        Adds the trim values of a case to the cache. The cache file is locked while being updated, so that
+        concurrent cases can share the same cache.
+    """
+    cache_folder = os.path.dirname(os.path.abspath(cache_file))
+    if not os.path.exists(cache_folder):
+        os.makedirs(cache_folder)
+    with open(cache_file + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        trim_cache = load_trim_cache(cache_file)
+        trim_cache[get_trim_key(case_parameters)] = {'parameters': get_trim_key_parameters(case_parameters),
+                                                     'trim_values': {key: float(value)
+                                                                     for key, value in trim_values.items()}}
+        with open(cache_file + '.tmp', 'w') as f:
+            json.dump(trim_cache, f, indent=4)
+        os.replace(cache_file + '.tmp', cache_file)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_trim_results(output_route, case_name):
+    """
+        Reads the trim values saved by SHARPy's StaticTrim solver (setting save_info).
+    """
+    trim_file = os.path.join(output_route, case_name, 'statictrim', 'trim_values.txt')
+    alpha, delta, thrust = np.loadtxt(trim_file)[:3]
+    return {'alpha': alpha, 'delta': delta, 'thrust': thrust}
+
+
+def apply_trim_cache(cache_file, case_parameters):
+    """
+        Sets the trim state of a case from the cache. On a cache hit, the cached trim values are used and
+        StaticTrim is removed from the flow (use_trim = False). On a miss, StaticTrim is used with the closest
+        cached trim state (if any) as initial guess.
+
+        Returns:
+            tuple: updated copy of the case parameters, cache hit flag
+    """
+    case_parameters = copy.deepcopy(case_parameters)
+    trim_values = lookup_trim(cache_file, case_parameters)
+    cache_hit = trim_values is not None
+    if not cache_hit:
+        trim_values = find_nearest_trim(cache_file, case_parameters)
+    if trim_values is not None:
+        case_parameters['alpha'] = trim_values['alpha']
+        case_parameters['cs_deflection'] = trim_values['delta']
+        case_parameters['thrust'] = trim_values['thrust']
+    case_parameters['use_trim'] = not cache_hit
+    return case_parameters, cache_hit
@@ -0,0 +1,148 @@
+"""
+    Continuous turbulence fields (Dryden or von Karman) for gust response simulations.
+
+    Turbulence is modelled as frozen field, i.e. as a function of the distance travelled through the field, so that
+    one field can be used for any flight speed and time step. Fields are synthesised by filtering Gaussian white
+    noise in the frequency domain with the spectra of MIL-F-8785C (see helper_functions/turbulence_spectra.py), with
+    the scale lengths and the ratios of the longitudinal and lateral to the vertical intensities given by the
+    altitude. The fields are normalised to a
+    vertical intensity of 1 m/s and scaled by the gust intensity of a case.
+
+    Fields are stored in a binary store (<turbulence_route>/<key>.npy, array of shape (n_points, 4) with the
+    distance [m] and the u, v and w components) keyed by the turbulence model, altitude, seed, spatial resolution
+    and record length. A case only loads the window it needs from the memory-mapped file.
+
+    The TurbulenceField gust ('turbulence field') feeds the window to SHARPy's GustVelocityField and is registered
+    with SHARPy when this module is imported.
+"""
+
+import json
+import os
+import numpy as np
+import sharpy.utils.settings as settings_utils
+from sharpy.generators.gustvelocityfield import BaseGust, gust
+from helper_functions.settings_tools import get_fingerprint
+from helper_functions.turbulence_spectra import get_spectra, get_turbulence_scales
+
+
+def generate_turbulence_field(model, altitude, seed, dx, record_length):
+    """
+        Synthesises a turbulence field with vertical intensity 1 m/s and spatial resolution dx [m] over the record
+        length [m]. Returns an array of shape (n_points, 4) with the distance and the u, v and w components.
+    """
+    n_points = int(np.ceil(record_length / dx)) + 1
+    scale_lengths, intensity_ratios = get_turbulence_scales(altitude, model)
+    spatial_frequency = 2 * np.pi * np.fft.rfftfreq(n_points, d=dx)
+    # Filter for white noise with unit variance, which has the one-sided spectral density dx / pi
+    transfer_function = np.sqrt(get_spectra(model, spatial_frequency, scale_lengths) * np.pi / dx)
+    transfer_function[:, 0] = 0. # zero mean
+
+    white_noise = np.random.default_rng(seed).standard_normal((3, n_points))
+    field = np.zeros((n_points, 4))
+    field[:, 0] = np.arange(n_points) * dx
+    field[:, 1:] = np.fft.irfft(np.fft.rfft(white_noise, axis=1) * transfer_function, n=n_points, axis=1).T
+    field[:, 1:] *= intensity_ratios
+    return field
+
+
+def get_turbulence_key(model, altitude, seed, dx, record_length):
+    return get_fingerprint({'model': model,
+                            'altitude': float(altitude),
+                            'seed': int(seed),
+                            'dx': float(dx),
+                            'record_length': float(record_length)})
+
+
+def get_turbulence_file(turbulence_route, model, altitude, seed, dx, record_length, generate=True):
+    """
+        Returns the file of the turbulence field with the given parameters, which is generated and added to the store
+        if not available yet (unless generate is False).
+    """
+    key = get_turbulence_key(model, altitude, seed, dx, record_length)
+    turbulence_file = os.path.join(turbulence_route, key + '.npy')
+    if generate and not os.path.isfile(turbulence_file):
+        if not os.path.exists(turbulence_route):
+            os.makedirs(turbulence_route, exist_ok=True)
+        field = generate_turbulence_field(model, altitude, seed, dx, record_length)
+        # Write to a temporary file first, so that concurrent cases never read an incomplete field
+        temporary_file = '{}.{}.tmp'.format(turbulence_file, os.getpid())
+        with open(temporary_file, 'wb') as f:
+            np.save(f, field)
+        os.replace(temporary_file, turbulence_file)
+        with open(os.path.join(turbulence_route, key + '.json'), 'w') as f:
+            json.dump({'model': model, 'altitude': altitude, 'seed': seed, 'dx': dx, 'record_length': record_length},
+                      f, indent=4)
+    return turbulence_file
+
+
+def load_turbulence_window(turbulence_file, window_start, window_length):
+    """
+        Returns a copy of the part of a stored turbulence field between window_start and window_start +
+        window_length [m].
+    """
+    field = np.load(turbulence_file, mmap_mode='r')
+    dx = field[1, 0] - field[0, 0]
+    i_start = int(np.floor(window_start / dx))
+    i_end = int(np.ceil((window_start + window_length) / dx)) + 1
+    if i_start < 0 or i_end > field.shape[0]:
+        raise ValueError('Window [{}, {}] m exceeds the turbulence record of length {} m.'.format(
+            window_start, window_start + window_length, field[-1, 0]))
+    return np.array(field[i_start:i_end, :])
+
+
+@gust
+class TurbulenceField(BaseGust):
+    """
+        Continuous turbulence read from a window of a stored turbulence field (see get_turbulence_file). The
+        turbulence starts at the gust offset, i.e. the velocity at a distance s behind the gust front is the velocity
+        at window_start + s of the stored field.
+    """
+    gust_id = 'turbulence field'
+
+    settings_types = dict()
+    settings_default = dict()
+    settings_description = dict()
+
+    settings_types['file'] = 'str'
+    settings_default['file'] = None
+    settings_description['file'] = 'Turbulence field file (.npy)'
+
+    settings_types['gust_component'] = 'list(int)'
+    settings_default['gust_component'] = [2]
+    settings_description['gust_component'] = 'Velocity components considered (0: u, 1: v, 2: w)'
+
+    settings_types['intensity'] = 'float'
+    settings_default['intensity'] = 1.
+    settings_description['intensity'] = 'Vertical turbulence intensity in m/s'
+
+    settings_types['window_start'] = 'float'
+    settings_default['window_start'] = 0.
+    settings_description['window_start'] = 'Start of the window within the turbulence field in m'
+
+    settings_types['window_length'] = 'float'
+    settings_default['window_length'] = None
+    settings_description['window_length'] = 'Length of the window in m'
+
+    def __init__(self):
+        super().__init__()
+        self.settings = None
+        self.distance = None
+        self.velocity = None
+
+    def initialise(self, in_dict):
+        self.settings = in_dict
+        settings_utils.to_custom_types(self.settings, self.settings_types, self.settings_default)
+        window = load_turbulence_window(self.settings['file'],
+                                        self.settings['window_start'],
+                                        self.settings['window_length'])
+        self.distance = window[:, 0] - self.settings['window_start']
+        self.velocity = window[:, 1:] * self.settings['intensity']
+
+    def gust_shape(self, x, y, z, time=0):
+        vel = np.zeros((3,))
+        d = np.dot(np.array([x, y, z]), self.u_inf_direction)
+        if d > 0.0:
+            return vel
+        for i_component in self.settings['gust_component']:
+            vel[i_component] = np.interp(-d, self.distance, self.velocity[:, i_component], right=0.)
+        return vel
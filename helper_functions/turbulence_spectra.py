@@ -0,0 +1,58 @@
+"""
+    Power spectral densities and scale lengths of continuous turbulence (Dryden or von Karman, MIL-F-8785C), used
+    to synthesise turbulence fields (see helper_functions/turbulence_field.py) and for the frequency-domain load
+    screening (see helper_functions/frequency_gust_response.py). This module does not import SHARPy.
+"""
+
+import numpy as np
+
+turbulence_models = ['dryden', 'von_karman']
+feet = 0.3048 # m
+von_karman_constant = 1.339
+
+
+def get_turbulence_scales(altitude, model):
+    """
+        Returns the scale lengths [m] and the intensities relative to the vertical intensity of the longitudinal,
+        lateral and vertical components at the given altitude [m] (MIL-F-8785C). Between 1000 ft and 2000 ft, the
+        low and medium/high altitude values are interpolated linearly.
+    """
+    h = max(altitude / feet, 10.)
+    # Low altitude (h < 1000 ft)
+    h_low = min(h, 1000.)
+    scale_lengths_low = np.array([h_low / (0.177 + 0.000823 * h_low) ** 1.2] * 2 + [h_low])
+    intensity_ratios_low = np.array([1. / (0.177 + 0.000823 * h_low) ** 0.4] * 2 + [1.])
+    # Medium/high altitude (h > 2000 ft)
+    scale_lengths_high = np.full((3,), 2500. if model == 'von_karman' else 1750.)
+    intensity_ratios_high = np.ones((3,))
+
+    weight_high = np.clip((h - 1000.) / 1000., 0., 1.)
+    scale_lengths = (1 - weight_high) * scale_lengths_low + weight_high * scale_lengths_high
+    intensity_ratios = (1 - weight_high) * intensity_ratios_low + weight_high * intensity_ratios_high
+    return scale_lengths * feet, intensity_ratios
+
+
+def get_spectra(model, spatial_frequency, scale_lengths):
+    """
+        Returns the one-sided power spectral densities of the longitudinal, lateral and vertical components with unit
+        intensity at the given spatial frequencies [rad/m] as array of shape (3, n_frequencies).
+    """
+    if model not in turbulence_models:
+        raise KeyError('Unknown turbulence model {}.'.format(model))
+    spectra = np.zeros((3, len(spatial_frequency)))
+    for i_component, scale_length in enumerate(scale_lengths):
+        if model == 'dryden':
+            reduced_frequency_squared = (scale_length * spatial_frequency) ** 2
+            if i_component == 0:
+                spectra[i_component] = 2 * scale_length / np.pi / (1 + reduced_frequency_squared)
+            else:
+                spectra[i_component] = scale_length / np.pi * (1 + 3 * reduced_frequency_squared) \
+                                       / (1 + reduced_frequency_squared) ** 2
+        else:
+            reduced_frequency_squared = (von_karman_constant * scale_length * spatial_frequency) ** 2
+            if i_component == 0:
+                spectra[i_component] = 2 * scale_length / np.pi / (1 + reduced_frequency_squared) ** (5 / 6)
+            else:
+                spectra[i_component] = scale_length / np.pi * (1 + 8 / 3 * reduced_frequency_squared) \
+                                       / (1 + reduced_frequency_squared) ** (11 / 6)
+    return spectra
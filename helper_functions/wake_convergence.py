@@ -0,0 +1,177 @@
+"""
+    Wake-length convergence of gust response simulations. The number of wake panels (wake_length chords of
+    num_chord_panels panels each, constant or variable wake discretisation) dominates the cost of StepUvlm, so the
+    shortest wake for which the gust response is converged is determined per configuration:
+        1) a case is run for every combination of wake length and wake discretisation (run concurrently as a
+           campaign, see helper_functions/campaign.py),
+        2) the time histories of the root loads and tip response of each case are compared against the reference
+           case (longest wake with constant discretisation),
+        3) the cheapest converged wake setting, i.e. the one with the fewest effective wake panels (see
+           get_wake_cost) whose errors are below the tolerance, is recommended. The wall time, which depends on the
+           load of the machine, only breaks ties.
+
+    Recommendations are stored in a JSON file keyed by the configuration (see wake_configuration_parameters).
+    Cases with the case parameter wake_settings_file use the recommended wake setting of their configuration if
+    available (see apply_wake_settings).
+"""
+
+import copy
+import fcntl
+import json
+import os
+from helper_functions.campaign import read_wall_time
+from helper_functions.settings_tools import get_fingerprint
+from helper_functions.time_step_schedule import compare_time_histories
+
+# Case parameters defining a configuration for which the converged wake setting is determined
+wake_configuration_parameters = ['free_flight',
+                                 'wing_only',
+                                 'lifting_only',
+                                 'factor_material_stiffness',
+                                 'num_chord_panels',
+                                 'n_elem_multiplier',
+                                 'n_elem_multiplier_tail',
+                                 'n_elem_multiplier_fuselage',
+                                 'u_inf',
+                                 'CFL']
+# Channels compared against the reference
+wake_convergence_labels = ['z', 'OOP', 'MT']
+# Cost of the variable relative to the constant wake discretisation with the same number of wake panels (about 20 %
+# less simulation time, see run_nonlinear_simulation.py)
+variable_wake_cost_factor = 0.8
+
+
+def get_wake_configuration(case_parameters):
+    return {parameter: case_parameters[parameter] for parameter in wake_configuration_parameters}
+
+
+def get_wake_configuration_key(case_parameters):
+    return get_fingerprint(get_wake_configuration(case_parameters))
+
+
+def get_wake_parameter_grid(wake_lengths, wake_discretisations=(False, True)):
+    return {'wake_length': sorted(wake_lengths), 'wake_discretisation': list(wake_discretisations)}
+
+
+def get_wake_cost(wake_length, num_chord_panels, wake_discretisation):
+    # Number of wake panels per chordwise strip, reduced for the variable wake discretisation
+    return wake_length * num_chord_panels * (variable_wake_cost_factor if wake_discretisation else 1.)
+
+
+def get_reference_case(list_cases):
+    """
+        Returns the reference case of a wake convergence study: the case with the longest wake and constant
+        wake discretisation (or, if not part of the study, variable wake discretisation).
+    """
+    return max(list_cases, key=lambda case: (case[3]['wake_length'], not case[3]['wake_discretisation']))
+
+
+def evaluate_wake_study(list_cases, get_time_history, parameter_labels, labels=None):
+    """
+        Compares the time histories of all cases of a wake convergence study (cases as returned by
+        get_campaign_cases) against the reference case.
+
+        Args:
+            get_time_history: function returning the time history of a case from its output route and name
+                              (see postprocess_gust_response.py)
+            parameter_labels (list): labels of the columns of the time history (without time)
+            labels (list): compared channels (default: wake_convergence_labels)
+
+        Returns:
+            list: result per case (dict with the case name, wake setting, wake cost, wall time and relative error
+                  of each channel), sorted by wake cost (see get_wake_cost) and wall time
+    """
+    if labels is None:
+        labels = wake_convergence_labels
+    columns = [parameter_labels.index(label) + 1 for label in labels]
+    reference_case = get_reference_case(list_cases)
+    reference_data = get_time_history(reference_case[2], reference_case[0])
+
+    list_results = []
+    for case_name, cases_route, output_route, case_parameters in list_cases:
+        relative_errors = compare_time_histories(reference_data,
+                                                 get_time_history(output_route, case_name),
+                                                 columns=columns)
+        list_results.append({'case_name': case_name,
+                             'wake_length': case_parameters['wake_length'],
+                             'wake_discretisation': case_parameters['wake_discretisation'],
+                             'wake_cost': get_wake_cost(case_parameters['wake_length'],
+                                                        case_parameters['num_chord_panels'],
+                                                        case_parameters['wake_discretisation']),
+                             'wall_time': read_wall_time(output_route, case_name),
+                             'reference': case_name == reference_case[0],
+                             'relative_errors': {label: float(relative_errors[column])
+                                                 for label, column in zip(labels, columns)}})
+    return sorted(list_results, key=lambda result: (result['wake_cost'], result['wall_time']))
+
+
+def recommend_wake_setting(list_results, tolerance):
+    """
+        Returns the result of the cheapest case whose relative errors are all below the tolerance (the reference
+        case is always converged).
+    """
+    for result in list_results:
+        if result['reference'] or max(result['relative_errors'].values()) <= tolerance:
+            return result
+
+
+def load_wake_settings(settings_file):
+    if not os.path.isfile(settings_file):
+        return {}
+    with open(settings_file, 'r') as f:
+        return json.load(f)
+
+
+def store_wake_setting(settings_file, case_parameters, recommendation, tolerance):
+    """
+        Stores the recommended wake setting of the configuration of the case. The file is locked while being
+        updated, so that studies of several configurations can share the same file.
+    """
+    settings_folder = os.path.dirname(os.path.abspath(settings_file))
+    if not os.path.exists(settings_folder):
+        os.makedirs(settings_folder)
+    with open(settings_file + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        wake_settings = load_wake_settings(settings_file)
+        wake_settings[get_wake_configuration_key(case_parameters)] = {
+            'configuration': get_wake_configuration(case_parameters),
+            'wake_length': recommendation['wake_length'],
+            'wake_discretisation': recommendation['wake_discretisation'],
+            'tolerance': tolerance,
+            'relative_errors': recommendation['relative_errors']}
+        with open(settings_file + '.tmp', 'w') as f:
+            json.dump(wake_settings, f, indent=4)
+        os.replace(settings_file + '.tmp', settings_file)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def apply_wake_settings(settings_file, case_parameters):
+    """
+        Sets the wake length and discretisation of a case to the recommended wake setting of its configuration.
+        Cases of configurations without recommendation are unchanged.
+
+        Returns:
+            tuple: updated copy of the case parameters, flag whether a recommendation was found
+    """
+    case_parameters = copy.deepcopy(case_parameters)
+    entry = load_wake_settings(settings_file).get(get_wake_configuration_key(case_parameters))
+    if entry is None:
+        return case_parameters, False
+    case_parameters['wake_length'] = entry['wake_length']
+    case_parameters['wake_discretisation'] = entry['wake_discretisation']
+    return case_parameters, True
+
+
+def format_wake_results(list_results, tolerance):
+    lines = ['{:>12} {:>10} {:>10} {:>12}  {}'.format('wake_length', 'variable', 'wake cost', 'wall time', '  '.join(
+        '{:>9}'.format(label) for label in list_results[0]['relative_errors']))]
+    for result in list_results:
+        converged = result['reference'] or max(result['relative_errors'].values()) <= tolerance
+        lines.append('{:>12g} {:>10} {:>10g} {:>10.1f} s  {}{}'.format(
+            result['wake_length'],
+            'on' if result['wake_discretisation'] else 'off',
+            result['wake_cost'],
+            result['wall_time'],
+            '  '.join('{:9.2e}'.format(error) for error in result['relative_errors'].values()),
+            '  (reference)' if result['reference'] else ('' if converged else '  not converged')))
+    return '\n'.join(lines)
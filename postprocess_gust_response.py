@@ -1,47 +1,112 @@
+import functools
+import multiprocessing
 import os
+import traceback
 import h5py as h5
+from h5py import h5g
 import numpy as np
+from helper_functions.campaign import get_campaign_postprocessing_cases
+from helper_functions.case_results import get_hyperslab_reader, get_number_of_timesteps, get_savedata_file
+from helper_functions.kinematics import quat2euler
+from helper_functions.results_store import get_case_columns, get_case_statistics, write_cases
+from helper_functions.time_step_schedule import get_step_times, read_schedule
 
 route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
 
-def quat2euler(quat):
-    # TODO: import from SHARPy
-    delta = quat[0]*quat[2] - quat[1]*quat[3]
+parameter_labels = ['omega_z', 'x','y','z', 'x_dot','y_dot','z_dot', 
+                    'r','p','q', 'r_dot','p_dot','q_dot',
+                    'OOP', 'MT', 'Pitch']
+time_history_dtype = np.dtype([(label, np.float64) for label in ['time'] + parameter_labels])
 
-    yaw = np.arctan(2*(quat[0]*quat[3]+quat[1]*quat[2])/(1-2*(quat[2]**2+quat[3]**2)))
-    pitch = np.arcsin(2*delta)
-    roll = np.arctan(2*(quat[0]*quat[1]+quat[2]*quat[3])/(1-2*(quat[1]**2+quat[2]**2)))
 
-    return np.array([roll, pitch, yaw])
+def read_timesteps(f, ts_start, ts_end, out=None):
+    """
+        Reads the timesteps ts_start to ts_end - 1 of an open savedata file (see read_time_history). 
+    """
+    structure_timestep_info = f['data']['structure']['timestep_info']
+    aero_timestep_info = f['data']['aero']['timestep_info']
+    n_steps = ts_end - ts_start
+    dt = float(str(np.array(f['data']['settings']['DynamicCoupled']['dt'])))
+    if out is None:
+        out = np.zeros((n_steps,), dtype=time_history_dtype)
+    elif out.shape != (n_steps,) or out.dtype != time_history_dtype:
+        raise ValueError('Output array needs to be of shape ({},) and dtype time_history_dtype.'.format(n_steps))
+    matrix_data = out.view(np.float64).reshape(n_steps, len(time_history_dtype))
+    matrix_data[:,0] = np.arange(ts_start, ts_end) * dt
 
+    node_tip = np.argmax(structure_timestep_info['00000']['pos'][:,1])
+    node_root = 0
+    element_tip = int(np.round((node_tip - 1)/2. -0.1))
+    quat = np.zeros((n_steps, 4))
 
-def get_time_history(output_folder, case):
-    file = os.path.join(output_folder,
-                         case, 
-                        'savedata', 
-                        case + '.data.h5')   
+    structure_timestep = structure_timestep_info['00000']
+    node_element_tip = structure_timestep['psi'].shape[1] - 1
+    structure_channels = [
+        (get_hyperslab_reader(structure_timestep, 'pos', (node_tip, 0), (1, 3)), matrix_data, slice(2, 5)), # Displacements of tip node
+        (get_hyperslab_reader(structure_timestep, 'pos_dot', (node_tip, 0), (1, 3)), matrix_data, slice(5, 8)), # Velocity of tip node
+        (get_hyperslab_reader(structure_timestep, 'psi', (element_tip, node_element_tip, 0), (1, 1, 3)), matrix_data, slice(8, 11)), # Rotations of tip node
+        (get_hyperslab_reader(structure_timestep, 'psi_dot', (element_tip, node_element_tip, 0), (1, 1, 3)), matrix_data, slice(11, 14)), # Gradient of tip node rotation
+        (get_hyperslab_reader(structure_timestep, 'postproc_cell/loads', (node_root, 3), (1, 2)), matrix_data, [15, 14]), # Torsional and OOP root bending loads
+        (get_hyperslab_reader(structure_timestep, 'quat', (0,), (4,)), quat, slice(0, 4)),
+        ]
+    read_u_ext = get_hyperslab_reader(aero_timestep_info['00000'], 'u_ext/00000', (2, 0, 0), (1, 1, 1))
+
+    for its in range(ts_start, ts_end):
+        ts_str = f'{its:05d}'.encode()
+        structure_timestep_id = h5g.open(structure_timestep_info.id, ts_str)
+        for read_hyperslab, data, columns in structure_channels:
+            data[its - ts_start, columns] = read_hyperslab(structure_timestep_id)
+        matrix_data[its - ts_start, 1] = read_u_ext(h5g.open(aero_timestep_info.id, ts_str))[0] # Vertical gust velocity at LE
+
+    matrix_data[:, 16] = quat2euler(quat)[:, 1] # Aircraft Pitching Angle [rad]
+    return out
+
+
+def read_time_history(file, out=None):
+    """
+        Reads the time history of the tip node displacements and rotations, the root loads, the vertical gust 
+        velocity at the leading edge and the aircraft pitch angle from a SHARPy savedata file. 
+
+        The timestep groups are resolved once per timestep and only the required node or element of each 
+        dataset is read. If ``out`` is given (structured array of ``time_history_dtype`` with one entry per 
+        timestep), it is filled in place. The fields of the returned structured array, e.g. ``data['OOP']``, 
+        are views on a single buffer, i.e. columns can be accessed without copying.
+    """
     with h5.File(file, "r") as f:
-            ts_max = len(f['data']['structure']['timestep_info'].keys())-2
-            dt = float(str(np.array(f['data']['settings']['DynamicCoupled']['dt'])))
-            matrix_data = np.zeros((ts_max, 17))
-            matrix_data[:,0] = np.array(list(range(ts_max))) * dt
-            node_tip = np.argmax(np.array(f['data']['structure']['timestep_info']['00000']['pos'])[:,1])
-
-            node_root = 0
-            element_tip = int(np.round((node_tip - 1)/2. -0.1))
-
-            for its in range(0,ts_max):
-                ts_str = f'{its:05d}'
-                matrix_data[its, 1] = np.array(f['data']['aero']['timestep_info'][ts_str]['u_ext']['00000'])[2,0,0] # Vertical gust velocity at LE
-                matrix_data[its, 2:5] = np.array(f['data']['structure']['timestep_info'][ts_str]['pos'])[node_tip, :] # Displacements of tip node
-                matrix_data[its, 5:8] = np.array(f['data']['structure']['timestep_info'][ts_str]['pos_dot'])[node_tip, :] # Velocity of tip node
-                matrix_data[its, 8:11] = np.array(f['data']['structure']['timestep_info'][ts_str]['psi'])[element_tip, -1, :] # Rotations of tip node
-                matrix_data[its, 11:14] = np.array(f['data']['structure']['timestep_info'][ts_str]['psi_dot'])[element_tip, -1, :] # Gradient of tip node rotation
-                matrix_data[its, 14] = np.array(f['data']['structure']['timestep_info'][ts_str]['postproc_cell']['loads'])[node_root,4] # OOP root bending loads
-                matrix_data[its, 15] = np.array(f['data']['structure']['timestep_info'][ts_str]['postproc_cell']['loads'])[node_root,3] # Torsional root bending loads
-                matrix_data[its, 16] = np.deg2rad(quat2euler(np.array(f['data']['structure']['timestep_info'][ts_str]['quat'])))[1] # Aircraft Pitching Angle
-
-    return matrix_data
+        return read_timesteps(f, 0, get_number_of_timesteps(f), out=out)
+
+
+def get_monitor_file(output_folder, case):
+    # Same as helper_functions.channel_monitor.get_monitor_file (without importing SHARPy)
+    return os.path.join(output_folder, case, 'monitor', case + '.monitor.h5')
+
+
+def read_monitor_time_history(file):
+    """
+        Reads the time history written by the ChannelMonitor postprocessor during the simulation. Channels 
+        that have not been monitored are set to NaN.
+    """
+    with h5.File(file, "r", libver='latest', swmr=True) as f:
+        channels = f['channels']
+        labels = list(channels.attrs['labels'])
+        monitor_data = channels[()]
+    data = np.full((monitor_data.shape[0],), np.nan, dtype=time_history_dtype)
+    for i_label, label in enumerate(labels):
+        if label in time_history_dtype.names:
+            data[label] = monitor_data[:, i_label]
+    return data
+
+
+def get_time_history(output_folder, case):
+    if os.path.isfile(get_monitor_file(output_folder, case)):
+        data = read_monitor_time_history(get_monitor_file(output_folder, case))
+    else:
+        data = read_time_history(get_savedata_file(output_folder, case))
+        schedule = read_schedule(output_folder, case)
+        if schedule is not None:
+            # Case run with a time step schedule, i.e. the time step is not constant
+            data['time'] = get_step_times(schedule, np.arange(len(data)))
+    return data.view(np.float64).reshape(len(data), len(time_history_dtype))
 
 def get_header(parameter_labels):
     header_parameter = 'time'
@@ -60,18 +125,68 @@ def write_results(data, case,parameter_labels, result_folder):
                header= get_header(parameter_labels))
 
 
+def process_case(case, text_result_folder=None):
+    """
+        Reads the time history of a case and computes its peak values. If a text result folder is given, the time
+        history is also written to <text_result_folder>/<case>.txt. Executed in a worker process of
+        postprocess_cases.
+    """
+    output_folder, case_name, case_parameters = case
+    try:
+        data = get_time_history(output_folder, case_name)
+        if text_result_folder is not None:
+            write_results(data, case_name, parameter_labels, text_result_folder)
+    except Exception:
+        return case_name, None, None, traceback.format_exc()
+    case_columns = get_case_columns(case_parameters)
+    case_columns.update(get_case_statistics(data, parameter_labels))
+    return case_name, case_columns, data, ''
+
+
+def postprocess_cases(list_cases, store_file, num_processes=None, batch_size=100, text_result_folder=None):
+    """
+        Postprocesses cases, each given as (SHARPy output folder, case name, case parameters), concurrently in a 
+        process pool and writes their time histories, parameters and peak values to the results store (see 
+        helper_functions/results_store.py). If a text result folder is given, the worker processes additionally
+        write the time history of each case to <text_result_folder>/<case>.txt.
+
+        Returns:
+            dict: case name -> error message of all failed cases
+    """
+    failed_cases = {}
+    list_case_results = []
+    with multiprocessing.get_context('spawn').Pool(num_processes) as pool:
+        for case_name, case_columns, data, error in pool.imap_unordered(
+                functools.partial(process_case, text_result_folder=text_result_folder), list_cases):
+            if case_columns is None:
+                print('Postprocessing of case {} failed:\n{}'.format(case_name, error))
+                failed_cases[case_name] = error
+                continue
+            list_case_results.append((case_name, case_columns, data))
+            if len(list_case_results) == batch_size:
+                write_cases(store_file, list_case_results, parameter_labels)
+                list_case_results = []
+    if len(list_case_results) > 0:
+        write_cases(store_file, list_case_results, parameter_labels)
+    return failed_cases
+
+
 def main():         
     list_cases = [
         'superflexop_free_L_10_I_10',
                  ]
     SHARPY_output_folder = route_dir + '/lib/sharpy/output/'
+    campaign_route = None # e.g. route_dir + '/campaigns/gust_sweep/' to postprocess all cases of a campaign
     result_folder = route_dir + '/results_gust_response/'
-    parameter_labels=  ['omega_z', 'x','y','z', 'x_dot','y_dot','z_dot', 
-                        'r','p','q', 'r_dot','p_dot','q_dot',
-                        'OOP', 'MT', 'Pitch']
-    for case in list_cases:
-        data = get_time_history(SHARPY_output_folder,  case)
-        write_results(data, case, parameter_labels, result_folder)
+    write_text_files = True # additionally write the time history of each case to <result_folder>/<case>.txt
+
+    if campaign_route is None:
+        list_postprocessing_cases = [(SHARPY_output_folder, case, {}) for case in list_cases]
+    else:
+        list_postprocessing_cases = get_campaign_postprocessing_cases(campaign_route)
+    postprocess_cases(list_postprocessing_cases,
+                      os.path.join(result_folder, 'gust_response.h5'),
+                      text_result_folder=result_folder if write_text_files else None)
 
 
 if __name__ == '__main__':
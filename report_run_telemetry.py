@@ -0,0 +1,28 @@
+import argparse
+from helper_functions.run_telemetry import format_telemetry_summary, get_telemetry_file, get_telemetry_summary
+
+"""
+    This script summarises the run telemetry of a nonlinear simulation run with telemetry = True (see
+    run_nonlinear_simulation.py and helper_functions/run_telemetry.py): wall time per timestep, share of the
+    aerodynamic and structural solver, FSI substeps and the time windows in which the FSI convergence stalls.
+
+    Usage:
+        python report_run_telemetry.py [--case_name superflexop_free] [--output_route ./output/] [--stall_factor 3]
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run telemetry report of a nonlinear simulation')
+    parser.add_argument('--case_name', default='superflexop_free')
+    parser.add_argument('--output_route', default='./output/')
+    parser.add_argument('--stall_factor', type=float, default=3.,
+                        help='timesteps with more than stall_factor times the median number of FSI substeps are stalled')
+    args = parser.parse_args()
+
+    summary = get_telemetry_summary(get_telemetry_file(args.output_route, args.case_name),
+                                    stall_factor=args.stall_factor)
+    print(format_telemetry_summary(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+from helper_functions.frequency_gust_response import (get_cached_frequency_response, get_fft_frequencies,
+                                                      get_gust_responses_from_frequency_response, get_turbulence_loads,
+                                                      get_window_damping)
+from helper_functions.linear_gust_response import (get_linear_system_file, load_state_space, get_screening_channels,
+                                                    get_one_minus_cos_gusts, get_peak_values, get_critical_cases,
+                                                    write_batch_results)
+
+"""
+    This script screens gust loads in the frequency domain with the linear aeroelastic system generated by
+    generate_linear_system.py (with remove_gust_input_in_statespace = False), see
+    helper_functions/frequency_gust_response.py:
+        - RMS loads per unit intensity (A-bar) and characteristic frequencies for continuous turbulence,
+        - peak loads of a sweep of 1-cos gusts, of which the most critical are listed so that only these need to be
+          simulated with run_nonlinear_simulation.py.
+
+    The frequency responses are cached in frequency_response_route, so that rerunning the script with a different
+    turbulence spectrum or gust sweep (but the same frequency grid) does not require any linear solve.
+
+    The gust input and the output channels (tip displacements and rotations, root torsional and out-of-plane
+    bending moment) are found from the variables saved with the linear system, as in run_linear_gust_screening.py
+    (see get_screening_channels in helper_functions/linear_gust_response.py).
+
+"""
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+# Linear system (see generate_linear_system.py)
+case_name = 'flexop_sigma_03_free_flight_linear'
+output_route = './output/'
+u_inf = 45
+
+# Output channels
+node_tip = None # None: node with the largest spanwise coordinate
+root_element = 0 # element at which the root loads are evaluated
+
+# Continuous turbulence
+turbulence_model = 'von_karman' # 'dryden' or 'von_karman'
+turbulence_altitude = 800. # m
+turbulence_intensity = 1. # vertical RMS gust velocity [m/s]
+num_frequencies = 1000
+min_frequency = 0.01 # rad/s
+
+# 1-cos gusts
+simulation_time = 2.
+gust_lengths = np.linspace(5., 100., 96)
+gust_intensities = np.array([0.05, 0.1, 0.2])
+num_critical_cases = 10
+
+frequency_response_route = route_dir + '/results_gust_response/frequency_response_cache/'
+result_file = route_dir + '/results_gust_response/frequency_gust_screening.h5'
+
+
+def main():
+    system_file = get_linear_system_file(output_route, case_name)
+    dt = load_state_space(system_file)[4]
+    gust_input_index, output_channels = get_screening_channels(system_file, node_tip=node_tip, root_element=root_element)
+
+    # Continuous turbulence
+    frequencies = np.geomspace(min_frequency, np.pi / dt, num_frequencies)
+    frequency_response = get_cached_frequency_response(frequency_response_route,
+                                                       system_file,
+                                                       frequencies,
+                                                       gust_input_index,
+                                                       output_channels)
+    rms, characteristic_frequencies = get_turbulence_loads(frequency_response,
+                                                           frequencies,
+                                                           u_inf,
+                                                           model=turbulence_model,
+                                                           altitude=turbulence_altitude)
+    print('Continuous turbulence ({}, intensity {:.2f} m/s):'.format(turbulence_model, turbulence_intensity))
+    for i_channel, label in enumerate(output_channels.keys()):
+        print('    {:>6}: RMS {:.4e}, characteristic frequency {:.3f} Hz'.format(
+            label, turbulence_intensity * rms[i_channel], characteristic_frequencies[i_channel]))
+
+    # 1-cos gusts
+    time = np.arange(int(simulation_time / dt)) * dt
+    damping = get_window_damping(simulation_time)
+    frequency_response = get_cached_frequency_response(frequency_response_route,
+                                                       system_file,
+                                                       get_fft_frequencies(len(time), dt),
+                                                       gust_input_index,
+                                                       output_channels,
+                                                       damping=damping)
+    gust_length_grid, gust_intensity_grid = [grid.flatten() for grid in np.meshgrid(gust_lengths, gust_intensities)]
+    gust_input = get_one_minus_cos_gusts(time, u_inf, gust_length_grid, gust_intensity_grid, gust_offset=10 * dt * u_inf)
+    responses = get_gust_responses_from_frequency_response(frequency_response,
+                                                           list(output_channels.keys()),
+                                                           dt,
+                                                           gust_input,
+                                                           damping=damping)
+    write_batch_results(result_file, responses, {'gust_length': gust_length_grid,
+                                                 'gust_intensity': gust_intensity_grid})
+
+    label_critical = 'OOP'
+    peaks = get_peak_values(responses, labels=[label_critical])[:, 0]
+    print('Most critical gusts ({}):'.format(label_critical))
+    for i_case in get_critical_cases(responses, num_critical_cases, label=label_critical):
+        print('    gust length {:6.1f} m, intensity {:5.2f}: peak {:.4e}'.format(gust_length_grid[i_case],
+                                                                              gust_intensity_grid[i_case],
+                                                                              peaks[i_case]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+from helper_functions.campaign import get_campaign_cases, write_campaign_manifest, run_campaign
+from run_nonlinear_simulation import case_parameters as base_parameters
+
+"""
+    This script runs a campaign of nonlinear gust response simulations, e.g. a certification gust sweep,
+    in a process pool. The base case is the case specified in run_nonlinear_simulation.py and the campaign
+    is defined by a parameter grid, i.e. every combination of the listed parameter values is simulated.
+    Any key of the case parameters (see run_nonlinear_simulation.py) as well as the gust parameters
+    (e.g. gust_length, gust_intensity) can be varied.
+
+    The available cores are split between concurrent cases and the UVLM of each case (num_cores). Each case
+    is written to its own folder <campaign_route>/cases/<case_name>/ and <campaign_route>/output/<case_name>/.
+    Finished cases are skipped if the campaign is started again, e.g. after a crash.
+
+"""
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+# Campaign definition
+base_name = 'superflexop'
+campaign_route = route_dir + '/campaigns/gust_sweep/'
+parameter_grid = {
+    'free_flight': [True, False],
+    'gust_length': [10., 20., 40., 60., 80., 100.],
+    'gust_intensity': [0.05, 0.1],
+    }
+
+# Parallelisation
+num_cores_total = os.cpu_count()
+max_cores_per_case = 4 # maximum number of cores used by the UVLM of a single case
+max_processes = None # limit the number of concurrent cases, e.g. if memory is limited
+
+
+def main():
+    list_cases = get_campaign_cases(campaign_route, base_name, base_parameters, parameter_grid)
+    write_campaign_manifest(campaign_route, list_cases)
+    results = run_campaign(list_cases,
+                           num_cores_total,
+                           max_cores_per_case=max_cores_per_case,
+                           max_processes=max_processes)
+    list_failed = [case_name for case_name, result in results.items() if not result[0]]
+    if len(list_failed) > 0:
+        print('Failed cases: {}'.format(', '.join(list_failed)))
+
+
+if __name__ == '__main__':
+    main()
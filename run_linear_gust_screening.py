@@ -0,0 +1,61 @@
+import os
+import numpy as np
+from helper_functions.linear_gust_response import (get_linear_system_file, load_state_space, get_screening_channels,
+                                                    get_one_minus_cos_gusts, get_gust_responses, get_peak_values,
+                                                    get_critical_cases, write_batch_results)
+
+"""
+    This script screens a large number of 1-cos gusts with the linear aeroelastic system generated by
+    generate_linear_system.py (with remove_gust_input_in_statespace = False). All gusts are simulated
+    in one batched time-marching simulation and the most critical gusts, e.g. with respect to the root
+    bending moment, are listed so that only these need to be simulated with run_nonlinear_simulation.py.
+
+    The gust input and the output channels (tip displacements and rotations, root torsional and out-of-plane
+    bending moment, see get_screening_channels in helper_functions/linear_gust_response.py) are found from the
+    input and output variables saved with the linear system.
+
+"""
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+# Linear system (see generate_linear_system.py)
+case_name = 'flexop_sigma_03_free_flight_linear'
+output_route = './output/'
+u_inf = 45
+
+# Output channels
+node_tip = None # None: node with the largest spanwise coordinate
+root_element = 0 # element at which the root loads are evaluated
+
+# Gust cases
+simulation_time = 2.
+gust_lengths = np.linspace(5., 100., 96)
+gust_intensities = np.array([0.05, 0.1, 0.2])
+num_critical_cases = 10
+
+result_file = route_dir + '/results_gust_response/linear_gust_screening.h5'
+
+
+def main():
+    system_file = get_linear_system_file(output_route, case_name)
+    A, B, C, D, dt = load_state_space(system_file)
+    gust_input_index, output_channels = get_screening_channels(system_file, node_tip=node_tip, root_element=root_element)
+    time = np.arange(int(simulation_time / dt)) * dt
+
+    gust_length_grid, gust_intensity_grid = [grid.flatten() for grid in np.meshgrid(gust_lengths, gust_intensities)]
+    gust_input = get_one_minus_cos_gusts(time, u_inf, gust_length_grid, gust_intensity_grid, gust_offset=10 * dt * u_inf)
+    responses = get_gust_responses(A, B, C, D, dt, gust_input, gust_input_index, output_channels)
+    write_batch_results(result_file, responses, {'gust_length': gust_length_grid,
+                                                 'gust_intensity': gust_intensity_grid})
+
+    label_critical = 'OOP'
+    peaks = get_peak_values(responses, labels=[label_critical])[:, 0]
+    print('Most critical gusts ({}):'.format(label_critical))
+    for i_case in get_critical_cases(responses, num_critical_cases, label=label_critical):
+        print('    gust length {:6.1f} m, intensity {:5.2f}: peak {:.4e}'.format(gust_length_grid[i_case],
+                                                                              gust_intensity_grid[i_case],
+                                                                              peaks[i_case]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
-import flexop as aircraft
+import argparse
 import os
-from helper_functions.get_settings import get_settings
+from helper_functions.output_compaction import compact_finished_case
+from helper_functions.simulation_case import resume_flexop_case, run_flexop_case
 
 """
     TThis script includes all the necessary steps to start a dynamic simulation of the Flexop or Superflexop, 
@@ -11,27 +12,33 @@ from helper_functions.get_settings import get_settings
     4) Set flight conditions.
     5) Specify parameters to control the lattice grid discretisation. The values used here lead to sufficient 
        convergence for dynamic gust response simulations of the FLEXOP.
-    6) The aircraft model is initialized and saved as an object. 
-    7) Other parameters dependent on the model geometry and discretisation are defined.
-    8) Some numerical parameters for the structural solver are specified. 
-    9) The solvers used and their order within a simulation is set, known as SHARPy's 'flow'.
-    10) SHARPy's final simulation settings are defined using the parameters specified in the 
-       previous steps. For more information about each solver, please check our documentation
+    6) Some numerical parameters for the structural and coupled solvers are specified. 
+    7) All parameters are collected in a single case parameter dictionary, which also serves as the base 
+       case of the gust campaigns run with run_gust_campaign.py.
+    8) The aircraft model is initialized and all required SHARPY input files are written, i.e. structural and 
+       aerodynamic models as well as simulation settings (see helper_functions/simulation_case.py). There, 
+       parameters dependent on the model geometry and discretisation (e.g. the time step), the solvers used and 
+       their order within a simulation, known as SHARPy's 'flow', and SHARPy's final simulation settings are 
+       defined. For more information about each solver, please check our documentation
        (https://ic-sharpy.readthedocs.io/en/latest/content/solvers.html).
-    11) All required SHARPY input files are written, i.e. structural and aerodynamic models as well as simulation settings.
-    12) Finally, the simulation starts.
+    9) Finally, the simulation starts. If checkpoints are written (checkpoint_interval), an interrupted simulation
+       is resumed from its latest checkpoint with
+            python run_nonlinear_simulation.py --restart
 
     Important to note is that 1) to 3) include the parameters the user likes to specify for its individual gust simulation. 
     Most other parameters are very general or successfully tested/verified.
 
 """
 
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
 # 1) Specify main parameters
 case_name = 'superflexop_free'
 lifting_only = True # ignore nonlifting bodies
 wing_only = False # Wing only or full configuration (wing+tail)
 wake_discretisation = False # Wake discretisation (reduces the simulation time by about 20 %)
 use_trim = False # If trim values are known, they can be insert in the dictionary below. Please double check values!
+use_trim_cache = False # Take trim values from (or, if not cached yet, compute them with StaticTrim and add them to) the trim cache
 
 factor_material_stiffness = 0.3 # Modified Flexop: 1.0, SuperFlexop: 0.3
 num_cores = 4
@@ -55,14 +62,26 @@ gust_settings  = {
         'gust_component': [2], # list of velocity components considered (0: U_x, 1: U_y, 2: U_z)
         }    
 
+    Example for continuous turbulence synthesised and stored in the turbulence field store (see 
+    helper_functions/turbulence_field.py):
+    gust_settings  = {
+        'gust_shape': 'turbulence field',
+        'gust_model': 'von_karman', # 'von_karman' or 'dryden'
+        'gust_altitude': 800, # altitude in m (scale lengths and intensity ratios of the components)
+        'gust_intensity': 0.02, # vertical turbulence intensity relative to u_inf
+        'gust_seed': 0,
+        'gust_component': [2], # list of velocity components considered (0: U_x, 1: U_y, 2: U_z)
+        'gust_record_length': 20000., # length of the stored turbulence record in m
+        'gust_record_start': 0., # start of the simulated window within the record in m
+        }    
+
 """
+turbulence_route = route_dir + '/turbulence_fields/' # Store of the synthesised turbulence fields
 
 # 3) Define dynamic control surface input
 dynamic_cs_input = False # True if pre-defined control surface deflection used
 dict_predefined_cs_input_files = {}
 if dynamic_cs_input:
-    route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
-
     dict_predefined_cs_input_files = {
         '0' : None, # aileron 1 (inboard right)
         '1' : None, # aileron 2
@@ -80,6 +99,10 @@ if dynamic_cs_input:
     ailerons_type = [0, 0, 0, 1, 0, 0, 0, 0, 0, 1, 0, 0]
 else:
     ailerons_type = 0
+# Single binary input file with the deflections of all control surfaces, e.g. 
+# route_dir + '/deflection_input_files/deflection_input.npy' (converted from the files above if it does not exist,
+# see helper_functions/control_surface_input.py). If None, the files above are read for each control surface.
+cs_input_file = None
 
 
 # 4) Set cruise parameter SuperFlexop
@@ -97,84 +120,91 @@ thrust = trim_values['thrust']
 # 5) Discretisation parameters (sufficient convergence for dynamic simulations)
 num_chord_panels = 8
 n_elem_multiplier = 2 
+n_elem_multiplier_tail = None # None: default of the flexop model
+use_recommended_discretisation = False # Use the cheapest converged discretisation of benchmarks/check_mesh_convergence.py for the configuration if available
 horseshoe =  False 
 wake_length = 10
+use_recommended_wake = False # Use the converged wake length and discretisation of benchmarks/check_wake_convergence.py for the configuration if available
 cfl1 = not wake_discretisation
 
-# 6) Init aircraft model
-cases_route = './cases/'
-output_route = './output/'
-flexop_model = aircraft.FLEXOP(case_name, cases_route, output_route)
-flexop_model.clean()
-flexop_model.init_structure(sigma=factor_material_stiffness, 
-                            n_elem_multiplier=n_elem_multiplier, 
-                            n_elem_multiplier_fuselage = 1, 
-                            lifting_only=lifting_only, 
-                            wing_only = wing_only) 
-flexop_model.init_aero(m=num_chord_panels,
-                       cs_deflection = cs_deflection,
-                       ailerons_type = ailerons_type) 
-flexop_model.structure.set_thrust(thrust)
-
-# 7) Other parameters
+# 6) Numerical parameters of the structural and the coupled solver
 CFL = 1
-dt = CFL * flexop_model.aero.chord_main_root / flexop_model.aero.m / u_inf
-gust_settings['gust_offset'] = 10 * dt *u_inf # Gust encounters starts 10 ts after simulation start
-number_timesteps = int(simulation_time / dt)
-
-# 8) Structural parameters
 structural_relaxation_factor = 0.6
-relaxation_factor = 0.2
+relaxation_factor = 0.2 # not forwarded to get_settings, DynamicCoupled runs with its default relaxation factor of 0 as in the original script
 tolerance = 1e-6 
 fsi_tolerance = 1e-4 
 newmark_damp = 0.5e-4
-
-# 9) Define SHARPy flow
-flow = ['BeamLoader', 
-        'AerogridLoader',
-        'StaticCoupled',
-        'StaticTrim',
-        'BeamLoads',
-        'BeamPlot',
-        'AerogridPlot',
-        'AeroForcesCalculator',
-        'DynamicCoupled',
-]
+time_step_schedule = None # e.g. {'coarse_factor': 4, 'margin': 0.1} for a coarser time step before and after the gust encounter (see helper_functions/time_step_schedule.py)
 postprocessor_each_timestep = ['BeamLoads', 'SaveData'] #, 'AerogridPlot',  'BeamPlot']
-if use_trim:    
-    flow.remove('StaticCoupled')
-else:
-    flow.remove('StaticTrim')
-
-                
-# 10) Get settings dict
-settings = get_settings(flexop_model,
-                        flow,
-                        dt,
-                        gust = use_gust,
-                        gust_settings = gust_settings,
-                        alpha = alpha,
-                        cs_deflection = cs_deflection,
-                        u_inf = u_inf,
-                        rho = rho,
-                        thrust = thrust,
-                        wake_length = wake_length,
-                        free_flight = free_flight,
-                        num_cores = num_cores,
-                        tolerance = tolerance,
-                        fsi_tolerance = fsi_tolerance,
-                        structural_relaxation_factor = structural_relaxation_factor,
-                        newmark_damp = newmark_damp,
-                        n_tstep = number_timesteps,
-                        postprocessor_each_timestep=postprocessor_each_timestep,
-                        dynamic_cs_input = dynamic_cs_input,
-                        dict_predefined_cs_input_files = dict_predefined_cs_input_files                                
-                        )
-
-# 11) Generate all required input files for a SHARPy simulation
-flexop_model.generate()
-flexop_model.structure.calculate_aircraft_mass()
-flexop_model.create_settings(settings)
-
-# 12) Run simulation
-flexop_model.run()
\ No newline at end of file
+monitor_channels = None # e.g. ['u_ext_le', 'tip_pos', 'root_loads', 'pitch'] to replace the full SaveData dump at each timestep
+full_dump_stride = 0 # if channels are monitored, write a full SaveData dump every n-th timestep (0: never)
+telemetry = False # record wall time, FSI substeps, solver times and residuals of each timestep (see helper_functions/run_telemetry.py and report_run_telemetry.py)
+checkpoint_interval = 0 # write a checkpoint of the dynamic simulation every n-th timestep to resume from (0: never, see helper_functions/checkpoint.py)
+checkpoint_num_stored_timesteps = 2 # latest timesteps of the structural and aerodynamic history stored in a checkpoint (0: all)
+output_compaction = None # e.g. {'stride': 10, 'keep_wake': False} to compress the savedata, keep the aero grid every n-th timestep only and pack the VTK output after the run (see helper_functions/output_compaction.py)
+
+# 7) Collect all case parameters (also used as base case by run_gust_campaign.py)
+cases_route = './cases/'
+output_route = './output/'
+use_model_cache = False # Link model input files from the model cache instead of generating them (e.g. for gust sweeps)
+use_snapshot = False # Start DynamicCoupled from a snapshot of the static solution (computed once per flight condition)
+case_parameters = {
+    'lifting_only': lifting_only,
+    'wing_only': wing_only,
+    'wake_discretisation': wake_discretisation,
+    'use_trim': use_trim,
+    'trim_cache_file': route_dir + '/trim_cache.json' if use_trim_cache else None,
+    'model_cache_route': route_dir + '/model_cache/' if use_model_cache else None,
+    'snapshot_route': route_dir + '/snapshots/' if use_snapshot else None,
+    'factor_material_stiffness': factor_material_stiffness,
+    'num_cores': num_cores,
+    'simulation_time': simulation_time,
+    'free_flight': free_flight,
+    'gravity': gravity,
+    'use_gust': use_gust,
+    'gust_settings': gust_settings,
+    'turbulence_route': turbulence_route,
+    'dynamic_cs_input': dynamic_cs_input,
+    'dict_predefined_cs_input_files': dict_predefined_cs_input_files,
+    'cs_input_file': cs_input_file,
+    'ailerons_type': ailerons_type,
+    'alpha': alpha,
+    'u_inf': u_inf,
+    'rho': rho,
+    'cs_deflection': cs_deflection,
+    'thrust': thrust,
+    'num_chord_panels': num_chord_panels,
+    'n_elem_multiplier': n_elem_multiplier,
+    'n_elem_multiplier_tail': n_elem_multiplier_tail,
+    'n_elem_multiplier_fuselage': 1,
+    'discretisation_settings_file': route_dir + '/discretisation_settings.json' if use_recommended_discretisation else None,
+    'horseshoe': horseshoe,
+    'wake_length': wake_length,
+    'wake_settings_file': route_dir + '/wake_settings.json' if use_recommended_wake else None,
+    'CFL': CFL,
+    'time_step_schedule': time_step_schedule,
+    'structural_relaxation_factor': structural_relaxation_factor,
+    'relaxation_factor': relaxation_factor,
+    'tolerance': tolerance,
+    'fsi_tolerance': fsi_tolerance,
+    'newmark_damp': newmark_damp,
+    'postprocessor_each_timestep': postprocessor_each_timestep,
+    'monitor_channels': monitor_channels,
+    'full_dump_stride': full_dump_stride,
+    'telemetry': telemetry,
+    'checkpoint_interval': checkpoint_interval,
+    'checkpoint_num_stored_timesteps': checkpoint_num_stored_timesteps,
+    'output_compaction': output_compaction,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Nonlinear gust response simulation of the (Super)Flexop')
+    parser.add_argument('--restart', action='store_true', help='resume the case from its latest checkpoint')
+    args = parser.parse_args()
+    # 8) Init aircraft model, generate all required input files for a SHARPy simulation and 
+    # 9) run simulation
+    if args.restart:
+        resume_flexop_case(case_name, cases_route, output_route, case_parameters)
+    else:
+        run_flexop_case(case_name, cases_route, output_route, case_parameters)
+    compact_finished_case(output_route, case_name, case_parameters)
@@ -0,0 +1,72 @@
+import os
+import time
+from helper_functions.campaign import run_campaign, write_campaign_manifest
+from helper_functions.parametric_rom import ParametricROM, get_rom_grid_cases, run_linear_grid_case
+from generate_linear_system import case_parameters as base_parameters
+
+"""
+    This script builds a parametric reduced-order model of the linear aeroelastic system across the flight envelope
+    (see helper_functions/parametric_rom.py). The linear system with ROM is generated at every point of a grid of
+    flight conditions, with the remaining parameters as specified in generate_linear_system.py. Each grid point is
+    trimmed (the trim states are shared via the trim cache). The cases are run in a process pool and finished cases
+    are skipped if the script is started again.
+
+    The parametric ROM is saved to rom_file and can be evaluated at any flight condition within the grid with
+        parametric_rom = ParametricROM.load(rom_file)
+        A, B, C, D, dt = parametric_rom.get_system(u_inf=42., rho=1.1)
+
+"""
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+# Grid of flight conditions
+base_name = 'superflexop_linear'
+campaign_route = route_dir + '/campaigns/parametric_rom/'
+parameter_grid = {
+    'u_inf': [35., 40., 45., 50., 55.],
+    'rho': [1.0065, 1.1336, 1.225], # altitudes of 2000 m, 800 m and sea level
+    }
+rom_parameters = {'use_trim': True,
+                  'trim_cache_file': route_dir + '/trim_cache.json',
+                  }
+
+# Parametric ROM
+order = None # order of the balanced realisations (default: minimal order of all grid points)
+rom_file = route_dir + '/results_linear/parametric_rom.h5'
+
+# Parallelisation
+num_cores_total = os.cpu_count()
+max_cores_per_case = 4 # maximum number of cores used by the UVLM of a single case
+max_processes = None # limit the number of concurrent cases, e.g. if memory is limited
+
+
+def main():
+    list_cases = get_rom_grid_cases(campaign_route, base_name, dict(base_parameters, **rom_parameters), parameter_grid)
+    # Linear cases, compared by their parameters (see get_case_fingerprint in helper_functions/campaign.py)
+    write_campaign_manifest(campaign_route, list_cases, case_settings=None)
+    results = run_campaign(list_cases,
+                           num_cores_total,
+                           max_cores_per_case=max_cores_per_case,
+                           max_processes=max_processes,
+                           run_case=run_linear_grid_case,
+                           case_settings=None)
+    list_failed = [case_name for case_name, result in results.items() if not result[0]]
+    if len(list_failed) > 0:
+        print('Failed cases: {}'.format(', '.join(list_failed)))
+        return
+
+    parametric_rom = ParametricROM.from_cases(parameter_grid, list_cases, order=order)
+    parametric_rom.save(rom_file)
+    print('Parametric ROM with {} states saved to {}.'.format(parametric_rom.num_states, rom_file))
+
+    # Example: eigenvalues at an intermediate flight condition
+    start_time = time.time()
+    eigenvalues = parametric_rom.get_eigenvalues(u_inf=42.5, rho=1.1)
+    print('Least stable eigenvalues at u_inf = 42.5 m/s, rho = 1.1 kg/m3 ({:.1f} ms):'.format(
+        1e3 * (time.time() - start_time)))
+    for eigenvalue in eigenvalues[:5]:
+        print('    {:.4f} {:+.4f}j'.format(eigenvalue.real, eigenvalue.imag))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+from helper_functions.stability_sweep import read_stability_sweep, run_stability_sweep, write_stability_sweep
+from generate_linear_system import case_parameters as base_parameters
+
+"""
+    This script runs a stability sweep of the linear aeroelastic system over a grid of structural cases (e.g.
+    stiffness factors) and flight speeds (see helper_functions/stability_sweep.py), with the remaining parameters
+    as specified in generate_linear_system.py. The structural modal solve is run once per structural case and
+    shared by all its speed points, which are run in a process pool. Starting from the initial speed grid, the
+    speed points are refined around the flutter speed of each structural case until it is bracketed within the
+    speed tolerance. Finished speed points are skipped if the script is started again.
+
+    All eigenvalues are saved to result_file, from which the root locus of a structural case is read with
+        results = read_stability_sweep(result_file)
+        results[<structural case name>]['eigenvalues'] # (n_speeds, n_eigenvalues)
+
+"""
+
+route_dir = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+# Structural cases and initial speed grid
+base_name = 'superflexop_stability'
+campaign_route = route_dir + '/campaigns/stability_sweep/'
+structural_grid = {
+    'factor_material_stiffness': [0.3, 0.5, 1.],
+    }
+speeds = np.linspace(20., 80., 5) # m/s
+speed_tolerance = 0.5 # m/s
+min_frequency = 1. # rad/s, modes with lower frequencies (e.g. rigid body modes) are not considered for the damping
+
+result_file = route_dir + '/results_linear/stability_sweep.h5'
+
+# Parallelisation
+num_cores_total = os.cpu_count()
+max_cores_per_case = 4 # maximum number of cores used by the UVLM of a single case
+max_processes = None # limit the number of concurrent cases, e.g. if memory is limited
+
+
+def main():
+    list_structural_cases = run_stability_sweep(campaign_route,
+                                                base_name,
+                                                base_parameters,
+                                                structural_grid,
+                                                speeds,
+                                                num_cores_total,
+                                                speed_tolerance=speed_tolerance,
+                                                min_frequency=min_frequency,
+                                                max_cores_per_case=max_cores_per_case,
+                                                max_processes=max_processes)
+    write_stability_sweep(result_file, list_structural_cases, min_frequency=min_frequency)
+    for name, results in read_stability_sweep(result_file).items():
+        print('{}: {} speed points, flutter speed {:.2f} m/s'.format(name, len(results['u_inf']),
+                                                                     results['flutter_speed']))
+
+
+if __name__ == '__main__':
+    main()